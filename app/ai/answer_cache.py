@@ -0,0 +1,187 @@
+from ..core.config import ANSWER_CACHE_SIZE, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL
+from ..core.redis_client import get_binary_redis_client, get_data_version
+from . import vector_search_service
+from .embedding_cache import citation_signature, get_query_embeddings, normalize_query
+from .tools.sql_templates import match_question
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import numpy as np
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AnswerCache:
+    """
+    Caches final chat answers in Redis, keyed by the question embedding.
+
+    A question matches a stored one when both cite the same regulation
+    forms, numbers, statuses and groupings (see citation_signature) and
+    their embeddings have a cosine similarity of at least `threshold`, so
+    rephrasings of the same question share an answer. Questions the SQL
+    templates match are never cached: the templates answer them exactly and
+    cheaply, while their near-duplicates ("berapa" vs "daftar", ...) differ
+    in a single word. Entries live in a namespace named after the
+    regulation data version and the FAISS index version: any write to the
+    regulation table or a re-ingested index moves lookups to a fresh
+    namespace, and the old entries simply expire with their TTL.
+
+    Per namespace, Redis holds each answer under `<namespace>:<sha256>` and all
+    question vectors in the hash `<namespace>:vectors`, with fields
+    `<sha256>:<signature>`. Every worker mirrors that hash in memory and
+    reloads it only when its size changes. The blocking Redis calls run in
+    worker threads, off the event loop.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_size: int = ANSWER_CACHE_SIZE,
+        ttl: int = ANSWER_CACHE_TTL,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+    ):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self._namespace: Optional[str] = None
+        self._keys: List[str] = []
+        self._signatures = np.empty(0, dtype=object)
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def question_key(question: str) -> str:
+        return hashlib.sha256(normalize_query(question).encode("utf-8")).hexdigest()
+
+    def namespace(self) -> str:
+        return f"answer:{get_data_version()}:{vector_search_service.index_version}"
+
+    async def _question_vector(self, question: str) -> np.ndarray:
+        vector = np.asarray(
+            await self.embeddings.aembed_query(question), dtype=np.float32
+        )
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _mirror(self, client, namespace: str):
+        """Returns this worker's copy of the namespace's question vectors."""
+        vectors_key = f"{namespace}:vectors"
+        with self._lock:
+            if namespace == self._namespace and client.hlen(vectors_key) == len(
+                self._keys
+            ):
+                return self._keys, self._signatures, self._matrix
+
+            stored = client.hgetall(vectors_key)
+            # Fields without a signature never match (None equals no signature)
+            fields = [field.decode().partition(":") for field in stored]
+            self._namespace = namespace
+            self._keys = [key for key, _, _ in fields]
+            self._signatures = np.array(
+                [signature if sep else None for _, sep, signature in fields],
+                dtype=object,
+            )
+            self._matrix = (
+                np.vstack([np.frombuffer(v, dtype=np.float32) for v in stored.values()])
+                if stored
+                else np.empty((0, 0), dtype=np.float32)
+            )
+            return self._keys, self._signatures, self._matrix
+
+    def _read_answer(self, client, namespace: str, key: str) -> Optional[str]:
+        payload = client.get(f"{namespace}:{key}")
+        if payload is None:
+            return None
+        return json.loads(payload)["answer"]
+
+    def _lookup(self, question: str):
+        """
+        The answer stored for this exact question, or else the namespace and
+        the keys and vectors of the stored questions with its signature.
+        """
+        client = get_binary_redis_client()
+        namespace = self.namespace()
+        # The same question (after normalization) needs no embedding at all
+        answer = self._read_answer(client, namespace, self.question_key(question))
+        if answer is not None:
+            return answer, namespace, [], None
+        keys, signatures, matrix = self._mirror(client, namespace)
+        if not keys:
+            return None, namespace, [], None
+        same = np.flatnonzero(signatures == citation_signature(question))
+        return None, namespace, [keys[i] for i in same], matrix[same]
+
+    def _read_match(self, namespace: str, key: str, signature: str):
+        client = get_binary_redis_client()
+        answer = self._read_answer(client, namespace, key)
+        if answer is None:
+            # The answer expired; drop its vector so it isn't matched again
+            client.hdel(f"{namespace}:vectors", f"{key}:{signature}")
+        return answer
+
+    async def get(self, question: str) -> Optional[str]:
+        """Returns the cached answer to this or a near-duplicate question."""
+        if match_question(question) is not None:
+            return None
+        try:
+            answer, namespace, keys, matrix = await asyncio.to_thread(
+                self._lookup, question
+            )
+            if answer is not None or not keys:
+                return answer
+            similarities = matrix @ await self._question_vector(question)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+            return await asyncio.to_thread(
+                self._read_match, namespace, keys[best], citation_signature(question)
+            )
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {e}")
+            return None
+
+    def _has_room(self) -> Optional[str]:
+        """The current namespace, or None if the cache is full."""
+        namespace = self.namespace()
+        size = get_binary_redis_client().hlen(f"{namespace}:vectors")
+        return namespace if size < self.max_size else None
+
+    def _store(self, namespace: str, question: str, vector: np.ndarray, answer: str):
+        vectors_key = f"{namespace}:vectors"
+        key = self.question_key(question)
+        payload = json.dumps({"question": question, "answer": answer})
+        pipeline = get_binary_redis_client().pipeline()
+        pipeline.set(f"{namespace}:{key}", payload, ex=self.ttl)
+        pipeline.hset(
+            vectors_key, f"{key}:{citation_signature(question)}", vector.tobytes()
+        )
+        pipeline.expire(vectors_key, self.ttl)
+        pipeline.execute()
+
+    async def set(self, question: str, answer: str):
+        """Stores an answer; the cache stops growing once it is full."""
+        if match_question(question) is not None:
+            return
+        try:
+            namespace = await asyncio.to_thread(self._has_room)
+            if namespace is None:
+                return
+            vector = await self._question_vector(question)
+            await asyncio.to_thread(self._store, namespace, question, vector, answer)
+        except Exception as e:
+            logger.warning(f"Answer cache write failed: {e}")
+
+
+_answer_cache = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Returns the process-wide answer cache used by the chat service."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache(get_query_embeddings())
+    return _answer_cache
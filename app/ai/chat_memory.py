@@ -0,0 +1,200 @@
+from ..core.config import (
+    CHAT_HISTORY_TOKEN_BUDGET,
+    CHAT_SESSION_CHUNK_POOL_SIZE,
+    CHAT_SESSION_TTL,
+    CHAT_SUMMARY_MAX_TOKENS,
+)
+from ..core.redis_client import delete_cache, get_cache, set_cache
+from .context_assembly import count_tokens, truncate_tokens
+from .llm import get_chat_model, openai_breaker
+from contextvars import ContextVar
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Session of the chat request being answered; read by the RAG retriever to
+# reuse the passages this session has already retrieved
+current_session_id: ContextVar[Optional[str]] = ContextVar(
+    "current_session_id", default=None
+)
+
+SUMMARY_PROMPT = """Update the summary of a conversation between a user and an \
+assistant about Indonesian regulations. Keep the regulations, articles, numbers \
+and facts that later questions may refer to. Answer with the summary only.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+_summary_llm = None
+
+
+def _session_key(session_id: str) -> str:
+    return f"chat_session:{session_id}"
+
+
+def _chunks_key(session_id: str) -> str:
+    return f"chat_session:{session_id}:chunks"
+
+
+def create_session() -> str:
+    """Starts an empty session and returns its id."""
+    session_id = uuid.uuid4().hex
+    set_cache(_session_key(session_id), {"summary": "", "turns": []}, CHAT_SESSION_TTL)
+    return session_id
+
+
+def load_session(session_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the session's summary and recent turns, or None if it expired."""
+    return get_cache(_session_key(session_id))
+
+
+def delete_session(session_id: str):
+    delete_cache(_session_key(session_id))
+    delete_cache(_chunks_key(session_id))
+
+
+def history_messages(session: Optional[Dict[str, Any]]) -> List[BaseMessage]:
+    """The session as chat messages: the summary, then the recent turns."""
+    if not session:
+        return []
+    messages: List[BaseMessage] = []
+    if session["summary"]:
+        messages.append(
+            SystemMessage(
+                content=f"Summary of the earlier conversation: {session['summary']}"
+            )
+        )
+    for turn in session["turns"]:
+        messages.append(HumanMessage(content=turn["question"]))
+        messages.append(AIMessage(content=turn["answer"]))
+    return messages
+
+
+def _turn_tokens(turn: Dict[str, str]) -> int:
+    return count_tokens(turn["question"]) + count_tokens(turn["answer"])
+
+
+def split_history(
+    turns: List[Dict[str, str]], token_budget: int
+) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Splits turns into (older, recent): the most recent turns that fit the
+    budget are kept verbatim. The last turn is always kept, with its answer
+    cut if it alone exceeds the budget.
+    """
+    recent: List[Dict[str, str]] = []
+    used = 0
+    for turn in reversed(turns):
+        tokens = _turn_tokens(turn)
+        if recent and used + tokens > token_budget:
+            break
+        recent.insert(0, turn)
+        used += tokens
+    if used > token_budget:
+        last = recent[-1]
+        room = max(token_budget - count_tokens(last["question"]), 0)
+        recent[-1] = {**last, "answer": truncate_tokens(last["answer"], room)}
+    return turns[: len(turns) - len(recent)], recent
+
+
+async def summarize(summary: str, turns: List[Dict[str, str]]) -> str:
+    """
+    Folds turns into the rolling summary with one LLM call. While OpenAI is
+    unavailable, or if the call fails, the summary is left as it was.
+    """
+    global _summary_llm
+    if openai_breaker.is_open():
+        return summary
+    if _summary_llm is None:
+        _summary_llm = get_chat_model("gpt-3.5-turbo", temperature=0)
+    text = "\n".join(
+        f"User: {turn['question']}\nAssistant: {turn['answer']}" for turn in turns
+    )
+    try:
+        message = await _summary_llm.ainvoke(
+            SUMMARY_PROMPT.format(summary=summary or "(none)", turns=text)
+        )
+    except Exception as e:
+        logger.warning(f"Could not summarize chat history: {e}")
+        return summary
+    return truncate_tokens(message.content.strip(), CHAT_SUMMARY_MAX_TOKENS)
+
+
+async def save_turn(
+    session_id: str, session: Dict[str, Any], question: str, answer: str
+) -> List[Dict[str, str]]:
+    """
+    Appends a turn and stores the session with a fresh TTL. Returns the turns
+    that no longer fit CHAT_HISTORY_TOKEN_BUDGET; they stay in the session
+    until fold_history has summarized them, so saving never waits for the LLM.
+    """
+    turns = session["turns"] + [{"question": question, "answer": answer}]
+    older, recent = split_history(turns, CHAT_HISTORY_TOKEN_BUDGET)
+    await asyncio.to_thread(
+        set_cache,
+        _session_key(session_id),
+        {"summary": session["summary"], "turns": older + recent},
+        CHAT_SESSION_TTL,
+    )
+    return older
+
+
+async def fold_history(session_id: str, older: List[Dict[str, str]]):
+    """
+    Folds the oldest turns of a session into its summary and drops them. Meant
+    to run after the response was sent. Turns saved in the meantime are kept;
+    if another fold got to these turns first, nothing is written.
+    """
+    session = await asyncio.to_thread(load_session, session_id)
+    if not session or session["turns"][: len(older)] != older:
+        return
+    summary = await summarize(session["summary"], older)
+    latest = await asyncio.to_thread(load_session, session_id)
+    if (
+        not latest
+        or latest["summary"] != session["summary"]
+        or latest["turns"][: len(older)] != older
+    ):
+        return
+    await asyncio.to_thread(
+        set_cache,
+        _session_key(session_id),
+        {"summary": summary, "turns": latest["turns"][len(older) :]},
+        CHAT_SESSION_TTL,
+    )
+
+
+def get_session_pool(session_id: str, index_version: str) -> Optional[Dict[str, Any]]:
+    """
+    The passages this session retrieved from the current index ("row_ids")
+    and the last query that searched the index for them ("query").
+    """
+    pool = get_cache(_chunks_key(session_id))
+    if not pool or pool["index_version"] != index_version:
+        return None
+    return pool
+
+
+def add_session_chunks(
+    session_id: str, index_version: str, row_ids: List[int], query: Dict[str, Any]
+):
+    """
+    Remembers retrieved passages, most recent first, up to the pool size,
+    along with the query that retrieved them.
+    """
+    pool = get_session_pool(session_id, index_version)
+    if pool:
+        row_ids = row_ids + pool["row_ids"]
+    row_ids = list(dict.fromkeys(row_ids))[:CHAT_SESSION_CHUNK_POOL_SIZE]
+    set_cache(
+        _chunks_key(session_id),
+        {"index_version": index_version, "row_ids": row_ids, "query": query},
+        CHAT_SESSION_TTL,
+    )
@@ -1,91 +1,418 @@
 import asyncio
-from langchain.agents import AgentExecutor, create_openai_functions_agent
+import logging
+import openai
+import re
+import redis
+from contextlib import suppress
+from fastapi import HTTPException, status
+from langchain.agents import AgentExecutor, create_openai_tools_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools import Tool
-from langchain_openai import ChatOpenAI
-from langchain.callbacks import AsyncIteratorCallbackHandler
+from langchain_core.callbacks import AsyncCallbackHandler
+from typing import Any, Dict, Optional, Set
+from uuid import UUID
 
-from ..core.config import OPENAI_API_KEY
-from .tools.rag_tool import query_document_content
-from .tools.sql_tool import query_database
+from ..core.config import CHAT_FALLBACK_RESULTS, CHAT_ROUTER_ENABLED, CHAT_TIMEOUT
+from . import chat_memory, vector_search_service
+from .answer_cache import get_answer_cache
+from .llm import get_chat_model, openai_breaker
+from .router import DATABASE_TOOL, DOCUMENT_TOOL, route_question
+from .tools.rag_tool import aquery_document_content, query_document_content
+from .tools.sql_tool import aquery_database, is_failed_answer, query_database
+
+logger = logging.getLogger(__name__)
+
+# Session summaries being written after their response was sent
+_background_tasks: Set[asyncio.Task] = set()
 
 # --- This non-streaming agent is for regular chat endpoint ---
 # Initialize the standard LLM for non-streaming responses
-non_streaming_llm = ChatOpenAI(
-    openai_api_key=OPENAI_API_KEY, model_name="gpt-4-turbo-preview", temperature=0
-)
+non_streaming_llm = get_chat_model("gpt-4-turbo-preview", temperature=0)
 
 # Define the tools the agent can use
 tools = [
     Tool(
-        name="RegulationDatabase",
+        name=DATABASE_TOOL,
         func=query_database,
+        coroutine=aquery_database,
         description="""Use this tool to answer questions about Indonesian regulations.
         This includes counting regulations, listing them by year, finding status,
         or any other question that can be answered by querying a SQL table
         named 'regulation'.""",
     ),
     Tool(
-        name="RegulationDocumentSearch",
+        name=DOCUMENT_TOOL,
         func=query_document_content,
+        coroutine=aquery_document_content,
         description="""Use this tool for detailed questions about the SPECIFIC CONTENT,
         articles, clauses, or definitions inside a regulation document.
         The input should be a very specific question about the document's text.""",
     ),
 ]
+tools_by_name = {tool.name: tool for tool in tools}
 
 # Create the prompt for the master agent
 prompt = ChatPromptTemplate.from_messages(
     [
         (
             "system",
-            "You are a powerful assistant that can answer questions about Indonesian regulations.",
+            "You are a powerful assistant that can answer questions about Indonesian regulations. "
+            "When a question has independent parts, call the tools for all of them at once.",
         ),
+        # Summary and recent turns of the chat session, if any
+        MessagesPlaceholder(variable_name="chat_history", optional=True),
         ("user", "{input}"),
         MessagesPlaceholder(variable_name="agent_scratchpad"),
     ]
 )
 
-agent = create_openai_functions_agent(non_streaming_llm, tools, prompt)
+# The tools agent can request several tool calls in one step; the executor
+# runs them concurrently, so a multi-part question costs the slowest tool
+# instead of the sum of all of them
+agent = create_openai_tools_agent(non_streaming_llm, tools, prompt)
 agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
+# --- The streaming agent is built once and shared by all streaming requests ---
+# Callbacks are passed per request through the run config instead of being
+# bound to the LLM, so the same executor can serve concurrent streams. Runs
+# nested in the agent's tools inherit those callbacks too, so the agent's own
+# LLM is tagged and only its tokens are streamed to the client.
+# stream_usage makes the final chunk carry token counts for tracing
+STREAMED_LLM_TAG = "streamed_answer"
+streaming_llm = get_chat_model(
+    "gpt-4-turbo-preview", temperature=0, streaming=True, stream_usage=True
+).with_config(tags=[STREAMED_LLM_TAG])
+streaming_agent = create_openai_tools_agent(streaming_llm, tools, prompt)
+streaming_agent_executor = AgentExecutor(
+    agent=streaming_agent, tools=tools, verbose=True
+)
 
-def get_intelligent_response(user_input: str) -> str:
-    """Invokes the master agent to get a single, complete response."""
-    response = agent_executor.invoke({"input": user_input})
-    return response.get("output")
 
+async def within_budget(coroutine):
+    """Awaits one chat request's work, failing with 504 after CHAT_TIMEOUT seconds."""
+    try:
+        return await asyncio.wait_for(coroutine, CHAT_TIMEOUT)
+    except TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The assistant took too long to answer.",
+        )
 
-# --- This new async generator is for streaming endpoint ---
-async def get_intelligent_response_stream(user_input: str):
+
+async def answer_with_routed_tool(user_input: str, callbacks=None):
     """
-    Streams the agent's final response token-by-token using a callback handler.
+    Answers with the tool the rule-based router picks, skipping the master
+    agent's LLM calls. Returns None when the router can't decide or the tool
+    reports a failure, so the agent answers instead.
+    """
+    if not CHAT_ROUTER_ENABLED:
+        return None
+    tool_name = route_question(user_input)
+    if tool_name is None:
+        return None
+    logger.info(f"Routed question directly to {tool_name}")
+    answer = await tools_by_name[tool_name].ainvoke(
+        user_input, config={"callbacks": callbacks or []}
+    )
+    if is_failed_answer(answer):
+        logger.warning(f"{tool_name} failed on a routed question: {answer}")
+        return None
+    return answer
+
+
+def is_degraded() -> bool:
+    """True while the OpenAI circuit breaker refuses calls."""
+    return openai_breaker.is_open()
+
+
+def get_fallback_response(user_input: str) -> str:
     """
-    # Create a callback handler to capture the streamed tokens
-    callback = AsyncIteratorCallbackHandler()
-
-    # Create a streaming-enabled LLM instance with the callback
-    streaming_llm = ChatOpenAI(
-        openai_api_key=OPENAI_API_KEY,
-        model_name="gpt-4-turbo-preview",
-        temperature=0,
-        streaming=True,  # Enable streaming
-        callbacks=[callback],  # Pass the callback handler
+    Answer used while OpenAI is unavailable: the top passages of a lexical
+    search, which needs no embedding or LLM call.
+    """
+    try:
+        results = vector_search_service.semantic_search(
+            user_input, k=CHAT_FALLBACK_RESULTS, mode="lexical"
+        )
+    except RuntimeError:
+        results = []
+    if not results:
+        return "The assistant is temporarily unavailable. Please try again later."
+    passages = [
+        f"[{i}] {result['metadata'].get('nama_peraturan') or 'Dokumen'}:\n"
+        f"{result['content']}"
+        for i, result in enumerate(results, start=1)
+    ]
+    return "\n\n".join(
+        [
+            "The assistant is temporarily unavailable. "
+            "These passages may answer your question:"
+        ]
+        + passages
     )
 
-    # Create the agent and executor using the streaming LLM
-    agent = create_openai_functions_agent(streaming_llm, tools, prompt)
-    agent_executor_streaming = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
-    # Run the agent in a background task so we can stream tokens immediately
-    task = asyncio.create_task(agent_executor_streaming.ainvoke({"input": user_input}))
+async def open_session(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Loads a chat session; 404 if it doesn't exist (or expired). Without a
+    session id, or if Redis is unavailable, the question is answered on its
+    own and nothing is stored.
+    """
+    if session_id is None:
+        return None
+    try:
+        session = await asyncio.to_thread(chat_memory.load_session, session_id)
+    except redis.RedisError as e:
+        logger.warning(f"Could not load chat session: {e}")
+        return None
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found or expired.",
+        )
+    return session
+
+
+async def remember_turn(session_id, session, user_input: str, answer: str):
+    """
+    Stores the turn. Older turns are summarized in a background task, so the
+    summary's LLM call neither delays the response nor counts against
+    CHAT_TIMEOUT and the concurrency limit.
+    """
+    if session is None or not answer:
+        return
+    try:
+        older = await chat_memory.save_turn(session_id, session, user_input, answer)
+    except redis.RedisError as e:
+        logger.warning(f"Could not save chat session: {e}")
+        return
+    if older:
+        task = asyncio.create_task(fold_session_history(session_id, older))
+        # The loop only keeps weak references to tasks
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+async def fold_session_history(session_id: str, older):
+    try:
+        await chat_memory.fold_history(session_id, older)
+    except redis.RedisError as e:
+        logger.warning(f"Could not summarize chat session: {e}")
+
+
+async def in_session(session_id: Optional[str], coroutine):
+    """Awaits the coroutine with the chat session set for the retriever."""
+    token = chat_memory.current_session_id.set(session_id)
+    try:
+        return await coroutine
+    finally:
+        chat_memory.current_session_id.reset(token)
+
+
+async def _answer(user_input: str, callbacks, session_id, history) -> str:
+    answer = None
+    # Follow-up questions may depend on the history, which only the agent reads
+    if not history:
+        answer = await within_budget(
+            in_session(session_id, answer_with_routed_tool(user_input, callbacks))
+        )
+    if answer is None:
+        response = await within_budget(
+            in_session(
+                session_id,
+                agent_executor.ainvoke(
+                    {"input": user_input, "chat_history": history},
+                    config={"callbacks": callbacks or []},
+                ),
+            )
+        )
+        answer = response.get("output")
+    return answer
+
+
+async def get_intelligent_response(
+    user_input: str, callbacks=None, session_id: Optional[str] = None
+) -> str:
+    """
+    Invokes the master agent to get a single, complete response.
+    Runs on the event loop end-to-end, so a slow conversation doesn't hold a
+    threadpool thread. Repeated (or near-duplicate) questions are answered
+    from the semantic answer cache without running the agent, and questions
+    the router can classify go straight to their tool. `callbacks`
+    (e.g. a tracing handler) are attached to this run only. The run gets
+    CHAT_TIMEOUT seconds, shared by all its tool calls.
+
+    With a `session_id`, the session's summary and recent turns are given to
+    the agent and the new turn is stored. Questions with history bypass the
+    answer cache and the router, as their meaning depends on it.
+
+    While the OpenAI circuit breaker is open, the top search passages are
+    returned instead (see get_fallback_response).
+    """
+    if is_degraded():
+        return await asyncio.to_thread(get_fallback_response, user_input)
+
+    session = await open_session(session_id)
+    history = chat_memory.history_messages(session)
+    answer_cache = get_answer_cache()
+    if not history:
+        cached_answer = await answer_cache.get(user_input)
+        if cached_answer is not None:
+            await remember_turn(session_id, session, user_input, cached_answer)
+            return cached_answer
+
+    try:
+        answer = await _answer(user_input, callbacks, session_id, history)
+    except openai.APIError:
+        if not is_degraded():
+            raise
+        logger.warning("OpenAI is unavailable; answering from search results")
+        return await asyncio.to_thread(get_fallback_response, user_input)
+    if answer and not history:
+        await answer_cache.set(user_input, answer)
+    await remember_turn(session_id, session, user_input, answer)
+    return answer
+
+
+def replay_tokens(answer: str):
+    """Splits a stored answer into word-sized tokens for streaming."""
+    return re.findall(r"\s*\S+", answer)
+
+
+class TokenQueueCallbackHandler(AsyncCallbackHandler):
+    """
+    Puts the streamed tokens of LLM runs tagged STREAMED_LLM_TAG on a queue;
+    LLM calls nested in tools (e.g. the SQL sub-agent) are left out. Unlike
+    LangChain's AsyncIteratorCallbackHandler it doesn't signal the end of the
+    stream when the first LLM call ends (the agent's function-call step), so
+    tokens of the final answer are not lost; the stream ends when the agent
+    run does.
+    """
+
+    def __init__(self):
+        self.queue: asyncio.Queue[str] = asyncio.Queue()
+        self.streamed_runs: Set[UUID] = set()
+
+    async def on_chat_model_start(
+        self, serialized, messages, *, run_id: UUID, tags=None, **kwargs
+    ) -> None:
+        if STREAMED_LLM_TAG in (tags or []):
+            self.streamed_runs.add(run_id)
+
+    async def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        if token and run_id in self.streamed_runs:
+            self.queue.put_nowait(token)
+
+    async def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        self.streamed_runs.discard(run_id)
+
+    async def on_llm_error(self, error, *, run_id: UUID, **kwargs) -> None:
+        self.streamed_runs.discard(run_id)
 
-    # Yield tokens as they become available from the callback handler
+
+# --- This new async generator is for streaming endpoint ---
+async def get_intelligent_response_stream(
+    user_input: str, callbacks=None, session_id: Optional[str] = None
+):
+    """
+    Streams the agent's final response token-by-token using a callback handler.
+    Cached answers, answers of a directly routed tool and, while the OpenAI
+    circuit breaker is open, the search fallback are replayed in the same
+    token format. Sessions work as in get_intelligent_response.
+
+    Errors of the agent run are raised to the caller. Closing the generator
+    early (e.g. when the client disconnects) cancels the agent run.
+    """
+    if is_degraded():
+        for token in replay_tokens(
+            await asyncio.to_thread(get_fallback_response, user_input)
+        ):
+            yield token
+        return
+
+    session = await open_session(session_id)
+    stream = _stream_answer(user_input, callbacks, session_id, session)
+    started = False
     try:
-        async for token in callback.aiter():
+        async for token in stream:
+            started = True
+            yield token
+    except openai.APIError:
+        if started or not is_degraded():
+            raise
+        logger.warning("OpenAI is unavailable; answering from search results")
+        for token in replay_tokens(
+            await asyncio.to_thread(get_fallback_response, user_input)
+        ):
             yield token
-    except Exception as e:
-        print(f"Caught exception in generator: {e}")
     finally:
-        # Ensure the background task is complete
-        await task
+        await stream.aclose()
+
+
+async def _stream_answer(user_input: str, callbacks, session_id, session):
+    history = chat_memory.history_messages(session)
+    answer_cache = get_answer_cache()
+    if not history:
+        cached_answer = await answer_cache.get(user_input)
+        if cached_answer is not None:
+            for token in replay_tokens(cached_answer):
+                yield token
+            await remember_turn(session_id, session, user_input, cached_answer)
+            return
+
+        answer = await within_budget(
+            in_session(session_id, answer_with_routed_tool(user_input, callbacks))
+        )
+        if answer is not None:
+            for token in replay_tokens(answer):
+                yield token
+            if answer:
+                await answer_cache.set(user_input, answer)
+            await remember_turn(session_id, session, user_input, answer)
+            return
+
+    # Create a callback handler to capture the streamed tokens of this request
+    callback = TokenQueueCallbackHandler()
+
+    # Run the shared agent in a background task so we can stream tokens
+    # immediately; the callback only applies to this run
+    task = asyncio.create_task(
+        within_budget(
+            in_session(
+                session_id,
+                streaming_agent_executor.ainvoke(
+                    {"input": user_input, "chat_history": history},
+                    config={"callbacks": [callback, *(callbacks or [])]},
+                ),
+            )
+        )
+    )
+    # Yield tokens as they become available, until the agent run finishes
+    next_token = None
+    try:
+        while True:
+            next_token = asyncio.ensure_future(callback.queue.get())
+            done, _ = await asyncio.wait(
+                {next_token, task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_token in done:
+                yield next_token.result()
+                continue
+            next_token.cancel()
+            break
+        while not callback.queue.empty():
+            yield callback.queue.get_nowait()
+        response = task.result()
+    finally:
+        if next_token is not None:
+            next_token.cancel()
+        # Stop the agent if the consumer went away before it finished
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+    answer = response.get("output")
+    if answer and not history:
+        await answer_cache.set(user_input, answer)
+    await remember_turn(session_id, session, user_input, answer)
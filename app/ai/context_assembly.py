@@ -0,0 +1,167 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+import logging
+import numpy as np
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Tokenizer of the RAG chain's model
+TOKENIZER_MODEL = "gpt-3.5-turbo"
+
+# Chunks are split with a 200-character overlap; shorter shared edges are
+# treated as coincidence rather than overlap
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+# A passage cut to fit the budget must keep at least this many tokens
+MIN_PASSAGE_TOKENS = 50
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    Loads the tiktoken encoding once. If it can't be loaded (e.g. offline, as
+    encodings are downloaded on first use), token counts are estimated from
+    the text length instead.
+    """
+    try:
+        return tiktoken.encoding_for_model(TOKENIZER_MODEL)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[: max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def mmr(
+    query_vector: np.ndarray, vectors: np.ndarray, k: int, lambda_mult: float
+) -> List[int]:
+    """
+    Maximal marginal relevance over candidates in retrieval order. The first
+    candidate (the retriever's best match, which may be a lexical hit) is
+    always kept; the rest trade cosine similarity to the query against
+    similarity to the passages already picked.
+    """
+    if len(vectors) == 0 or k <= 0:
+        return []
+    vectors = vectors / np.maximum(
+        np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+    )
+    query = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+    relevance = vectors @ query
+    redundancy = np.full(len(vectors), -np.inf)
+    selected = [0]
+    while len(selected) < min(k, len(vectors)):
+        redundancy = np.maximum(redundancy, vectors @ vectors[selected[-1]])
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of `first` that is a prefix of `second`."""
+    longest = min(len(first), len(second), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+def merge_overlapping(passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merges chunks of the same regulation that overlap (neighbouring chunks of
+    the text splitter) into one passage, so the shared text is sent once.
+    Chunks contained in another one are dropped. Order is kept: a merged
+    passage takes the place of its best-ranked chunk.
+    """
+    merged: List[Dict[str, Any]] = []
+    for passage in passages:
+        content = passage["content"]
+        regulation_id = passage["metadata"].get("regulation_id")
+        for other in merged:
+            if regulation_id is None or (
+                other["metadata"].get("regulation_id") != regulation_id
+            ):
+                continue
+            if content in other["content"]:
+                break
+            if other["content"] in content:
+                other["content"] = content
+                break
+            if size := _overlap(other["content"], content):
+                other["content"] += content[size:]
+                break
+            if size := _overlap(content, other["content"]):
+                other["content"] = content + other["content"][size:]
+                break
+        else:
+            merged.append({**passage})
+    return merged
+
+
+def fit_token_budget(
+    passages: List[Dict[str, Any]], token_budget: int
+) -> List[Dict[str, Any]]:
+    """
+    Keeps passages in order until the budget is spent. The passage that
+    crosses the budget is cut to the remaining tokens, unless too little of
+    it would be left.
+    """
+    kept = []
+    remaining = token_budget
+    for passage in passages:
+        tokens = count_tokens(passage["content"])
+        if tokens <= remaining:
+            kept.append(passage)
+            remaining -= tokens
+            continue
+        if remaining >= MIN_PASSAGE_TOKENS:
+            kept.append(
+                {**passage, "content": truncate_tokens(passage["content"], remaining)}
+            )
+        break
+    return kept
+
+
+def assemble_context(
+    candidates: List[Dict[str, Any]],
+    k: int,
+    token_budget: int,
+    query_vector: Optional[np.ndarray] = None,
+    vectors: Optional[np.ndarray] = None,
+    lambda_mult: float = 0.5,
+) -> List[Dict[str, Any]]:
+    """
+    Turns ranked search results into the context for the RAG prompt:
+    exact duplicates are dropped, k passages are picked with MMR (or by rank
+    when no vectors are given), overlapping chunks of the same regulation are
+    merged and the result is trimmed to `token_budget` tokens.
+    """
+    unique, positions, seen = [], [], set()
+    for position, candidate in enumerate(candidates):
+        if candidate["content"] not in seen:
+            seen.add(candidate["content"])
+            unique.append(candidate)
+            positions.append(position)
+
+    if query_vector is not None and vectors is not None:
+        picked = mmr(query_vector, vectors[positions], k, lambda_mult)
+        unique = [unique[i] for i in picked]
+    else:
+        unique = unique[:k]
+
+    return fit_token_budget(merge_overlapping(unique), token_budget)
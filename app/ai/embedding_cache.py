@@ -0,0 +1,204 @@
+from ..core.config import (
+    EMBEDDING_CACHE_SIZE,
+    EMBEDDING_CACHE_TTL,
+    OPENAI_EMBEDDING_MODEL,
+)
+from ..core.redis_client import get_binary_redis_client
+from .llm import get_embeddings_model
+from .tools.sql_templates import (
+    GROUP_COLUMNS,
+    GROUP_WORDS,
+    TYPE_ALIASES,
+    TYPES,
+    normalize_question,
+)
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from typing import List
+import hashlib
+import logging
+import numpy as np
+import redis
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """Normalizes a query so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.lower().split())
+
+
+# Citation words whose numbers must match exactly
+CITATION_WORDS = ("pasal", "ayat", "bab", "bagian", "paragraf")
+
+# Status words of regulations, including ones the regulation table doesn't use
+STATUS_WORDS = ("berlaku", "tidak_berlaku", "dicabut", "diubah", "dibatalkan")
+
+
+def citation_signature(question: str) -> str:
+    """
+    The regulation forms, numbers, statuses and groupings a question cites,
+    e.g. "34 pp y2005" for "Apa isi PP 34 tahun 2005?" or "berlaku per
+    tahun" for "Jumlah peraturan berlaku per tahun". Long forms are read as
+    their short form ("peraturan pemerintah" is "pp"). Years are marked as
+    such and numbers after "pasal", "ayat", ... keep that word, so "Pasal 5
+    UU 11" and "Pasal 11 UU 5" differ. Embeddings barely tell such questions
+    apart, so cached answers and retrieved passages are only reused between
+    questions with the same signature.
+    """
+    tokens = normalize_question(question).split()
+    cited = set()
+    for i, token in enumerate(tokens):
+        token = TYPE_ALIASES.get(token, token)
+        previous = tokens[i - 1] if i else ""
+        if token in TYPES or token in STATUS_WORDS:
+            cited.add(token)
+        elif previous in GROUP_WORDS and token in GROUP_COLUMNS:
+            cited.add(f"per {GROUP_COLUMNS[token]}")
+        elif not token.isdigit():
+            continue
+        elif len(token) == 4 and token[:2] in ("19", "20"):
+            cited.add(f"y{token}")
+        elif previous in CITATION_WORDS:
+            cited.add(f"{previous} {int(token)}")
+        else:
+            cited.add(str(int(token)))
+    return " ".join(sorted(cited))
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model and caches query vectors.
+
+    Lookups go to an in-process LRU first, then to Redis, where vectors are
+    stored as raw float32 bytes. Only a miss on both reaches the embedding API.
+    Document embeddings (used during ingestion) are passed straight through.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        ttl: int = EMBEDDING_CACHE_TTL,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lru: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cache_key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_query(text).encode("utf-8")).hexdigest()
+        return f"embedding:{self.model_name}:{digest}"
+
+    # --- In-process LRU ---
+    def _get_local(self, key: str) -> np.ndarray | None:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _set_local(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_size:
+                self._lru.popitem(last=False)
+
+    # --- Redis (shared between workers) ---
+    def _get_remote(self, key: str) -> np.ndarray | None:
+        try:
+            payload = get_binary_redis_client().get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache read failed: {e}")
+            return None
+        if not payload:
+            return None
+        return np.frombuffer(payload, dtype=np.float32)
+
+    def _set_remote(self, key: str, vector: np.ndarray):
+        try:
+            get_binary_redis_client().set(key, vector.tobytes(), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _lookup(self, key: str) -> np.ndarray | None:
+        vector = self._get_local(key)
+        if vector is not None:
+            return vector
+        vector = self._get_remote(key)
+        if vector is not None:
+            self._set_local(key, vector)
+        return vector
+
+    def _store(self, key: str, raw_vector: List[float]) -> np.ndarray:
+        vector = np.asarray(raw_vector, dtype=np.float32)
+        self._set_local(key, vector)
+        self._set_remote(key, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeds many queries at once and returns them as a float32 matrix.
+        Cache misses are de-duplicated and sent in a single batched request.
+        """
+        keys = [self.cache_key(text) for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+
+        missing: dict[str, str] = {}
+        for text, key, vector in zip(texts, keys, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        if missing:
+            fresh = self.embeddings.embed_documents(list(missing.values()))
+            computed = {key: self._store(key, raw) for key, raw in zip(missing, fresh)}
+            vectors = [
+                vector if vector is not None else computed[key]
+                for key, vector in zip(keys, vectors)
+            ]
+
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    # --- Embeddings interface ---
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store(key, self.embeddings.embed_query(text))
+        return vector.tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self._store(key, await self.embeddings.aembed_query(text))
+        return vector.tolist()
+
+
+_query_embeddings = None
+
+
+def get_query_embeddings() -> CachedQueryEmbeddings:
+    """
+    Returns the process-wide cached embeddings instance used for search queries.
+    """
+    global _query_embeddings
+    if _query_embeddings is None:
+        _query_embeddings = CachedQueryEmbeddings(
+            get_embeddings_model(OPENAI_EMBEDDING_MODEL),
+            model_name=OPENAI_EMBEDDING_MODEL,
+        )
+    return _query_embeddings
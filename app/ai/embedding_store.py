@@ -0,0 +1,141 @@
+from ..core.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_CACHE_PATH,
+    EMBED_MAX_IN_FLIGHT,
+    EMBED_MAX_RETRIES,
+)
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List
+import hashlib
+import logging
+import numpy as np
+import os
+import random
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed cache of document embeddings.
+    Vectors are stored as float32 blobs in SQLite, keyed by
+    `<model>:<sha256(chunk_text)>`, so identical chunks are embedded only once
+    across runs, even after a crash halfway through ingestion.
+    """
+
+    def __init__(self, path: str = EMBED_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            part = keys[start : start + 500]
+            placeholders = ",".join("?" * len(part))
+            rows = self.connection.execute(
+                f"SELECT key, vector FROM embedding WHERE key IN ({placeholders})",
+                part,
+            )
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, vectors: Dict[str, np.ndarray]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)",
+                [(key, vector.tobytes()) for key, vector in vectors.items()],
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+class BatchEmbedder(Embeddings):
+    """
+    Embeds documents in fixed-size batches with several batches in flight and
+    retries with exponential backoff, skipping any chunk already in the store.
+    Queries are passed straight through to the wrapped model.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        model_name: str,
+        store: EmbeddingStore,
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+        max_retries: int = EMBED_MAX_RETRIES,
+    ):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.store = store
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2**attempt) * (0.5 + random.random())
+                logger.warning(
+                    f"Embedding batch failed ({e}); retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [EmbeddingStore.key(self.model_name, text) for text in texts]
+        vectors = self.store.get_many(list(set(keys)))
+
+        # De-duplicate the misses so each unique chunk is embedded once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self.cache_hits += len(texts) - len(missing)
+        self.cache_misses += len(missing)
+
+        missing_keys = list(missing)
+        batches = [
+            missing_keys[start : start + self.batch_size]
+            for start in range(0, len(missing_keys), self.batch_size)
+        ]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+                futures = {
+                    pool.submit(
+                        self._embed_with_retry, [missing[key] for key in batch]
+                    ): batch
+                    for batch in batches
+                }
+                for future in as_completed(futures):
+                    fresh = {
+                        key: np.asarray(vector, dtype=np.float32)
+                        for key, vector in zip(futures[future], future.result())
+                    }
+                    # Persist each batch as it lands so a crash loses little work
+                    self.store.put_many(fresh)
+                    vectors.update(fresh)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
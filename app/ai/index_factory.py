@@ -0,0 +1,243 @@
+from ..core.config import (
+    FAISS_HNSW_EF_SEARCH,
+    FAISS_HNSW_M,
+    FAISS_INDEX_TYPE,
+    FAISS_NLIST,
+    FAISS_NPROBE,
+    FAISS_PQ_M,
+    FAISS_REFINE_K_FACTOR,
+    FAISS_TRAIN_SAMPLE_SIZE,
+)
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional
+import faiss
+import math
+import numpy as np
+
+# Supported index types, from exact brute force to approximate. The sq_*
+# types store scalar-quantized vectors (fp16: 2 bytes per dimension, int8:
+# 1 byte) instead of float32; ivf_pq stores product-quantized codes.
+INDEX_TYPES = ("flat", "sq_fp16", "sq_int8", "ivf_flat", "ivf_sq8", "ivf_pq", "hnsw")
+
+# Types whose quantizers are trained on a sample of the vectors
+TRAINED_INDEX_TYPES = ("sq_int8", "ivf_flat", "ivf_sq8", "ivf_pq")
+
+SCALAR_QUANTIZERS = {
+    "sq_fp16": faiss.ScalarQuantizer.QT_fp16,
+    "sq_int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+# FAISS wants roughly this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def default_nlist(num_vectors: int) -> int:
+    """Picks the number of IVF lists from the corpus size (~4 * sqrt(n))."""
+    nlist = int(4 * math.sqrt(num_vectors))
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dim: int, requested: int) -> int:
+    """PQ needs a number of subquantizers that divides the dimension."""
+    for m in range(min(requested, dim), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def _pq_bits(num_train: int) -> int:
+    """8-bit codes need 256 centroids per subquantizer; shrink for small corpora."""
+    bits = int(math.log2(max(num_train // MIN_POINTS_PER_CENTROID, 2)))
+    return max(1, min(8, bits))
+
+
+def training_sample(vectors: np.ndarray, sample_size: int, seed: int = 0):
+    """Returns a random subset of the vectors to train the quantizers on."""
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+
+
+def create_index(
+    vectors: np.ndarray,
+    index_type: str = FAISS_INDEX_TYPE,
+    nlist: int = FAISS_NLIST,
+    pq_m: int = FAISS_PQ_M,
+    hnsw_m: int = FAISS_HNSW_M,
+    train_sample_size: int = FAISS_TRAIN_SAMPLE_SIZE,
+    refine_k_factor: float = FAISS_REFINE_K_FACTOR,
+) -> faiss.Index:
+    """
+    Creates an empty (but trained, if needed) L2 index of the given type.
+    IVF and int8 indexes are trained on a random sample of `vectors`.
+
+    With `refine_k_factor` > 0 (not for flat) the index is wrapped in an
+    IndexRefineFlat: the quantized index fetches refine_k_factor * k
+    candidates and these are re-ranked exactly against full float32 copies
+    of the vectors. That recovers the recall lost to quantization, but the
+    float32 copies cost as much memory as a flat index.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}."
+        )
+
+    index = _create_base_index(
+        vectors, index_type, nlist, pq_m, hnsw_m, train_sample_size
+    )
+    if not index.is_trained:
+        index.train(training_sample(vectors, train_sample_size))
+    if refine_k_factor and index_type != "flat":
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = refine_k_factor
+    return index
+
+
+def _create_base_index(
+    vectors: np.ndarray,
+    index_type: str,
+    nlist: int,
+    pq_m: int,
+    hnsw_m: int,
+    train_sample_size: int,
+) -> faiss.Index:
+    dim = vectors.shape[1]
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type in SCALAR_QUANTIZERS:
+        return faiss.IndexScalarQuantizer(dim, SCALAR_QUANTIZERS[index_type])
+
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+
+    num_train = min(len(vectors), train_sample_size)
+    nlist = min(nlist, num_train) if nlist else default_nlist(num_train)
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+    if index_type == "ivf_sq8":
+        return faiss.IndexIVFScalarQuantizer(
+            quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit
+        )
+    m = _pq_subquantizers(dim, pq_m)
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, m, _pq_bits(num_train))
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """The quantized index inside a refine wrapper, or the index itself."""
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.downcast_index(index.base_index)
+    return index
+
+
+def configure_search(
+    index: faiss.Index,
+    nprobe: int = FAISS_NPROBE,
+    ef_search: int = FAISS_HNSW_EF_SEARCH,
+    refine_k_factor: float = FAISS_REFINE_K_FACTOR,
+) -> faiss.Index:
+    """
+    Applies search-time settings to a loaded index (IVF nprobe, HNSW efSearch,
+    refine k_factor). IVF indexes also get a direct map so vectors can be
+    reconstructed by id.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        ivf.set_direct_map_type(faiss.DirectMap.Array)
+    base = _base_index(index)
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = ef_search
+    if isinstance(index, faiss.IndexRefine) and refine_k_factor:
+        index.k_factor = refine_k_factor
+    return index
+
+
+def search_parameters(
+    index: faiss.Index, selector: Optional[faiss.IDSelector] = None
+) -> faiss.SearchParameters:
+    """Builds search parameters of the type the index expects."""
+    base = _base_index(index)
+    ivf = faiss.try_extract_index_ivf(base)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.IndexRefineSearchParameters(
+            k_factor=index.k_factor, base_index_params=params
+        )
+    return params
+
+
+def build_vector_store(
+    documents: List[Document],
+    vectors: np.ndarray,
+    embeddings: Embeddings,
+    index_type: str = FAISS_INDEX_TYPE,
+    ids: Optional[List[str]] = None,
+) -> FAISS:
+    """
+    Builds a LangChain FAISS store over pre-computed vectors using the
+    configured index type instead of the default flat index.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    index = configure_search(create_index(vectors, index_type))
+    vector_store = FAISS(embeddings, index, InMemoryDocstore(), {})
+    vector_store.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors),
+        metadatas=[doc.metadata for doc in documents],
+        ids=ids,
+    )
+    return vector_store
+
+
+def remove_documents(vector_store: FAISS, ids: List[str]) -> FAISS:
+    """
+    Removes chunks by docstore id and returns the (possibly new) store.
+
+    Flat indexes renumber their rows on removal, which is what LangChain's
+    `delete` expects. IVF and HNSW indexes don't (HNSW can't remove at all),
+    so for those the remaining vectors are read back out of the index and
+    re-added to an empty clone that keeps the trained quantizer. Either way
+    nothing is re-embedded.
+    """
+    present = set(vector_store.index_to_docstore_id.values())
+    to_remove = {doc_id for doc_id in ids if doc_id in present}
+    if not to_remove:
+        return vector_store
+
+    if isinstance(vector_store.index, faiss.IndexFlat):
+        vector_store.delete(list(to_remove))
+        return vector_store
+
+    kept = [
+        (row_id, doc_id)
+        for row_id, doc_id in sorted(vector_store.index_to_docstore_id.items())
+        if doc_id not in to_remove
+    ]
+    index = faiss.clone_index(vector_store.index)
+    index.reset()
+    rebuilt = FAISS(
+        vector_store.embedding_function,
+        configure_search(index),
+        InMemoryDocstore(),
+        {},
+    )
+    if kept:
+        rows = np.asarray([row_id for row_id, _ in kept], dtype=np.int64)
+        vectors = vector_store.index.reconstruct_batch(rows)
+        documents = [vector_store.docstore.search(doc_id) for _, doc_id in kept]
+        rebuilt.add_embeddings(
+            zip([doc.page_content for doc in documents], vectors),
+            metadatas=[doc.metadata for doc in documents],
+            ids=[doc_id for _, doc_id in kept],
+        )
+    return rebuilt
@@ -0,0 +1,160 @@
+from langchain_community.vectorstores import FAISS
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import os
+import re
+import unicodedata
+
+BM25_INDEX_FILE = "bm25.npz"
+
+# Standard BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Rank constant from the original reciprocal rank fusion paper
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits on anything that isn't a letter or digit, so
+    citations like "Pasal 5 ayat (2)" or "PP 34/2005" become exact tokens.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    """
+    In-process inverted index with BM25 scoring over the FAISS chunks.
+
+    Postings are stored in CSR form: the documents containing term t are
+    doc_ids[offsets[t]:offsets[t + 1]], with matching term_freqs. Document ids
+    are FAISS row ids, so lexical and vector results refer to the same chunks.
+    """
+
+    def __init__(
+        self,
+        vocabulary: List[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        term_freqs: np.ndarray,
+        doc_lengths: np.ndarray,
+    ):
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+
+        num_docs = len(doc_lengths)
+        doc_freqs = np.diff(offsets)
+        self.idf = np.log(1 + (num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        avg_length = doc_lengths.mean() if num_docs else 0.0
+        # Per-document length normalization, precomputed once
+        self.length_norm = BM25_K1 * (
+            1 - BM25_B + BM25_B * doc_lengths / max(avg_length, 1e-9)
+        )
+
+    @classmethod
+    def from_texts(cls, texts: List[str]) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for token in tokens:
+                counts = postings.setdefault(token, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        doc_ids, term_freqs = [], []
+        for i, term in enumerate(vocabulary):
+            counts = postings[term]
+            doc_ids.extend(counts.keys())
+            term_freqs.extend(counts.values())
+            offsets[i + 1] = offsets[i] + len(counts)
+
+        return cls(
+            vocabulary,
+            offsets,
+            np.asarray(doc_ids, dtype=np.int32),
+            np.minimum(np.asarray(term_freqs), 65535).astype(np.uint16),
+            doc_lengths,
+        )
+
+    @classmethod
+    def from_vector_store(cls, vector_store: FAISS) -> "BM25Index":
+        texts = [
+            vector_store.docstore.search(docstore_id).page_content
+            for _, docstore_id in sorted(vector_store.index_to_docstore_id.items())
+        ]
+        return cls.from_texts(texts)
+
+    @classmethod
+    def load(cls, folder_path: str) -> "BM25Index":
+        with np.load(os.path.join(folder_path, BM25_INDEX_FILE)) as data:
+            return cls(
+                data["vocabulary"].tolist(),
+                data["offsets"],
+                data["doc_ids"],
+                data["term_freqs"],
+                data["doc_lengths"],
+            )
+
+    def save(self, folder_path: str):
+        np.savez_compressed(
+            os.path.join(folder_path, BM25_INDEX_FILE),
+            vocabulary=np.asarray(list(self.vocabulary)),
+            offsets=self.offsets,
+            doc_ids=self.doc_ids,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+
+    def search(
+        self, query: str, k: int, allowed_ids: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, row_ids) of the top-k chunks, best first. Only chunks
+        sharing at least one term with the query are returned.
+        """
+        scores = np.zeros(len(self.doc_lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            scores[docs] += (
+                self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + self.length_norm[docs])
+            )
+
+        if allowed_ids is not None:
+            mask = np.zeros_like(scores, dtype=bool)
+            mask[allowed_ids] = True
+            scores[~mask] = 0
+
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return scores[order], order
+
+
+def reciprocal_rank_fusion(
+    rankings: List[List[int]], k: int = RRF_K
+) -> List[Tuple[int, float]]:
+    """
+    Fuses several ranked lists of row ids: each id scores sum(1 / (k + rank)).
+    Returns (row_id, score) pairs, best first.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row_id in enumerate(ranking, start=1):
+            fused[row_id] = fused.get(row_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,157 @@
+from ..core.circuit_breaker import CircuitBreaker
+from ..core.config import (
+    LLM_CONNECT_TIMEOUT,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_MAX_RETRIES,
+    LLM_REQUEST_TIMEOUT,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+)
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+import httpx
+
+# Shared by every OpenAI client in the process, so all of them stop calling
+# the provider once it keeps failing
+openai_breaker = CircuitBreaker()
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+def _is_failure(response: httpx.Response) -> bool:
+    # Rate limits and server errors count; other client errors are our bugs
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class CircuitBreakerTransport(httpx.BaseTransport):
+    """Refuses requests while the breaker is open and reports each outcome."""
+
+    def __init__(self, transport: httpx.BaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("OpenAI circuit breaker is open", request=request)
+        try:
+            response = self.transport.handle_request(request)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        if _is_failure(response):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of CircuitBreakerTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow_request():
+            raise CircuitOpenError("OpenAI circuit breaker is open", request=request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            raise
+        if _is_failure(response):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+# Initialize the shared clients as None, they will be created on first use
+_http_client = None
+_async_http_client = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Returns the process-wide sync HTTP client shared by every OpenAI client,
+    so connections (and their TLS sessions) are reused across requests.
+    Requests go through the shared circuit breaker.
+    """
+    global _http_client
+    if _http_client is None:
+        transport = httpx.HTTPTransport(limits=_limits())
+        _http_client = httpx.Client(
+            transport=CircuitBreakerTransport(transport, openai_breaker),
+            timeout=_timeout(),
+        )
+    return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Async counterpart of get_http_client, used by ainvoke/astream."""
+    global _async_http_client
+    if _async_http_client is None:
+        transport = httpx.AsyncHTTPTransport(limits=_limits())
+        _async_http_client = httpx.AsyncClient(
+            transport=AsyncCircuitBreakerTransport(transport, openai_breaker),
+            timeout=_timeout(),
+        )
+    return _async_http_client
+
+
+def get_chat_model(model_name: str, **kwargs) -> ChatOpenAI:
+    """
+    Creates a ChatOpenAI instance on the shared connection pool, with the
+    per-call timeout and retry settings unless they are overridden.
+    """
+    kwargs.setdefault("request_timeout", _timeout())
+    kwargs.setdefault("max_retries", LLM_MAX_RETRIES)
+    return ChatOpenAI(
+        openai_api_key=OPENAI_API_KEY,
+        openai_api_base=OPENAI_BASE_URL,
+        model_name=model_name,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        **kwargs,
+    )
+
+
+def get_embeddings_model(model_name: str, **kwargs) -> OpenAIEmbeddings:
+    """
+    Creates an OpenAIEmbeddings instance on the shared connection pool.
+    Against a custom OPENAI_BASE_URL, texts are sent as strings instead of
+    tiktoken token ids, as OpenAI-compatible servers expect.
+    """
+    kwargs.setdefault("check_embedding_ctx_length", OPENAI_BASE_URL is None)
+    kwargs.setdefault("request_timeout", _timeout())
+    kwargs.setdefault("max_retries", LLM_MAX_RETRIES)
+    return OpenAIEmbeddings(
+        openai_api_key=OPENAI_API_KEY,
+        openai_api_base=OPENAI_BASE_URL,
+        model=model_name,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        **kwargs,
+    )
@@ -0,0 +1,145 @@
+from ..core.config import (
+    ROUTER_EMBEDDING_MODEL,
+    ROUTER_MIN_MARGIN,
+    ROUTER_MIN_SIMILARITY,
+)
+from .tools.sql_templates import match_question
+from functools import lru_cache
+from typing import Dict, Optional
+import logging
+import numpy as np
+import re
+
+logger = logging.getLogger(__name__)
+
+# Names of the master agent's tools
+DATABASE_TOOL = "RegulationDatabase"
+DOCUMENT_TOOL = "RegulationDocumentSearch"
+
+# Phrases that point at the regulation table (counts, lists, years, status)
+DATABASE_PATTERNS = [
+    r"\bberapa (banyak|jumlah)?\s*(peraturan|regulasi|uu|pp|perpres|perda)\b",
+    r"\bjumlah (peraturan|regulasi)\b",
+    r"\bhow many\b",
+    r"\bcount\b",
+    r"\b(daftar|list)\b",
+    r"\b(sebutkan|tampilkan) (semua )?(peraturan|regulasi)\b",
+    r"\b(per|setiap|tiap) (tahun|status|jenis)\b",
+    r"\b(terbaru|terlama|latest|newest|oldest)\b",
+    r"\bstatus\w*\b",
+    r"\b(masih|sudah|tidak) berlaku\b",
+    r"\bdicabut\b",
+]
+
+# Phrases that point at the text of the documents
+DOCUMENT_PATTERNS = [
+    r"\b(pasal|ayat|bab|bagian|huruf)\b",
+    r"\b(isi|bunyi|muatan)\b",
+    r"\b(definisi|pengertian|yang dimaksud)\b",
+    r"\b(mengatur|diatur|pengaturan)\b",
+    r"\b(jelaskan|penjelasan|uraikan)\b",
+    r"\b(sanksi|denda|pidana|kewajiban|larangan|hak)\b",
+    r"\bmenurut\b",
+    r"\b(article|clause|definition|explain)\b",
+    r"\b(what does|say about|according to)\b",
+]
+
+# Labelled example questions for the optional embedding classifier
+EXAMPLES = {
+    DATABASE_TOOL: [
+        "Berapa jumlah peraturan yang terbit tahun 2020?",
+        "Sebutkan peraturan pemerintah yang masih berlaku",
+        "Daftar undang-undang tahun 2019",
+        "Peraturan apa saja yang sudah dicabut?",
+        "Jumlah peraturan per tahun",
+        "Apa status Peraturan Pemerintah Nomor 5 Tahun 2021?",
+        "How many regulations were passed in 2020?",
+        "List the latest presidential regulations",
+    ],
+    DOCUMENT_TOOL: [
+        "Apa isi Pasal 5 tentang perlindungan data pribadi?",
+        "Apa yang dimaksud dengan penyelenggara sistem elektronik?",
+        "Apa sanksi bagi pelanggar ketentuan ini?",
+        "Jelaskan kewajiban pengendali data pribadi",
+        "Bagaimana prosedur pengajuan keberatan menurut peraturan ini?",
+        "Siapa yang berwenang menerbitkan izin usaha?",
+        "What does the law say about personal data protection?",
+        "Explain the obligations of electronic system operators",
+    ],
+}
+
+
+def rule_scores(question: str) -> Dict[str, int]:
+    """Counts the database and document patterns found in the question."""
+    text = question.lower()
+    return {
+        DATABASE_TOOL: sum(bool(re.search(p, text)) for p in DATABASE_PATTERNS),
+        DOCUMENT_TOOL: sum(bool(re.search(p, text)) for p in DOCUMENT_PATTERNS),
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_example_classifier():
+    """
+    Loads the local embedding model and embeds the examples, once. Returns
+    None when no model is configured or sentence-transformers isn't installed.
+    """
+    if not ROUTER_EMBEDDING_MODEL:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning(
+            "ROUTER_EMBEDDING_MODEL is set but sentence-transformers is not "
+            "installed; routing uses rules only."
+        )
+        return None
+    model = SentenceTransformer(ROUTER_EMBEDDING_MODEL)
+    labels = [label for label, texts in EXAMPLES.items() for _ in texts]
+    texts = [text for examples in EXAMPLES.values() for text in examples]
+    vectors = model.encode(texts, normalize_embeddings=True)
+    return model, labels, np.asarray(vectors)
+
+
+def embedding_scores(question: str) -> Optional[Dict[str, float]]:
+    """Highest cosine similarity to the examples of each tool, if enabled."""
+    classifier = _get_example_classifier()
+    if classifier is None:
+        return None
+    model, labels, vectors = classifier
+    query = model.encode([question], normalize_embeddings=True)[0]
+    scores: Dict[str, float] = {}
+    for label, similarity in zip(labels, vectors @ query):
+        scores[label] = max(scores.get(label, -1.0), float(similarity))
+    return scores
+
+
+def route_question(question: str) -> Optional[str]:
+    """
+    Picks the tool for a question without an LLM call, or returns None when
+    it isn't clear and the master agent should decide.
+
+    Questions the SQL templates can answer and questions matching only one
+    set of rules are routed directly. Otherwise, if a local embedding model
+    is configured, the question goes to the tool whose examples it is
+    clearly closest to.
+    """
+    if match_question(question) is not None:
+        return DATABASE_TOOL
+
+    scores = rule_scores(question)
+    if scores[DATABASE_TOOL] and not scores[DOCUMENT_TOOL]:
+        return DATABASE_TOOL
+    if scores[DOCUMENT_TOOL] and not scores[DATABASE_TOOL]:
+        return DOCUMENT_TOOL
+
+    similarities = embedding_scores(question)
+    if similarities is None:
+        return None
+    best, second = sorted(similarities, key=similarities.get, reverse=True)
+    if (
+        similarities[best] >= ROUTER_MIN_SIMILARITY
+        and similarities[best] - similarities[second] >= ROUTER_MIN_MARGIN
+    ):
+        return best
+    return None
@@ -0,0 +1,285 @@
+from ..core.config import FAISS_SHARD_SEARCH_WORKERS
+from .index_factory import configure_search
+from .vector_index import search_index
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from typing import Any, Dict, List, Optional
+import faiss
+import heapq
+import json
+import numpy as np
+import os
+import re
+import shutil
+
+SHARD_MANIFEST_FILE = "shards.json"
+SHARDS_DIR = "shards"
+INDEX_FILE = "index.faiss"
+CHUNK_IDS_FILE = "chunk_ids.json"
+
+# How chunks can be partitioned into shards; "none" keeps one index
+SHARD_BY_OPTIONS = ("none", "bentuk_singkat", "year")
+
+# Chunk metadata field each option reads
+SHARD_FIELDS = {"bentuk_singkat": "bentuk_singkat", "year": "tahun"}
+
+# Key of the single shard of an unsharded index, stored in the folder itself
+ROOT_SHARD = ""
+
+UNKNOWN_SHARD = "unknown"
+
+
+def sharding_scheme(shard_by: str, year_range: int) -> Dict[str, Any]:
+    """The settings that decide which shard a chunk belongs to."""
+    if shard_by not in SHARD_BY_OPTIONS:
+        raise ValueError(
+            f"Unknown shard key '{shard_by}'. Choose one of {SHARD_BY_OPTIONS}."
+        )
+    return {
+        "shard_by": shard_by,
+        "year_range": year_range if shard_by == "year" else None,
+    }
+
+
+def shard_key(metadata: Dict[str, Any], scheme: Dict[str, Any]) -> str:
+    """
+    The shard a chunk belongs to, e.g. "pp" by bentuk_singkat or "2000-2009"
+    by year range. Keys are also the shards' directory names.
+    """
+    if scheme["shard_by"] == "none":
+        return ROOT_SHARD
+    value = metadata.get(SHARD_FIELDS[scheme["shard_by"]])
+    if value is None or str(value).strip() == "":
+        return UNKNOWN_SHARD
+    if scheme["shard_by"] == "year":
+        try:
+            year = int(value)
+        except (TypeError, ValueError):
+            return UNKNOWN_SHARD
+        start = year - year % scheme["year_range"]
+        return f"{start}-{start + scheme['year_range'] - 1}"
+    return re.sub(r"[^0-9a-z]+", "_", str(value).strip().lower()).strip("_")
+
+
+def shard_path(folder_path: str, key: str) -> str:
+    if key == ROOT_SHARD:
+        return folder_path
+    return os.path.join(folder_path, SHARDS_DIR, key)
+
+
+def load_shard_manifest(folder_path: str) -> Optional[Dict[str, Any]]:
+    """
+    The shard manifest lists the shards of a sharded index with their chunk
+    counts, e.g. {"scheme": {...}, "shards": {"pp": {"chunks": 120}}}.
+    Returns None for an unsharded index.
+    """
+    try:
+        with open(os.path.join(folder_path, SHARD_MANIFEST_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_shard_indexes(folder_path: str) -> Dict[str, faiss.Index]:
+    """
+    Loads the FAISS index of every shard by key; an unsharded index is
+    returned as its single root shard. Raises if a shard can't be read.
+    """
+    manifest = load_shard_manifest(folder_path)
+    keys = [ROOT_SHARD] if manifest is None else sorted(manifest["shards"])
+    return {
+        key: configure_search(
+            faiss.read_index(os.path.join(shard_path(folder_path, key), INDEX_FILE))
+        )
+        for key in keys
+    }
+
+
+def save_shards(
+    folder_path: str,
+    indexes: Dict[str, faiss.Index],
+    scheme: Dict[str, Any],
+    changed: List[str],
+):
+    """
+    Writes the changed shards' indexes and the manifest; changed shards that
+    are no longer in `indexes` are deleted. Unchanged shards are left as they
+    are on disk. Only vectors are written: chunk texts live in the database.
+    """
+    for key in changed:
+        path = shard_path(folder_path, key)
+        if key in indexes:
+            os.makedirs(path, exist_ok=True)
+            faiss.write_index(indexes[key], os.path.join(path, INDEX_FILE))
+        elif key != ROOT_SHARD:
+            shutil.rmtree(path, ignore_errors=True)
+
+    manifest_path = os.path.join(folder_path, SHARD_MANIFEST_FILE)
+    if scheme["shard_by"] == "none":
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return
+    manifest = {
+        "scheme": scheme,
+        "shards": {
+            key: {"chunks": int(index.ntotal)} for key, index in sorted(indexes.items())
+        },
+    }
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def save_chunk_ids(folder_path: str, chunk_ids: List[str]):
+    """
+    Writes the chunk id of every row of the merged index, in row order.
+    Each index build carries its own mapping, so a process that loaded an
+    older build keeps hydrating its rows correctly after a re-ingest.
+    """
+    with open(os.path.join(folder_path, CHUNK_IDS_FILE), "w") as f:
+        json.dump(chunk_ids, f)
+
+
+def load_chunk_ids(folder_path: str) -> List[str]:
+    """The chunk ids of the merged index's rows; raises if none were saved."""
+    with open(os.path.join(folder_path, CHUNK_IDS_FILE)) as f:
+        return json.load(f)
+
+
+def remove_index_files(folder_path: str):
+    """Deletes the index files of any layout, before a rebuild from scratch."""
+    shutil.rmtree(os.path.join(folder_path, SHARDS_DIR), ignore_errors=True)
+    for name in (SHARD_MANIFEST_FILE, INDEX_FILE, CHUNK_IDS_FILE, "index.pkl"):
+        path = os.path.join(folder_path, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get_index_version(folder_path: str) -> str:
+    """
+    Identifies the index build on disk. Ingestion rewrites the shard manifest
+    (or, unsharded, the index file) on every change.
+    """
+    name = SHARD_MANIFEST_FILE
+    if not os.path.exists(os.path.join(folder_path, name)):
+        name = INDEX_FILE
+    return str(os.stat(os.path.join(folder_path, name)).st_mtime_ns)
+
+
+class ShardedIndex:
+    """
+    Searches several FAISS indexes as if they were one.
+
+    Row ids run across the shards in order (shard 0 has 0..n0-1, shard 1
+    starts at n0, ...), so the metadata and BM25 indexes built over the merged
+    docstore line up with them. A search fans out to the shards in a thread
+    pool (FAISS releases the GIL while searching) and the per-shard top-k
+    lists are merged with a heap. Filtered searches only visit the shards
+    that hold allowed rows.
+    """
+
+    def __init__(
+        self, indexes: List[faiss.Index], workers: int = FAISS_SHARD_SEARCH_WORKERS
+    ):
+        self.indexes = indexes
+        self.offsets = np.cumsum([0] + [index.ntotal for index in indexes])
+        self.ntotal = int(self.offsets[-1])
+        self.d = indexes[0].d
+        self._pool = ThreadPoolExecutor(
+            max_workers=max(1, min(workers, len(indexes))),
+            thread_name_prefix="faiss-shard",
+        )
+
+    def _shard_of(self, row_ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.offsets, row_ids, side="right") - 1
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        k: int,
+        allowed_ids: Optional[np.ndarray] = None,
+    ):
+        """Same output as a FAISS search: (distances, row ids), padded with -1."""
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        if allowed_ids is None:
+            jobs = [(shard, None) for shard in range(len(self.indexes))]
+        else:
+            shards = self._shard_of(allowed_ids)
+            jobs = [
+                (shard, allowed_ids[shards == shard] - self.offsets[shard])
+                for shard in np.unique(shards)
+            ]
+
+        def search_shard(job):
+            shard, local_ids = job
+            return shard, search_index(
+                self.indexes[shard], query_vectors, k, allowed_ids=local_ids
+            )
+
+        if len(jobs) == 1:
+            results = [search_shard(jobs[0])]
+        else:
+            results = list(self._pool.map(search_shard, jobs))
+
+        distances = np.full((len(query_vectors), k), np.inf, dtype=np.float32)
+        indices = np.full((len(query_vectors), k), -1, dtype=np.int64)
+        for i in range(len(query_vectors)):
+            ranked = [
+                [
+                    (float(distance), int(row_id) + int(self.offsets[shard]))
+                    for distance, row_id in zip(shard_distances[i], shard_ids[i])
+                    if row_id != -1
+                ]
+                for shard, (shard_distances, shard_ids) in results
+            ]
+            for j, (distance, row_id) in enumerate(islice(heapq.merge(*ranked), k)):
+                distances[i, j] = distance
+                indices[i, j] = row_id
+        return distances, indices
+
+    def reconstruct_batch(self, row_ids: np.ndarray) -> np.ndarray:
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        vectors = np.empty((len(row_ids), self.d), dtype=np.float32)
+        shards = self._shard_of(row_ids)
+        for shard in np.unique(shards):
+            mask = shards == shard
+            vectors[mask] = self.indexes[shard].reconstruct_batch(
+                row_ids[mask] - self.offsets[shard]
+            )
+        return vectors
+
+
+def merge_indexes(indexes: Dict[str, faiss.Index]):
+    """
+    One index over all shards, in key order (a single shard is returned as
+    it is). Its rows are listed by the build's chunk ids (see save_chunk_ids).
+    """
+    if not indexes:
+        raise ValueError("The index has no shards.")
+    if len(indexes) == 1:
+        return next(iter(indexes.values()))
+    return ShardedIndex([index for _, index in sorted(indexes.items())])
+
+
+def merge_shards(shards: Dict[str, FAISS], embeddings: Embeddings) -> FAISS:
+    """
+    A single vector store over the shards being ingested: their merged index
+    with one docstore and row id mapping, so row ids match merge_indexes.
+    """
+    if len(shards) == 1:
+        return next(iter(shards.values()))
+    documents, index_to_docstore_id = {}, {}
+    offset = 0
+    for _, shard in sorted(shards.items()):
+        for row_id, doc_id in shard.index_to_docstore_id.items():
+            index_to_docstore_id[offset + row_id] = doc_id
+            documents[doc_id] = shard.docstore.search(doc_id)
+        offset += shard.index.ntotal
+    return FAISS(
+        embeddings,
+        merge_indexes({key: shard.index for key, shard in shards.items()}),
+        InMemoryDocstore(documents),
+        index_to_docstore_id,
+    )
@@ -1,23 +1,30 @@
-from ...core.config import OPENAI_API_KEY
+from ...core.config import (
+    RAG_CONTEXT_K,
+    RAG_CONTEXT_TOKEN_BUDGET,
+    RAG_FETCH_K,
+    RAG_MMR_LAMBDA,
+)
+from ..llm import get_chat_model
+from ..vector_search_service import SearchServiceRetriever
 from langchain.chains import RetrievalQA
-from langchain_community.vectorstores import FAISS
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-
-FAISS_INDEX_PATH = "data/faiss_index"
 
-# 1. Initialize LLM and Embeddings
-llm = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model_name="gpt-3.5-turbo")
-embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+# 1. Initialize LLM
+llm = get_chat_model("gpt-3.5-turbo")
 
-# 2. Load the local FAISS index
-vector_store = FAISS.load_local(
-    FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True
+# 2. Create a retriever over the shared search service. Hybrid mode fuses
+# BM25 with vector search, so exact citations like "Pasal 5 ayat (2)" or
+# regulation numbers are retrieved even when embeddings miss them.
+# Candidates are assembled into a compact context: overlapping chunks are
+# merged, MMR keeps passages diverse and the total stays within a token budget.
+retriever = SearchServiceRetriever(
+    mode="hybrid",
+    k=RAG_CONTEXT_K,
+    fetch_k=RAG_FETCH_K,
+    token_budget=RAG_CONTEXT_TOKEN_BUDGET,
+    lambda_mult=RAG_MMR_LAMBDA,
 )
 
-# 3. Create a retriever
-retriever = vector_store.as_retriever()
-
-# 4. Create the RetrievalQA chain
+# 3. Create the RetrievalQA chain
 rag_chain = RetrievalQA.from_chain_type(
     llm=llm, chain_type="stuff", retriever=retriever, return_source_documents=True
 )
@@ -29,3 +36,9 @@ def query_document_content(user_question: str) -> str:
     """
     result = rag_chain({"query": user_question})
     return result["result"]
+
+
+async def aquery_document_content(user_question: str) -> str:
+    """Async version of query_document_content, used by the async agent."""
+    result = await rag_chain.ainvoke({"query": user_question})
+    return result["result"]
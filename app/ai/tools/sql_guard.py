@@ -0,0 +1,67 @@
+from ...core.config import SQL_AGENT_MAX_COST, SQL_AGENT_MAX_ROWS
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+import json
+import re
+
+_READ_STATEMENT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+
+
+class QueryRejectedError(SQLAlchemyError):
+    """
+    Raised for generated SQL that is not allowed to run. It subclasses
+    SQLAlchemyError so the agent's query tool reports it back to the LLM,
+    which can then rewrite the query.
+    """
+
+
+class GuardedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase that only runs a single SELECT per call, caps the number of
+    rows returned and, on PostgreSQL, rejects queries whose planner cost
+    estimate is above `max_cost` before running them.
+    """
+
+    def __init__(
+        self,
+        *args,
+        max_rows: int = SQL_AGENT_MAX_ROWS,
+        max_cost: float = SQL_AGENT_MAX_COST,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.max_rows = max_rows
+        self.max_cost = max_cost
+
+    def check_query(self, command: str) -> str:
+        """Validates a generated query and returns it without the trailing ';'."""
+        command = command.strip().rstrip(";").strip()
+        if ";" in command:
+            raise QueryRejectedError("Only a single SQL statement is allowed.")
+        if not _READ_STATEMENT.match(command):
+            raise QueryRejectedError("Only SELECT queries are allowed.")
+        return command
+
+    def estimated_cost(self, command: str) -> float:
+        with self._engine.connect() as connection:
+            plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {command}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return float(plan[0]["Plan"]["Total Cost"])
+
+    def _execute(self, command, fetch="all", **kwargs):
+        if isinstance(command, str):
+            command = self.check_query(command)
+            if self.dialect == "postgresql":
+                cost = self.estimated_cost(command)
+                if cost > self.max_cost:
+                    raise QueryRejectedError(
+                        f"Query is too expensive (estimated cost {cost:.0f}, "
+                        f"limit {self.max_cost:.0f}). Add filters or aggregate."
+                    )
+            # Wrapping keeps any LIMIT/ORDER BY the query already has
+            command = (
+                f"SELECT * FROM ({command}) AS limited_query LIMIT {self.max_rows}"
+            )
+        return super()._execute(command, fetch, **kwargs)
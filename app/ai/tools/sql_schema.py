@@ -0,0 +1,74 @@
+from ...models.regulation import Regulation
+from sqlalchemy import func, select
+from sqlalchemy.engine import Engine
+from typing import Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns with few distinct values; listing them lets the agent write exact
+# WHERE clauses (e.g. status = 'Berlaku') without exploring the data first
+LOW_CARDINALITY_COLUMNS = ("status", "bentuk_singkat", "bahasa")
+MAX_DISTINCT_VALUES = 25
+
+
+def build_schema_summary(engine: Engine) -> str:
+    """
+    Describes the regulation table for the SQL agent's prompt: one line per
+    column plus the row count, the year range and the most common values of
+    the low-cardinality columns.
+    """
+    table = Regulation.__table__
+    columns = ",\n".join(
+        f"  {column.name} {column.type.compile(dialect=engine.dialect)}"
+        + (" PRIMARY KEY" if column.primary_key else "")
+        for column in table.columns
+    )
+    lines = [f"CREATE TABLE {table.name} (\n{columns}\n)", "/*"]
+
+    with engine.connect() as connection:
+        row_count, first_year, last_year = connection.execute(
+            select(func.count(), func.min(Regulation.tahun), func.max(Regulation.tahun))
+        ).one()
+        lines.append(
+            f"{row_count} rows; tahun (stored as text) ranges from "
+            f"{first_year} to {last_year}."
+        )
+
+        lines.append("Most common values (with row counts):")
+        for name in LOW_CARDINALITY_COLUMNS:
+            column = table.c[name]
+            rows = connection.execute(
+                select(column, func.count())
+                .where(column.is_not(None))
+                .group_by(column)
+                .order_by(func.count().desc(), column)
+                .limit(MAX_DISTINCT_VALUES)
+            ).all()
+            values = ", ".join(f"'{value}' ({count})" for value, count in rows)
+            lines.append(f"{name}: {values or '(none)'}")
+
+    lines.append("*/")
+    return "\n".join(lines)
+
+
+def distinct_values(engine: Engine, name: str, case: str = "upper") -> Set[str]:
+    """Every non-null value of a regulation column, upper- or lower-cased."""
+    column = getattr(func, case)(Regulation.__table__.c[name])
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(column).where(column.is_not(None)).distinct()
+        ).all()
+    return {value for value, in rows}
+
+
+# The summary is built once per process, on startup or first use
+_schema_summary = None
+
+
+def get_schema_summary(engine: Engine) -> str:
+    global _schema_summary
+    if _schema_summary is None:
+        _schema_summary = build_schema_summary(engine)
+        logger.info("Built the regulation schema summary for the SQL agent")
+    return _schema_summary
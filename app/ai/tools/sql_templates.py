@@ -0,0 +1,252 @@
+from ...core.database import engine
+from ...core.redis_client import get_cache, get_data_version, set_cache
+from ...models.regulation import Regulation
+from .sql_schema import distinct_values
+from sqlalchemy import func, select
+from typing import Any, Dict, Optional
+import json
+import logging
+import re
+import redis
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of regulations listed in a fast-path answer
+LIST_LIMIT = 20
+
+# Fast-path results are cached per data version, so this TTL only bounds memory
+FAST_PATH_CACHE_TTL = 3600
+
+# While Redis (and so the data version) is unavailable, the type and status
+# values read from the database are reused for this many seconds
+COLUMN_VALUES_FALLBACK_TTL = 60
+
+# Long regulation type names, rewritten to their short form before matching.
+# Longest first, so "peraturan pemerintah pengganti ..." is not read as PP.
+TYPE_PHRASES = [
+    ("peraturan pemerintah pengganti undang undang", "perpu"),
+    ("undang undang", "uu"),
+    ("peraturan pemerintah", "pp"),
+    ("peraturan presiden", "perpres"),
+    ("keputusan presiden", "keppres"),
+    ("instruksi presiden", "inpres"),
+    ("peraturan menteri keuangan", "pmk"),
+    ("peraturan menteri", "permen"),
+    ("peraturan daerah", "perda"),
+    ("peraturan gubernur", "pergub"),
+    ("peraturan bupati", "perbup"),
+    ("peraturan wali kota", "perwali"),
+    ("peraturan walikota", "perwali"),
+]
+TYPE_ALIASES = {"perppu": "perpu"}
+TYPES = {
+    "uu", "perpu", "pp", "perpres", "keppres", "inpres", "permen", "pmk",
+    "perda", "pergub", "perbup", "perwali",
+}  # fmt: skip
+
+STATUS_PHRASES = [("tidak berlaku", "tidak_berlaku")]
+STATUSES = {"tidak_berlaku": "tidak berlaku", "berlaku": "berlaku"}
+
+# How filter values are compared with their column (see _where)
+FILTER_CASES = {"bentuk_singkat": "upper", "status": "lower"}
+
+COUNT_WORDS = {"berapa", "jumlah", "banyaknya", "banyak", "how", "many", "count"}
+LIST_WORDS = {"daftar", "sebutkan", "tampilkan", "list", "show", "saja"}
+GROUP_WORDS = {"per", "setiap", "tiap", "by", "each"}
+GROUP_COLUMNS = {
+    "tahun": "tahun",
+    "year": "tahun",
+    "status": "status",
+    "jenis": "bentuk_singkat",
+    "bentuk": "bentuk_singkat",
+    "type": "bentuk_singkat",
+}
+
+# Words that carry no meaning for these templates. Any other word in the
+# question means it asks something the templates can't answer exactly, so it
+# goes to the agent instead.
+FILLER_WORDS = {
+    "apa", "ada", "adakah", "all", "are", "berstatus", "dalam", "dari",
+    "dengan", "di", "in", "is", "jenis", "masih", "of", "pada", "peraturan",
+    "regulasi", "regulation", "regulations", "seluruh", "semua", "status",
+    "sudah", "tahun", "telah", "terdapat", "the", "there", "total", "untuk",
+    "were", "what", "with", "year", "yang",
+}  # fmt: skip
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercases a question, drops punctuation and rewrites long regulation
+    type and status phrases to single tokens, e.g. "peraturan pemerintah"
+    to "pp" and "tidak berlaku" to "tidak_berlaku".
+    """
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"[^0-9a-z]+", " ", text)
+    for phrase, replacement in TYPE_PHRASES + STATUS_PHRASES:
+        text = re.sub(rf"\b{phrase}\b", replacement, text)
+    return text
+
+
+def match_question(question: str) -> Optional[Dict[str, Any]]:
+    """
+    Matches a question against the count / list / count-per-column templates.
+    Returns the intent with its filters, or None when the question has to go
+    through the SQL agent.
+    """
+    tokens = normalize_question(question).split()
+    filters: Dict[str, str] = {}
+    intents = set()
+    group_by = None
+
+    for i, token in enumerate(tokens):
+        token = TYPE_ALIASES.get(token, token)
+        previous = tokens[i - 1] if i else ""
+        if previous in GROUP_WORDS and token in GROUP_COLUMNS:
+            group_by = GROUP_COLUMNS[token]
+        elif re.fullmatch(r"(19|20)\d\d", token):
+            if filters.setdefault("tahun", token) != token:
+                return None  # Several years: leave it to the agent
+        elif token in TYPES:
+            if filters.setdefault("bentuk_singkat", token.upper()) != token.upper():
+                return None
+        elif token in STATUSES:
+            if filters.setdefault("status", STATUSES[token]) != STATUSES[token]:
+                return None
+        elif token in COUNT_WORDS:
+            intents.add("count")
+        elif token in LIST_WORDS:
+            intents.add("list")
+        elif token in GROUP_WORDS or token in FILLER_WORDS:
+            continue
+        else:
+            return None
+
+    if group_by is not None:
+        if "list" in intents or group_by in filters:
+            return None
+        return {"intent": "group", "filters": filters, "group_by": group_by}
+    if len(intents) != 1:
+        return None
+    return {"intent": intents.pop(), "filters": filters, "group_by": None}
+
+
+def _where(statement, filters: Dict[str, str]):
+    if "tahun" in filters:
+        statement = statement.where(Regulation.tahun == filters["tahun"])
+    if "bentuk_singkat" in filters:
+        statement = statement.where(
+            func.upper(Regulation.bentuk_singkat) == filters["bentuk_singkat"]
+        )
+    if "status" in filters:
+        statement = statement.where(func.lower(Regulation.status) == filters["status"])
+    return statement
+
+
+def _describe(filters: Dict[str, str]) -> str:
+    parts = [f"{column} = {value}" for column, value in sorted(filters.items())]
+    return f" ({', '.join(parts)})" if parts else ""
+
+
+def _run(match: Dict[str, Any]) -> str:
+    """Executes the bound, parameterized query for a template match."""
+    filters = match["filters"]
+    with engine.connect() as connection:
+        if match["intent"] == "count":
+            statement = _where(select(func.count()).select_from(Regulation), filters)
+            count = connection.execute(statement).scalar_one()
+            return f"Jumlah peraturan{_describe(filters)}: {count}"
+
+        if match["intent"] == "group":
+            column = getattr(Regulation, match["group_by"])
+            statement = _where(
+                select(column, func.count()).group_by(column).order_by(column),
+                filters,
+            )
+            rows = connection.execute(statement).all()
+            lines = [f"- {value or '-'}: {count}" for value, count in rows]
+            header = f"Jumlah peraturan per {match['group_by']}{_describe(filters)}:"
+            return "\n".join([header] + lines)
+
+        statement = _where(
+            select(Regulation.nama_peraturan, Regulation.tahun, Regulation.status)
+            .order_by(Regulation.tahun.desc(), Regulation.nama_peraturan)
+            .limit(LIST_LIMIT + 1),
+            filters,
+        )
+        rows = connection.execute(statement).all()
+        lines = [f"- {name} ({tahun}, {status})" for name, tahun, status in rows]
+        if len(rows) > LIST_LIMIT:
+            lines = lines[:LIST_LIMIT] + [f"(only the first {LIST_LIMIT} are shown)"]
+        header = f"Daftar peraturan{_describe(filters)}:"
+        return "\n".join([header] + (lines or ["(none)"]))
+
+
+# Type and status values present in the data, for the last data version
+_column_values: Dict[str, Any] = {"version": None, "loaded_at": 0.0, "values": {}}
+
+
+def _filters_exist(filters: Dict[str, str], data_version: Optional[str]) -> bool:
+    """
+    Whether every type and status filter names a value the data has. Not all
+    rows have a bentuk_singkat (e.g. ministerial regulations), so a count
+    of PERMEN would confidently answer 0; such questions go to the agent.
+    Without a data version the values are kept COLUMN_VALUES_FALLBACK_TTL
+    seconds, so a Redis outage doesn't add a query to every question.
+    """
+    now = time.monotonic()
+    if data_version is None:
+        fresh = now - _column_values["loaded_at"] <= COLUMN_VALUES_FALLBACK_TTL
+    else:
+        fresh = _column_values["version"] == data_version
+    if not fresh:
+        _column_values.update(version=data_version, loaded_at=now, values={})
+    values = _column_values["values"]
+    for column, case in FILTER_CASES.items():
+        if column not in filters:
+            continue
+        if column not in values:
+            values[column] = distinct_values(engine, column, case)
+        if filters[column] not in values[column]:
+            return False
+    return True
+
+
+def answer_from_template(question: str) -> Optional[str]:
+    """
+    Answers common aggregate questions without the SQL agent.
+    Results are cached in Redis per regulation data version. Returns None if
+    no template matches or a filter names a type or status the data lacks.
+    """
+    match = match_question(question)
+    if match is None:
+        return None
+
+    try:
+        data_version = get_data_version()
+    except redis.RedisError as e:
+        logger.warning(f"SQL fast-path cache read failed: {e}")
+        data_version = None
+    if not _filters_exist(match["filters"], data_version):
+        return None
+
+    cache_key = None
+    if data_version is not None:
+        params = json.dumps(match, sort_keys=True)
+        cache_key = f"sql_fastpath:{data_version}:{params}"
+        try:
+            cached = get_cache(cache_key)
+            if cached:
+                return cached["answer"]
+        except redis.RedisError as e:
+            logger.warning(f"SQL fast-path cache read failed: {e}")
+            cache_key = None
+
+    answer = _run(match)
+    if cache_key is not None:
+        try:
+            set_cache(cache_key, {"answer": answer}, ttl=FAST_PATH_CACHE_TTL)
+        except redis.RedisError as e:
+            logger.warning(f"SQL fast-path cache write failed: {e}")
+    return answer
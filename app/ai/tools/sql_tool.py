@@ -1,7 +1,32 @@
-from ...core.database import engine
+from ...core.database import get_readonly_engine
+from ..llm import get_chat_model
+from .sql_guard import GuardedSQLDatabase
+from .sql_schema import get_schema_summary
+from .sql_templates import answer_from_template
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_community.agent_toolkits import create_sql_agent
-from langchain_community.utilities import SQLDatabase
-from langchain_openai import ChatOpenAI
+import asyncio
+
+# The schema is part of the prompt, so the agent can write its query in the
+# first turn instead of listing tables and reading their schema
+SQL_AGENT_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """You are an agent that answers questions by querying a {dialect} database.
+Available tables: {table_names}. Only use the regulation table to answer questions.
+Its schema and typical values are below, so write the SQL query right away:
+
+{table_info}
+
+Unless the user asks for a specific number of results, return at most {top_k} rows.
+Only use SELECT statements. If a query fails, read the error, fix the query and
+try again.""",
+        ),
+        ("user", "{input}"),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ]
+)
 
 # Initialize global variables to None, they will be populated on first use
 _llm = None
@@ -18,43 +43,78 @@ def get_sql_agent():
 
     # This check ensures that the setup runs only once
     if _sql_agent_executor is None:
-        # Configuration is imported and used here to avoid load-time errors
-        from ...core.config import OPENAI_API_KEY
+        # Initialize the LLM on the shared connection pool
+        _llm = get_chat_model("gpt-4-turbo-preview", temperature=0)
 
-        # Initialize the LLM
-        _llm = ChatOpenAI(
-            model="gpt-4-turbo-preview", temperature=0, openai_api_key=OPENAI_API_KEY
+        # Connect LangChain to the database through its own read-only,
+        # time-bounded pool, with row limits and a cost check on every query
+        # The table info is the cached schema summary instead of a fresh
+        # reflection with sample rows
+        readonly_engine = get_readonly_engine()
+        _db = GuardedSQLDatabase(
+            engine=readonly_engine,
+            include_tables=["regulation"],
+            sample_rows_in_table_info=0,
+            custom_table_info={"regulation": get_schema_summary(readonly_engine)},
         )
 
-        # Connect LangChain to the database
-        _db = SQLDatabase(engine=engine)
-
-        # Create the SQL Agent
+        # Create the SQL Agent. With table_info and table_names in the prompt,
+        # the list-tables and schema tools are left out.
         _sql_agent_executor = create_sql_agent(
             llm=_llm,
             db=_db,
             agent_type="openai-tools",
             verbose=True,
-            prompt_suffix="Only use the regulation table to answer questions.",
+            prompt=SQL_AGENT_PROMPT,
         )
 
     return _sql_agent_executor
 
 
+def _agent_input(user_question: str) -> dict:
+    return {"input": f"Answer the following user's question: {user_question}"}
+
+
+# Answers that report a failure rather than answer the question. The agent
+# reads them as observations; a directly routed question falls back to it.
+ERROR_PREFIX = "An error occurred: "
+NO_ANSWER = "I could not retrieve an answer from the database."
+
+
+def is_failed_answer(answer: str) -> bool:
+    return answer.startswith(ERROR_PREFIX) or answer == NO_ANSWER
+
+
 def query_database(user_question: str) -> str:
     """
     Uses the SQL Agent to query the regulation database based on a user's question.
+    Common count/list questions are answered by precompiled query templates
+    first; only the rest reach the agent.
     """
     try:
+        answer = answer_from_template(user_question)
+        if answer is not None:
+            return answer
+
         # Get the agent instance (it will be created if it doesn't exist yet)
         agent = get_sql_agent()
 
-        response = agent.invoke(
-            {"input": f"Answer the following user's question: {user_question}"}
-        )
-        return response.get(
-            "output", "I could not retrieve an answer from the database."
-        )
+        response = agent.invoke(_agent_input(user_question))
+        return response.get("output", NO_ANSWER)
     except Exception as e:
         # Handle potential errors during query execution
-        return f"An error occurred: {e}"
+        return f"{ERROR_PREFIX}{e}"
+
+
+async def aquery_database(user_question: str) -> str:
+    """Async version of query_database, used by the async agent."""
+    try:
+        answer = await asyncio.to_thread(answer_from_template, user_question)
+        if answer is not None:
+            return answer
+
+        agent = get_sql_agent()
+        response = await agent.ainvoke(_agent_input(user_question))
+        return response.get("output", NO_ANSWER)
+    except Exception as e:
+        return f"{ERROR_PREFIX}{e}"
@@ -0,0 +1,277 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MetricsRegistry:
+    """
+    Process-wide aggregates of finished spans, per (kind, name, model):
+    call and error counts, a latency histogram and token totals. Rendered in
+    the Prometheus text format by the metrics endpoint.
+    """
+
+    def __init__(self):
+        self._series: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: Dict[str, Any]):
+        key = (span["kind"], span["name"], span.get("model") or "")
+        seconds = span["duration_ms"] / 1000
+        with self._lock:
+            series = self._series.setdefault(
+                key,
+                {
+                    "count": 0,
+                    "errors": 0,
+                    "seconds": 0.0,
+                    "buckets": [0] * len(LATENCY_BUCKETS),
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                },
+            )
+            series["count"] += 1
+            series["errors"] += int(span.get("error") is not None)
+            series["seconds"] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+            series["prompt_tokens"] += span.get("prompt_tokens") or 0
+            series["completion_tokens"] += span.get("completion_tokens") or 0
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> str:
+        lines = [
+            "# TYPE agent_span_duration_seconds histogram",
+            "# TYPE agent_span_errors_total counter",
+            "# TYPE agent_tokens_total counter",
+        ]
+        with self._lock:
+            for (kind, name, model), series in sorted(self._series.items()):
+                labels = f'kind="{kind}",name="{name}",model="{model}"'
+                for bound, count in zip(LATENCY_BUCKETS, series["buckets"]):
+                    lines.append(
+                        f'agent_span_duration_seconds_bucket{{{labels},le="{bound}"}}'
+                        f" {count}"
+                    )
+                lines += [
+                    f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}}'
+                    f" {series['count']}",
+                    f"agent_span_duration_seconds_sum{{{labels}}}"
+                    f" {series['seconds']:.6f}",
+                    f"agent_span_duration_seconds_count{{{labels}}} {series['count']}",
+                    f"agent_span_errors_total{{{labels}}} {series['errors']}",
+                ]
+                if kind == "llm":
+                    lines += [
+                        f'agent_tokens_total{{{labels},type="prompt"}}'
+                        f" {series['prompt_tokens']}",
+                        f'agent_tokens_total{{{labels},type="completion"}}'
+                        f" {series['completion_tokens']}",
+                    ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def _model_name(kwargs: Dict[str, Any], metadata: Optional[Dict[str, Any]]) -> str:
+    params = kwargs.get("invocation_params") or {}
+    return (
+        params.get("model_name")
+        or params.get("model")
+        or (metadata or {}).get("ls_model_name")
+        or ""
+    )
+
+
+def _token_usage(response: LLMResult) -> Tuple[int, int]:
+    """Reads token counts from a chat generation or, failing that, llm_output."""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(
+                getattr(generation, "message", None), "usage_metadata", None
+            )
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not prompt_tokens and not completion_tokens:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records a span for every LLM call, tool call and retrieval of one request.
+
+    Attach it through the run config; LangChain hands it down to nested runs,
+    including the RAG chain and the SQL sub-agent inside the tools. Finished
+    spans are kept on the handler (for per-response timing) and added to the
+    process-wide metrics. The search service adds embedding and FAISS
+    spans of the retrievals it runs (see trace_span).
+
+    Callbacks run inline rather than in LangChain's executor, and the span
+    state is locked, as parallel tool calls report from several threads.
+    """
+
+    run_inline = True
+
+    def __init__(self, registry: MetricsRegistry = metrics):
+        self.registry = registry
+        self.spans: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, kind: str, name: str, model: str = ""):
+        with self._lock:
+            self._open[run_id] = {
+                "kind": kind,
+                "name": name,
+                "model": model,
+                "start": time.perf_counter(),
+            }
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **fields):
+        with self._lock:
+            span = self._open.pop(run_id, None)
+        if span is None:
+            return
+        start = span.pop("start")
+        span["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        span["error"] = type(error).__name__ if error is not None else None
+        span.update(fields)
+        self.add_span(span)
+
+    def add_span(self, span: Dict[str, Any]):
+        """Records a finished span."""
+        with self._lock:
+            self.spans.append(span)
+        self.registry.observe(span)
+
+    # --- LLM calls ---
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.on_llm_start(serialized, [], run_id=run_id, **kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs):
+        self._start(run_id, "llm", "llm", _model_name(kwargs, metadata))
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _token_usage(response)
+        fields = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        model = (response.llm_output or {}).get("model_name")
+        if model:
+            fields["model"] = model
+        self._end(run_id, **fields)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- Tool calls ---
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, "tool", (serialized or {}).get("name") or "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    # --- Retrievals ---
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or "retriever"
+        self._start(run_id, "retriever", name)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def summary(self) -> Dict[str, Any]:
+        """Total time plus time, calls and tokens per span kind."""
+        kinds: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            totals = kinds.setdefault(
+                span["kind"], {"calls": 0, "duration_ms": 0.0, "tokens": 0}
+            )
+            totals["calls"] += 1
+            totals["duration_ms"] = round(
+                totals["duration_ms"] + span["duration_ms"], 2
+            )
+            totals["tokens"] += span.get("prompt_tokens", 0) + span.get(
+                "completion_tokens", 0
+            )
+        total_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        return {"total_ms": total_ms, "kinds": kinds, "spans": spans}
+
+    def server_timing(self) -> str:
+        """Formats the summary as a Server-Timing header value."""
+        summary = self.summary()
+        entries = [
+            f'{kind};dur={totals["duration_ms"]};desc="{int(totals["calls"])} calls"'
+            for kind, totals in summary["kinds"].items()
+        ]
+        entries.append(f"total;dur={summary['total_ms']}")
+        return ", ".join(entries)
+
+
+# Tracer of the retrieval being run. The retriever sets it, so the search
+# service can add spans for the steps inside a retrieval.
+current_tracer: ContextVar[Optional[TracingCallbackHandler]] = ContextVar(
+    "current_tracer", default=None
+)
+
+
+def find_tracer(handlers: List[Any]) -> Optional[TracingCallbackHandler]:
+    """The tracing handler among a run's callback handlers, if any."""
+    for handler in handlers:
+        if isinstance(handler, TracingCallbackHandler):
+            return handler
+    return None
+
+
+@contextmanager
+def trace_span(kind: str, name: str, model: str = "") -> Iterator[None]:
+    """
+    Times a block as a span of the current tracer. Without one (e.g. the
+    search endpoints), the span only goes to the process-wide metrics.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        span = {
+            "kind": kind,
+            "name": name,
+            "model": model,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "error": type(error).__name__ if error is not None else None,
+        }
+        tracer = current_tracer.get()
+        if tracer is None:
+            metrics.observe(span)
+        else:
+            tracer.add_span(span)
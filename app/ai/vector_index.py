@@ -0,0 +1,122 @@
+from .index_factory import search_parameters
+from langchain_community.vectorstores import FAISS
+from typing import Dict, List, Optional
+import faiss
+import json
+import numpy as np
+import os
+
+METADATA_INDEX_FILE = "metadata_index.json"
+
+# Chunk metadata fields that searches can be restricted by
+FILTER_FIELDS = ("regulation_id", "tahun", "bentuk_singkat")
+
+# Filters selecting at most this many rows are searched exactly over the subset
+EXACT_FILTER_MAX_ROWS = 4096
+
+
+def _normalize_value(value) -> str:
+    return str(value).strip().lower()
+
+
+class MetadataIndex:
+    """
+    Maps metadata values to FAISS row ids, e.g. {"tahun": {"2005": [3, 4, 9]}}.
+
+    Built next to the FAISS index during ingestion, so a filtered search can be
+    turned into an ID selector instead of over-fetching and post-filtering.
+    """
+
+    def __init__(self, fields: Dict[str, Dict[str, List[int]]]):
+        self.fields = {
+            field: {
+                value: np.asarray(ids, dtype=np.int64) for value, ids in values.items()
+            }
+            for field, values in fields.items()
+        }
+
+    @classmethod
+    def from_vector_store(cls, vector_store: FAISS) -> "MetadataIndex":
+        fields: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+        for row_id, docstore_id in vector_store.index_to_docstore_id.items():
+            metadata = vector_store.docstore.search(docstore_id).metadata
+            for field in FILTER_FIELDS:
+                if metadata.get(field) is None:
+                    continue
+                value = _normalize_value(metadata[field])
+                fields[field].setdefault(value, []).append(int(row_id))
+        return cls(fields)
+
+    @classmethod
+    def load(cls, folder_path: str) -> "MetadataIndex":
+        with open(os.path.join(folder_path, METADATA_INDEX_FILE)) as f:
+            return cls(json.load(f))
+
+    def save(self, folder_path: str):
+        payload = {
+            field: {value: ids.tolist() for value, ids in values.items()}
+            for field, values in self.fields.items()
+        }
+        with open(os.path.join(folder_path, METADATA_INDEX_FILE), "w") as f:
+            json.dump(payload, f)
+
+    def select(self, filters: Optional[Dict[str, str]]) -> Optional[np.ndarray]:
+        """
+        Returns the sorted row ids matching every filter, or None when there
+        is nothing to filter on (meaning all rows are allowed).
+        """
+        active = {k: v for k, v in (filters or {}).items() if v is not None}
+        if not active:
+            return None
+
+        selected = None
+        for field, value in active.items():
+            ids = self.fields.get(field, {}).get(_normalize_value(value))
+            if ids is None:
+                return np.empty(0, dtype=np.int64)
+            selected = ids if selected is None else np.intersect1d(selected, ids)
+        return np.sort(selected)
+
+
+def _exact_subset_search(
+    index: faiss.Index, query_vectors: np.ndarray, k: int, allowed_ids: np.ndarray
+):
+    """Brute-force search over a small set of rows, padded like FAISS output."""
+    subset = index.reconstruct_batch(allowed_ids)
+    found_k = min(k, len(allowed_ids))
+    sub_distances, positions = faiss.knn(query_vectors, subset, found_k)
+
+    distances = np.full((len(query_vectors), k), np.inf, dtype=np.float32)
+    indices = np.full((len(query_vectors), k), -1, dtype=np.int64)
+    distances[:, :found_k] = sub_distances
+    indices[:, :found_k] = allowed_ids[positions]
+    return distances, indices
+
+
+def search_index(
+    index: faiss.Index,
+    query_vectors: np.ndarray,
+    k: int,
+    allowed_ids: Optional[np.ndarray] = None,
+):
+    """
+    Runs a FAISS search, restricted to `allowed_ids` when given.
+
+    Small selections are scored exactly over just the selected rows, which is
+    cheaper than a full scan and also exact on approximate indexes (where a
+    graph or list walk may miss sparse matches). Larger selections are applied
+    inside the index scan via an ID selector. Either way a filtered search
+    costs no more than an unfiltered one.
+    """
+    if allowed_ids is None:
+        return index.search(query_vectors, k)
+
+    if len(allowed_ids) <= EXACT_FILTER_MAX_ROWS:
+        try:
+            return _exact_subset_search(index, query_vectors, k, allowed_ids)
+        except RuntimeError:
+            # Index type cannot reconstruct vectors; use the selector instead
+            pass
+
+    selector = faiss.IDSelectorBatch(allowed_ids)
+    return index.search(query_vectors, k, params=search_parameters(index, selector))
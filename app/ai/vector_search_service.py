@@ -1,35 +1,332 @@
-from ..core.config import OPENAI_API_KEY
-from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
-from typing import List, Dict, Any
+from ..core.config import CHAT_SESSION_REUSE_SIMILARITY
+from ..core.database import SessionLocal
+from ..repositories import regulation_chunk_repository
+from .chat_memory import add_session_chunks, current_session_id, get_session_pool
+from .context_assembly import assemble_context
+from .embedding_cache import citation_signature, get_query_embeddings
+from .lexical_index import BM25Index, reciprocal_rank_fusion
+from .sharded_index import (
+    ShardedIndex,
+    get_index_version,
+    load_chunk_ids,
+    load_shard_indexes,
+    merge_indexes,
+)
+from .tracing import current_tracer, find_tracer, trace_span
+from .vector_index import MetadataIndex, search_index
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from typing import List, Dict, Any, Optional, Tuple
+import logging
+import numpy as np
+import redis
+
+logger = logging.getLogger(__name__)
 
 FAISS_INDEX_PATH = "data/faiss_index"
 
+# Retrieval modes: FAISS only, BM25 only, or both fused with RRF
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+# How many candidates each ranking contributes to hybrid fusion, per result
+HYBRID_FETCH_MULTIPLIER = 4
+
 try:
-    # Load embeddings and the vector store once when the module is imported
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    vector_store = FAISS.load_local(
-        FAISS_INDEX_PATH, embeddings, allow_dangerous_deserialization=True
-    )
+    # Load embeddings and the FAISS index once when the module is imported.
+    # Query embeddings are cached, so repeated queries skip the embedding API.
+    # A sharded index is loaded as one index over all of its shards. Only
+    # vectors are loaded: chunk texts are read from the regulation_chunk
+    # table for the results of each search, by the chunk ids of this build.
+    embeddings = get_query_embeddings()
+    vector_index = merge_indexes(load_shard_indexes(FAISS_INDEX_PATH))
+    chunk_ids = load_chunk_ids(FAISS_INDEX_PATH)
+    metadata_index = MetadataIndex.load(FAISS_INDEX_PATH)
+    lexical_index = BM25Index.load(FAISS_INDEX_PATH)
+    # Identifies the loaded index build, so caches derived from search results
+    # are not reused after re-ingestion
+    index_version = get_index_version(FAISS_INDEX_PATH)
 except Exception as e:
     print(f"Could not load FAISS index. Run scripts/process_pdfs.py first. Error: {e}")
-    vector_store = None
+    vector_index = None
+    chunk_ids = []
+    metadata_index = None
+    lexical_index = None
+    index_version = "none"
 
 
-def semantic_search(query: str, k: int = 5) -> List[Dict[str, Any]]:
+def _hydrate(row_ids: List[int]) -> Dict[int, Dict[str, Any]]:
     """
-    Performs a semantic search on the vector store and returns ranked results.
+    Reads the chunks of a set of FAISS rows in one query, by row id. Rows are
+    looked up by the chunk ids saved with the loaded index, so re-ingestion
+    (which renumbers rows) doesn't affect a process still serving this index.
+    """
+    row_chunk_ids = {row_id: chunk_ids[row_id] for row_id in row_ids}
+    db = SessionLocal()
+    try:
+        with trace_span("search", "chunk_hydration"):
+            rows = regulation_chunk_repository.get_by_chunk_ids(
+                db, list(row_chunk_ids.values())
+            )
+    finally:
+        db.close()
+    chunks = {
+        row.chunk_id: {
+            "content": row.text,
+            "metadata": regulation_chunk_repository.chunk_metadata(row),
+        }
+        for row in rows
+    }
+    return {
+        row_id: chunks[chunk_id]
+        for row_id, chunk_id in row_chunk_ids.items()
+        if chunk_id in chunks
+    }
+
+
+def _format_rankings(rankings) -> List[Tuple[List[Dict[str, Any]], List[int]]]:
     """
-    if vector_store is None:
+    Turns ranked (scores, row ids) lists into (result dicts, their row ids),
+    hydrating the chunks of all of them with a single query.
+    """
+    # FAISS pads with -1 when fewer than k vectors are available
+    row_ids = {int(i) for _, ids in rankings for i in ids if i != -1}
+    chunks = _hydrate(sorted(row_ids)) if row_ids else {}
+    formatted = []
+    for scores, ids in rankings:
+        # Rows whose chunk is gone (e.g. its regulation was deleted) are
+        # skipped until the next ingestion removes them from the index
+        kept = [(float(score), int(i)) for score, i in zip(scores, ids)]
+        kept = [(score, i) for score, i in kept if i in chunks]
+        formatted.append(
+            (
+                [{**chunks[i], "score": score} for score, i in kept],
+                [i for _, i in kept],
+            )
+        )
+    return formatted
+
+
+def _format_results(scores, row_ids) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """Turns ranked row ids and their scores into (result dicts, row ids)."""
+    return _format_rankings([(scores, row_ids)])[0]
+
+
+def _embed_queries(queries: List[str]) -> np.ndarray:
+    with trace_span("embedding", "query_embedding"):
+        return embeddings.embed_queries(queries)
+
+
+def _lexical_rankings(queries: List[str], k: int, allowed_ids):
+    with trace_span("search", "bm25"):
+        return [
+            lexical_index.search(query, k, allowed_ids=allowed_ids) for query in queries
+        ]
+
+
+def _vector_rankings(queries: List[str], k: int, allowed_ids):
+    query_vectors = _embed_queries(queries)
+
+    # FAISS returns L2 distances (lower is better) and row ids per query.
+    # A sharded index only searches the shards holding allowed rows.
+    with trace_span("search", "faiss"):
+        if isinstance(vector_index, ShardedIndex):
+            distances, indices = vector_index.search(
+                query_vectors, k, allowed_ids=allowed_ids
+            )
+        else:
+            distances, indices = search_index(
+                vector_index, query_vectors, k, allowed_ids=allowed_ids
+            )
+    return list(zip(distances, indices))
+
+
+def _rank(
+    queries: List[str],
+    k: int,
+    filters: Optional[Dict[str, str]],
+    mode: str,
+) -> List[Tuple[List[float], List[int]]]:
+    """Ranked (scores, row ids) per query for the given retrieval mode."""
+    if vector_index is None:
         raise RuntimeError("Vector store is not available.")
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}'.")
+
+    allowed_ids = metadata_index.select(filters)
+    if allowed_ids is not None and allowed_ids.size == 0:
+        return [([], []) for _ in queries]
 
-    # FAISS returns documents and their L2 distance (lower is better)
-    results_with_scores = vector_store.similarity_search_with_score(query, k=k)
+    if mode == "vector":
+        return _vector_rankings(queries, k, allowed_ids)
 
-    formatted_results = []
-    for doc, score in results_with_scores:
-        formatted_results.append(
-            {"content": doc.page_content, "metadata": doc.metadata, "score": score}
+    if mode == "lexical":
+        return _lexical_rankings(queries, k, allowed_ids)
+
+    # Hybrid: fuse a deeper candidate list from each retriever
+    fetch_k = k * HYBRID_FETCH_MULTIPLIER
+    vector_rankings = _vector_rankings(queries, fetch_k, allowed_ids)
+    lexical_rankings = _lexical_rankings(queries, fetch_k, allowed_ids)
+    rankings = []
+    for (_, vector_ids), (_, lexical_ids) in zip(vector_rankings, lexical_rankings):
+        fused = reciprocal_rank_fusion(
+            [[int(i) for i in vector_ids if i != -1], lexical_ids.tolist()]
+        )[:k]
+        rankings.append(
+            ([score for _, score in fused], [row_id for row_id, _ in fused])
         )
+    return rankings
+
+
+def batch_semantic_search(
+    queries: List[str],
+    k: int = 5,
+    filters: Optional[Dict[str, str]] = None,
+    mode: str = "vector",
+) -> List[List[Dict[str, Any]]]:
+    """
+    Performs semantic search for many queries at once.
+    All queries are embedded in one batched request and searched with a single
+    vectorized FAISS call over the stacked query matrix. Metadata filters
+    (regulation_id, tahun, bentuk_singkat) are applied inside the FAISS scan,
+    and the texts of all results are read with one database query.
+
+    The score of each result depends on the mode: L2 distance for "vector"
+    (lower is better), BM25 score for "lexical" and reciprocal rank fusion
+    score for "hybrid" (higher is better for both).
+    """
+    return [
+        results for results, _ in _format_rankings(_rank(queries, k, filters, mode))
+    ]
 
-    return formatted_results
+
+def semantic_search(
+    query: str,
+    k: int = 5,
+    filters: Optional[Dict[str, str]] = None,
+    mode: str = "vector",
+) -> List[Dict[str, Any]]:
+    """
+    Performs a semantic search on the vector store and returns ranked results.
+    """
+    return batch_semantic_search([query], k=k, filters=filters, mode=mode)[0]
+
+
+def _chunk_vectors(row_ids: List[int]) -> Optional[np.ndarray]:
+    """Reconstructs stored chunk vectors, or None if the index can't."""
+    try:
+        return vector_index.reconstruct_batch(np.asarray(row_ids, dtype=np.int64))
+    except RuntimeError as e:
+        logger.warning(f"Could not reconstruct chunk vectors for MMR: {e}")
+        return None
+
+
+def _session_candidates(session_id: str, query: str, fetch_k: int):
+    """
+    Ranks the passages a chat session already retrieved against a follow-up
+    query. They are only reused when the follow-up cites the same regulations
+    as the query that retrieved them and its embedding is at least
+    CHAT_SESSION_REUSE_SIMILARITY similar to that query's; a follow-up that
+    changes topic searches the index. Returns (candidates, row ids), or None
+    when the index has to be searched.
+    """
+    try:
+        pool = get_session_pool(session_id, index_version)
+    except redis.RedisError as e:
+        logger.warning(f"Session retrieval cache read failed: {e}")
+        return None
+    # Pools saved before the searched query was remembered are never reused
+    searched = pool.get("query") if pool else None
+    if not searched or searched["signature"] != citation_signature(query):
+        return None
+
+    query_vector = _embed_queries([query])[0]
+    previous = np.asarray([searched["vector"]], dtype=np.float32)
+    if _cosine(previous, query_vector)[0] < CHAT_SESSION_REUSE_SIMILARITY:
+        return None
+    vectors = _chunk_vectors(pool["row_ids"])
+    if vectors is None:
+        return None
+    similarities = _cosine(vectors, query_vector)
+    order = np.argsort(-similarities)[:fetch_k]
+    row_ids = [pool["row_ids"][i] for i in order]
+    return _format_results(similarities[order], row_ids)
+
+
+def _cosine(vectors: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+    return vectors @ query_vector / np.maximum(norms, 1e-12)
+
+
+def _remember_session_chunks(session_id: str, query: str, row_ids: List[int]):
+    searched = {
+        "vector": _embed_queries([query])[0].tolist(),
+        "signature": citation_signature(query),
+    }
+    try:
+        add_session_chunks(session_id, index_version, row_ids, searched)
+    except redis.RedisError as e:
+        logger.warning(f"Session retrieval cache write failed: {e}")
+
+
+class SearchServiceRetriever(BaseRetriever):
+    """
+    LangChain retriever backed by this service, so chains get the same
+    filtering and hybrid ranking as the search endpoints.
+
+    With a token_budget, fetch_k candidates are retrieved and assembled into
+    at most k passages (see context_assembly): duplicates and overlapping
+    chunks are merged, MMR keeps the passages diverse and the total context
+    stays within the budget. Within a chat session, a follow-up question that
+    stays on the topic of the last searched query (CHAT_SESSION_REUSE_SIMILARITY)
+    reuses the passages the session already retrieved, skipping the search.
+    """
+
+    k: int = 4
+    mode: str = "hybrid"
+    fetch_k: int = 0
+    token_budget: Optional[int] = None
+    lambda_mult: float = 0.5
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # Embedding, FAISS and database spans go to the request's tracer
+        token = current_tracer.set(find_tracer(run_manager.handlers))
+        try:
+            if self.token_budget is None:
+                results = semantic_search(query, k=self.k, mode=self.mode)
+            else:
+                results = self._assembled_context(query)
+        finally:
+            current_tracer.reset(token)
+        return [
+            Document(page_content=result["content"], metadata=result["metadata"])
+            for result in results
+        ]
+
+    def _assembled_context(self, query: str) -> List[Dict[str, Any]]:
+        fetch_k = max(self.fetch_k, self.k)
+        session_id = current_session_id.get()
+        reused = None
+        if session_id is not None:
+            reused = _session_candidates(session_id, query, fetch_k)
+
+        if reused is not None:
+            candidates, row_ids = reused
+        else:
+            scores, row_ids = _rank([query], fetch_k, None, self.mode)[0]
+            candidates, row_ids = _format_results(scores, row_ids)
+            if session_id is not None:
+                _remember_session_chunks(session_id, query, row_ids)
+
+        vectors = _chunk_vectors(row_ids) if row_ids else None
+        query_vector = _embed_queries([query])[0] if vectors is not None else None
+        return assemble_context(
+            candidates,
+            self.k,
+            self.token_budget,
+            query_vector=query_vector,
+            vectors=vectors,
+            lambda_mult=self.lambda_mult,
+        )
@@ -1,23 +1,84 @@
+import asyncio
 import json
+import logging
+import redis
+from contextlib import nullcontext, suppress
 
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
-from ...ai import chat_service, vector_search_service
-from ...schemas.chat import ChatRequest
-from ...schemas.search import SearchRequest, SearchResponse
+from ...ai import chat_memory, chat_service, vector_search_service
+from ...ai.tracing import TracingCallbackHandler, metrics
+from ...core.concurrency import chat_limiter
+from ...core.config import TRACE_RESPONSE_TIMING
+from ...schemas.chat import ChatRequest, ChatSessionResponse
+from ...schemas.search import (
+    BatchSearchRequest,
+    BatchSearchResponse,
+    SearchRequest,
+    SearchResponse,
+)
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+# SSE framing: tokens are coalesced into one frame until either limit is hit
+SSE_FLUSH_INTERVAL = 0.05  # seconds
+SSE_FLUSH_CHARS = 64
+# A comment line is sent when nothing else was sent for this long, so proxies
+# and clients don't time out while the agent is busy calling tools
+SSE_HEARTBEAT_INTERVAL = 15  # seconds
+
 
 @router.post("/chat")
-def handle_chat(request: ChatRequest):
+async def handle_chat(request: ChatRequest, response: Response):
     """
     Endpoint to handle an intelligent chat conversation using an agent.
+    Concurrent conversations are capped; when the wait queue is full the
+    request fails fast with 429/503 and a Retry-After header. While OpenAI
+    is unavailable (circuit breaker open) the search fallback is returned
+    right away instead of queuing.
+    """
+    tracer = TracingCallbackHandler()
+    slot = nullcontext() if chat_service.is_degraded() else chat_limiter.slot()
+    async with slot:
+        response_content = await chat_service.get_intelligent_response(
+            request.question, callbacks=[tracer], session_id=request.session_id
+        )
+    if TRACE_RESPONSE_TIMING:
+        response.headers["Server-Timing"] = tracer.server_timing()
+    return {"response": response_content, "session_id": request.session_id}
+
+
+@router.post("/chat/sessions", response_model=ChatSessionResponse)
+def handle_create_chat_session():
+    """
+    Starts a chat session. Pass its id with /chat or /stream-chat requests to
+    ask follow-up questions; the history expires after CHAT_SESSION_TTL
+    seconds without activity. Fails with 503 while Redis is unavailable.
     """
-    # Call the new agent-based service function
-    response_content = chat_service.get_intelligent_response(request.question)
-    return {"response": response_content}
+    try:
+        return {"session_id": chat_memory.create_session()}
+    except redis.RedisError as e:
+        raise sessions_unavailable(e)
+
+
+@router.delete("/chat/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def handle_delete_chat_session(session_id: str):
+    """Deletes a chat session and its history."""
+    try:
+        chat_memory.delete_session(session_id)
+    except redis.RedisError as e:
+        raise sessions_unavailable(e)
+
+
+def sessions_unavailable(error: redis.RedisError) -> HTTPException:
+    logger.warning(f"Chat session store is unavailable: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Chat sessions are temporarily unavailable, please retry later.",
+    )
 
 
 @router.post("/semantic-search", response_model=SearchResponse)
@@ -26,27 +87,133 @@ def handle_semantic_search(request: SearchRequest):
     Performs a direct semantic search on the document vector store.
     """
     search_results = vector_search_service.semantic_search(
-        query=request.query, k=request.top_k
+        query=request.query,
+        k=request.top_k,
+        filters=request.as_filters(),
+        mode=request.mode,
     )
     return {"results": search_results}
 
 
-# This is the new async generator that will be used by the endpoint
-async def format_stream_for_sse(user_question: str):
+@router.post("/semantic-search/batch", response_model=BatchSearchResponse)
+def handle_batch_semantic_search(request: BatchSearchRequest):
     """
-    Calls the streaming service and formats each token for Server-Sent Events (SSE).
+    Performs semantic search for many queries in one call.
+    Embedding and FAISS search are batched across all queries.
     """
-    async for token in chat_service.get_intelligent_response_stream(user_question):
-        yield f"data: {json.dumps({'token': token})}\n\n"
+    search_results = vector_search_service.batch_semantic_search(
+        queries=request.queries,
+        k=request.top_k,
+        filters=request.as_filters(),
+        mode=request.mode,
+    )
+    return {
+        "results": [
+            {"query": query, "results": results}
+            for query, results in zip(request.queries, search_results)
+        ]
+    }
 
 
-@router.post("/stream-chat")
-async def handle_stream_chat(request: ChatRequest):
+def sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def format_stream_for_sse(
+    user_question: str,
+    request: Request | None = None,
+    session_id: str | None = None,
+):
     """
+    Calls the streaming service and formats its tokens as Server-Sent Events.
 
+    Tokens are coalesced into `data: {"token": ...}` frames every
+    SSE_FLUSH_INTERVAL seconds or SSE_FLUSH_CHARS characters, and a `: ping`
+    comment is sent after SSE_HEARTBEAT_INTERVAL idle seconds. The stream
+    ends with a `done` event (with the trace summary) or an `error` event.
+    If the client disconnects, the agent run is cancelled.
+    """
+    tracer = TracingCallbackHandler()
+    stream = chat_service.get_intelligent_response_stream(
+        user_question, callbacks=[tracer], session_id=session_id
+    )
+    loop = asyncio.get_running_loop()
+    buffer = ""
+    last_sent = loop.time()
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(anext(stream))
+            timeout = SSE_FLUSH_INTERVAL if buffer else SSE_HEARTBEAT_INTERVAL
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                if request is not None and await request.is_disconnected():
+                    logger.info("Client disconnected; cancelling the agent run")
+                    return
+                if buffer:
+                    yield sse_event({"token": buffer})
+                    buffer = ""
+                else:
+                    yield ": ping\n\n"
+                last_sent = loop.time()
+                continue
+
+            finished, pending = pending, None
+            try:
+                buffer += finished.result()
+            except StopAsyncIteration:
+                break
+            if (
+                len(buffer) >= SSE_FLUSH_CHARS
+                or loop.time() - last_sent >= SSE_FLUSH_INTERVAL
+            ):
+                yield sse_event({"token": buffer})
+                buffer = ""
+                last_sent = loop.time()
+
+        if buffer:
+            yield sse_event({"token": buffer})
+        summary = {"timing": tracer.summary()} if TRACE_RESPONSE_TIMING else {}
+        yield sse_event(summary, event="done")
+    except Exception as e:
+        logger.exception("Streaming chat failed")
+        yield sse_event(
+            {"error": type(e).__name__, "message": "The assistant could not answer."},
+            event="error",
+        )
+    finally:
+        # Cancelling the pending read closes the service generator, which in
+        # turn cancels the agent run
+        if pending is not None:
+            pending.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await pending
+        await stream.aclose()
+
+
+@router.post("/stream-chat")
+async def handle_stream_chat(request: ChatRequest, http_request: Request):
+    """
     Handles a streaming chat conversation using Server-Sent Events (SSE).
     """
-    # The endpoint now directly calls the new formatting generator
+    # Unknown sessions fail with 404 before the stream starts
+    await chat_service.open_session(request.session_id)
     return StreamingResponse(
-        format_stream_for_sse(request.question), media_type="text/event-stream"
+        format_stream_for_sse(request.question, http_request, request.session_id),
+        media_type="text/event-stream",
+        # Ask proxies (e.g. nginx) not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def handle_metrics():
+    """
+    Exposes per-step latency and token metrics of the agent pipeline
+    in the Prometheus text format.
+    """
+    return metrics.render()
@@ -0,0 +1,77 @@
+from .config import (
+    CHAT_MAX_CONCURRENCY,
+    CHAT_MAX_QUEUE,
+    CHAT_QUEUE_TIMEOUT,
+    CHAT_RETRY_AFTER,
+)
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+import asyncio
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many requests run at once, with a bounded wait queue.
+
+    Up to `max_concurrency` requests run; up to `max_queue` more wait for a
+    slot. Anything beyond that is rejected immediately with 429, and a request
+    that waits longer than `queue_timeout` seconds gets 503. Both carry a
+    Retry-After header so clients back off instead of piling up.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = CHAT_MAX_CONCURRENCY,
+        max_queue: int = CHAT_MAX_QUEUE,
+        queue_timeout: float = CHAT_QUEUE_TIMEOUT,
+        retry_after: int = CHAT_RETRY_AFTER,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _reject(self, status_code: int, detail: str):
+        raise HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    async def acquire(self):
+        if self.active >= self.max_concurrency and self.waiting >= self.max_queue:
+            self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS,
+                "Too many chat requests, please retry later.",
+            )
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                "Chat service is busy, please retry later.",
+            )
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# Shared by the chat endpoints of this worker process
+chat_limiter = ConcurrencyLimiter()
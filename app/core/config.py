@@ -18,3 +18,97 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
 # OpenAI settings
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Set to an OpenAI-compatible server, e.g. scripts/fake_openai.py for load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Query embedding cache settings
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 7 * 24 * 3600))
+
+# FAISS index settings
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", 0))  # 0 picks a value from corpus size
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", 64))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", 64))
+FAISS_TRAIN_SAMPLE_SIZE = int(os.getenv("FAISS_TRAIN_SAMPLE_SIZE", 50000))
+# Re-rank refine_k_factor * k quantized candidates exactly; 0 disables
+FAISS_REFINE_K_FACTOR = float(os.getenv("FAISS_REFINE_K_FACTOR", 0))
+# Partition the index by "bentuk_singkat" or "year" (ranges of
+# FAISS_SHARD_YEAR_RANGE years); "none" keeps a single index
+FAISS_SHARD_BY = os.getenv("FAISS_SHARD_BY", "none")
+FAISS_SHARD_YEAR_RANGE = int(os.getenv("FAISS_SHARD_YEAR_RANGE", 10))
+FAISS_SHARD_SEARCH_WORKERS = int(os.getenv("FAISS_SHARD_SEARCH_WORKERS", 4))
+
+# Ingestion embedding settings
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 256))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", 4))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 5))
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embedding_cache.sqlite")
+
+# Shared HTTP connection pool for OpenAI clients
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 100))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 30))
+# Per-call timeouts and retries of OpenAI requests
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 30))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 1))
+# Circuit breaker shared by all OpenAI clients: opens after this many
+# consecutive failures and lets a trial call through after the recovery time
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", 30))
+
+# Chat concurrency limits (per worker process)
+CHAT_MAX_CONCURRENCY = int(os.getenv("CHAT_MAX_CONCURRENCY", 16))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 32))
+CHAT_QUEUE_TIMEOUT = float(os.getenv("CHAT_QUEUE_TIMEOUT", 10))
+CHAT_RETRY_AFTER = int(os.getenv("CHAT_RETRY_AFTER", 5))
+# Time budget (seconds) for one chat request, including all its tool calls
+CHAT_TIMEOUT = float(os.getenv("CHAT_TIMEOUT", 60))
+# Passages returned by chat while OpenAI is unavailable (circuit open)
+CHAT_FALLBACK_RESULTS = int(os.getenv("CHAT_FALLBACK_RESULTS", 3))
+
+# Semantic answer cache for chat
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 1024))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+
+# SQL agent database access (read-only, time-bounded)
+# Point SQL_AGENT_DATABASE_URL at a read-only role if one is available
+SQL_AGENT_DATABASE_URL = os.getenv("SQL_AGENT_DATABASE_URL") or DATABASE_URL
+SQL_AGENT_POOL_SIZE = int(os.getenv("SQL_AGENT_POOL_SIZE", 2))
+SQL_AGENT_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_AGENT_STATEMENT_TIMEOUT_MS", 5000))
+SQL_AGENT_MAX_ROWS = int(os.getenv("SQL_AGENT_MAX_ROWS", 200))
+SQL_AGENT_MAX_COST = float(os.getenv("SQL_AGENT_MAX_COST", 100000))
+
+# Agent tracing: add per-response timing (Server-Timing header / SSE event)
+TRACE_RESPONSE_TIMING = os.getenv("TRACE_RESPONSE_TIMING", "true").lower() == "true"
+
+# RAG context assembly: candidates fetched, passages kept (MMR) and the
+# token budget for the context stuffed into the prompt
+RAG_FETCH_K = int(os.getenv("RAG_FETCH_K", 12))
+RAG_CONTEXT_K = int(os.getenv("RAG_CONTEXT_K", 4))
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", 0.5))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1500))
+
+# Chat tool router: send clear-cut questions straight to a tool, skipping the
+# master agent. An optional local sentence-transformers model (e.g.
+# "paraphrase-multilingual-MiniLM-L12-v2") handles questions the rules can't.
+CHAT_ROUTER_ENABLED = os.getenv("CHAT_ROUTER_ENABLED", "true").lower() == "true"
+ROUTER_EMBEDDING_MODEL = os.getenv("ROUTER_EMBEDDING_MODEL") or None
+ROUTER_MIN_SIMILARITY = float(os.getenv("ROUTER_MIN_SIMILARITY", 0.6))
+ROUTER_MIN_MARGIN = float(os.getenv("ROUTER_MIN_MARGIN", 0.05))
+
+# Chat sessions: history kept in Redis, recent turns verbatim within a token
+# budget and older ones folded into a rolling summary
+CHAT_SESSION_TTL = int(os.getenv("CHAT_SESSION_TTL", 24 * 3600))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", 1000))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 300))
+# Passages a session has retrieved are reused for follow-up questions that
+# cite the same regulations as, and are at least this similar to, the query
+# that last searched the index
+CHAT_SESSION_CHUNK_POOL_SIZE = int(os.getenv("CHAT_SESSION_CHUNK_POOL_SIZE", 50))
+CHAT_SESSION_REUSE_SIMILARITY = float(os.getenv("CHAT_SESSION_REUSE_SIMILARITY", 0.9))
@@ -1,6 +1,8 @@
 from .config import DATABASE_URL
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+import time
 
 engine = create_engine(DATABASE_URL)
 
@@ -16,3 +18,72 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _limit_sqlite_statements(readonly_engine: Engine, timeout_ms: int):
+    """
+    SQLite has no read-only transactions or statement_timeout, so use
+    `PRAGMA query_only` and a progress handler that aborts long statements.
+    """
+
+    @event.listens_for(readonly_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA query_only = ON")
+        deadline = connection_record.info
+        deadline["at"] = None
+
+        def abort_if_overdue():
+            # A non-zero return makes SQLite interrupt the running statement
+            return int(deadline["at"] is not None and time.monotonic() > deadline["at"])
+
+        dbapi_connection.set_progress_handler(abort_if_overdue, 1000)
+
+    @event.listens_for(readonly_engine, "before_cursor_execute")
+    def on_execute(connection, cursor, statement, parameters, context, executemany):
+        connection.connection.info["at"] = time.monotonic() + timeout_ms / 1000
+
+
+def create_readonly_engine(
+    url: str, pool_size: int, statement_timeout_ms: int
+) -> Engine:
+    """
+    Creates a small, separate engine for running generated SQL.
+    Every transaction is read-only and statements are cancelled after
+    `statement_timeout_ms`, so a runaway query can't hold the main pool.
+    """
+    if url.startswith("sqlite"):
+        readonly_engine = create_engine(url)
+        _limit_sqlite_statements(readonly_engine, statement_timeout_ms)
+        return readonly_engine
+
+    options = (
+        "-c default_transaction_read_only=on"
+        f" -c statement_timeout={statement_timeout_ms}"
+    )
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=10,
+        pool_pre_ping=True,
+        connect_args={"options": options},
+    )
+
+
+# The read-only engine for the SQL agent is created on first use
+_readonly_engine = None
+
+
+def get_readonly_engine() -> Engine:
+    global _readonly_engine
+    if _readonly_engine is None:
+        from .config import (
+            SQL_AGENT_DATABASE_URL,
+            SQL_AGENT_POOL_SIZE,
+            SQL_AGENT_STATEMENT_TIMEOUT_MS,
+        )
+
+        _readonly_engine = create_readonly_engine(
+            SQL_AGENT_DATABASE_URL, SQL_AGENT_POOL_SIZE, SQL_AGENT_STATEMENT_TIMEOUT_MS
+        )
+    return _readonly_engine
@@ -1,8 +1,9 @@
 import json
 import redis
 
-# Initialize the client variable as None as it will be created on first use
+# Initialize the client variables as None as they will be created on first use
 redis_client = None
+binary_redis_client = None
 
 
 def get_redis_client():
@@ -22,6 +23,22 @@ def get_redis_client():
     return redis_client
 
 
+def get_binary_redis_client():
+    """
+    Returns a Redis client that works with raw bytes instead of decoded strings.
+    Used for compact binary payloads such as embedding vectors.
+    """
+    global binary_redis_client
+    if binary_redis_client is None:
+        from .config import REDIS_HOST, REDIS_PORT
+
+        pool = redis.ConnectionPool(
+            host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=False
+        )
+        binary_redis_client = redis.Redis(connection_pool=pool)
+    return binary_redis_client
+
+
 def set_cache(key: str, value: dict, ttl: int = 3600):
     """Serializes and stores data in Redis with a TTL."""
     client = get_redis_client()  # Get the client instance
@@ -58,3 +75,18 @@ def mset_cache(data: dict):
     for key, value in data.items():
         pipeline.set(key, json.dumps(value, default=str), ex=3600)
     pipeline.execute()
+
+
+# Version counter of the regulation data, bumped on every write so caches
+# derived from it (e.g. chat answers) can tell when they are stale
+DATA_VERSION_KEY = "regulation:data_version"
+
+
+def get_data_version() -> str:
+    client = get_redis_client()
+    return client.get(DATA_VERSION_KEY) or "0"
+
+
+def bump_data_version():
+    client = get_redis_client()
+    client.incr(DATA_VERSION_KEY)
@@ -1,7 +1,10 @@
+from .ai.tools.sql_tool import get_sql_agent
 from .api.endpoints import regulations, auth, chat
 from .core.database import engine, Base
 from .models import regulation, user
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+import asyncio
 import logging
 
 # # This line creates the table if it doesn't exist
@@ -10,10 +13,23 @@ import logging
 # Configure the root logger to show INFO level messages
 logging.basicConfig(level=logging.INFO)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Builds the SQL agent and its cached schema summary before serving."""
+    try:
+        await asyncio.to_thread(get_sql_agent)
+    except Exception as e:
+        # The agent is built lazily on first use instead
+        logging.warning(f"Could not prepare the SQL agent at startup: {e}")
+    yield
+
+
 app = FastAPI(
     title="Regulation Management System API",
     description="API for managing and querying Indonesian regulations.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Auth"])
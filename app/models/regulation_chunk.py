@@ -0,0 +1,28 @@
+from ..core.database import Base
+from sqlalchemy import Column, ForeignKey, Integer, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+
+
+class RegulationChunk(Base):
+    """
+    A text chunk of a regulation's PDF. The FAISS index only stores vectors;
+    each index build saves the `chunk_id` of every row next to it, and search
+    results are hydrated from this table by those ids.
+    """
+
+    __tablename__ = "regulation_chunk"
+
+    # "<regulation_id>:<n>", the id the ingestion manifest records
+    chunk_id = Column(String(64), primary_key=True)
+    regulation_id = Column(
+        UUID(as_uuid=True),
+        ForeignKey("regulation.regulation_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    page = Column(Integer)
+    # Character offset of the chunk within its page
+    offset = Column(Integer)
+    text = Column(Text, nullable=False)
+    # sha256 of the text, as used by the embedding cache
+    hash = Column(String(64), nullable=False)
@@ -0,0 +1,66 @@
+from ..models.regulation import Regulation
+from ..models.regulation_chunk import RegulationChunk
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+from uuid import UUID
+
+# Chunk columns plus the regulation fields that search results carry
+_COLUMNS = (
+    RegulationChunk.chunk_id,
+    RegulationChunk.regulation_id,
+    RegulationChunk.page,
+    RegulationChunk.offset,
+    RegulationChunk.text,
+    Regulation.nama_peraturan,
+    Regulation.tahun,
+    Regulation.bentuk_singkat,
+)
+
+
+def chunk_metadata(row) -> dict:
+    """The metadata of a chunk row, as stored with chunks at ingestion."""
+    return {
+        "regulation_id": str(row.regulation_id),
+        "nama_peraturan": row.nama_peraturan,
+        "tahun": row.tahun,
+        "bentuk_singkat": row.bentuk_singkat,
+        "page": row.page,
+        "offset": row.offset,
+    }
+
+
+def get_by_chunk_ids(db: Session, chunk_ids: list[str]) -> list:
+    """Chunks with their regulation fields, for a batch of chunk ids."""
+    if not chunk_ids:
+        return []
+    return (
+        db.query(*_COLUMNS)
+        .join(Regulation, Regulation.regulation_id == RegulationChunk.regulation_id)
+        .filter(RegulationChunk.chunk_id.in_(chunk_ids))
+        .all()
+    )
+
+
+def get_all(db: Session) -> list:
+    """Every chunk with its regulation fields."""
+    return (
+        db.query(*_COLUMNS)
+        .join(Regulation, Regulation.regulation_id == RegulationChunk.regulation_id)
+        .all()
+    )
+
+
+def delete_chunks(db: Session, regulation_ids: list[UUID] | None):
+    """Deletes the chunks of `regulation_ids`, or of every regulation if None."""
+    statement = delete(RegulationChunk)
+    if regulation_ids is not None:
+        if not regulation_ids:
+            return
+        statement = statement.where(RegulationChunk.regulation_id.in_(regulation_ids))
+    db.execute(statement)
+
+
+def add_chunks(db: Session, chunks: list[dict]):
+    """Inserts chunk rows; the caller commits once the index is saved."""
+    if chunks:
+        db.execute(insert(RegulationChunk), chunks)
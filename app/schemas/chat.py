@@ -1,5 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
 
 
 class ChatRequest(BaseModel):
     question: str
+    # Continue a conversation started with POST /chat/sessions
+    session_id: Optional[str] = Field(None, max_length=64, pattern=r"^[0-9a-f]+$")
+
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
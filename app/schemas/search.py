@@ -1,10 +1,24 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Literal, Optional
 
+# "vector" = FAISS only, "lexical" = BM25 only, "hybrid" = both fused with RRF
+RetrievalMode = Literal["vector", "lexical", "hybrid"]
 
-class SearchRequest(BaseModel):
+
+# Optional metadata filters shared by the search requests
+class SearchFilters(BaseModel):
+    regulation_id: Optional[str] = None
+    tahun: Optional[str] = None
+    bentuk_singkat: Optional[str] = None
+
+    def as_filters(self) -> Dict[str, Optional[str]]:
+        return {field: getattr(self, field) for field in SearchFilters.model_fields}
+
+
+class SearchRequest(SearchFilters):
     query: str
     top_k: int = 5
+    mode: RetrievalMode = "vector"
 
 
 class SearchResult(BaseModel):
@@ -15,3 +29,18 @@ class SearchResult(BaseModel):
 
 class SearchResponse(BaseModel):
     results: List[SearchResult]
+
+
+class BatchSearchRequest(SearchFilters):
+    queries: List[str] = Field(..., min_length=1, max_length=1000)
+    top_k: int = 5
+    mode: RetrievalMode = "vector"
+
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[BatchSearchResult]
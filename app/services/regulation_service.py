@@ -1,4 +1,4 @@
-from ..core.redis_client import get_cache, set_cache, delete_cache
+from ..core.redis_client import bump_data_version, get_cache, set_cache, delete_cache
 from ..repositories import regulation_repository as repo
 from ..schemas.regulation import Regulation, RegulationCreate, RegulationUpdate
 from fastapi import HTTPException, status
@@ -39,7 +39,9 @@ def get_all_regulations(db: Session, skip: int, limit: int):
 
 
 def create_regulation(db: Session, regulation: RegulationCreate):
-    return repo.create(db, obj_in=regulation)
+    db_regulation = repo.create(db, obj_in=regulation)
+    bump_data_version()
+    return db_regulation
 
 
 def update_regulation(
@@ -56,6 +58,7 @@ def update_regulation(
     # Invalidate cache
     cache_key = f"regulation:{regulation_id}"
     delete_cache(cache_key)
+    bump_data_version()
 
     return updated_regulation
 
@@ -70,5 +73,6 @@ def delete_regulation(db: Session, regulation_id: UUID):
     # Invalidate cache
     cache_key = f"regulation:{regulation_id}"
     delete_cache(cache_key)
+    bump_data_version()
 
     return db_regulation
@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import httpx
+import json
+import numpy as np
+import time
+import uuid
+
+BASE_URL = "http://localhost:8000/api/v1/ai"
+
+QUESTIONS = [
+    "Berapa jumlah peraturan tahun 2020?",
+    "Apa isi Pasal 5 tentang perlindungan data pribadi?",
+    "Sebutkan ketentuan sanksi administratif dalam peraturan pemerintah",
+    "Apa definisi penyelenggara sistem elektronik?",
+    "Berapa jumlah PP tahun 2005 dan apa isi Pasal 3 PP 34/2005?",
+]
+
+ENDPOINTS = ("chat", "stream-chat", "semantic-search")
+
+
+def make_payload(endpoint: str, i: int, repeat: bool) -> dict:
+    question = QUESTIONS[i % len(QUESTIONS)]
+    if not repeat:
+        # A unique marker keeps the answer cache from serving every request
+        question = f"{question} (ref {uuid.uuid4().hex[:8]})"
+    if endpoint == "semantic-search":
+        return {"query": question, "top_k": 5}
+    return {"question": question}
+
+
+async def timed_request(client: httpx.AsyncClient, endpoint: str, payload: dict):
+    """
+    Sends one request and returns (status, latency s, time to first token s).
+    For the streaming endpoint the first token is the first data frame; for
+    the others it is the complete response.
+    """
+    start = time.perf_counter()
+    if endpoint != "stream-chat":
+        response = await client.post(f"/{endpoint}", json=payload)
+        latency = time.perf_counter() - start
+        return response.status_code, latency, latency
+
+    first_token = None
+    status = None
+    async with client.stream("POST", f"/{endpoint}", json=payload) as response:
+        status = response.status_code
+        event = "message"
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event: ") :]
+            elif line.startswith("data:") and event == "message":
+                if first_token is None and json.loads(line[len("data: ") :]).get(
+                    "token"
+                ):
+                    first_token = time.perf_counter() - start
+            elif line.startswith("data:") and event == "error":
+                status = 599  # The stream started but the agent failed
+            elif not line:
+                event = "message"
+    latency = time.perf_counter() - start
+    return status, latency, first_token if first_token is not None else latency
+
+
+async def run_level(
+    base_url: str, endpoint: str, concurrency: int, requests: int, repeat: bool
+):
+    limits = httpx.Limits(max_connections=concurrency)
+    timeout = httpx.Timeout(300)
+    results = []
+    counter = iter(range(requests))
+
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=timeout
+    ) as client:
+
+        async def worker():
+            for i in counter:
+                try:
+                    results.append(
+                        await timed_request(
+                            client, endpoint, make_payload(endpoint, i, repeat)
+                        )
+                    )
+                except httpx.HTTPError:
+                    results.append((0, 0.0, 0.0))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ok = [(latency, ttft) for status, latency, ttft in results if status == 200]
+    rejected = sum(status in (429, 503) for status, _, _ in results)
+    errors = len(results) - len(ok) - rejected
+    if ok:
+        latencies = np.array([latency for latency, _ in ok]) * 1000
+        ttfts = np.array([ttft for _, ttft in ok]) * 1000
+        stats = (
+            f"{np.percentile(ttfts, 50):>9.0f} {np.percentile(ttfts, 99):>9.0f} "
+            f"{np.percentile(latencies, 50):>8.0f} {np.percentile(latencies, 99):>8.0f}"
+        )
+    else:
+        stats = f"{'-':>9} {'-':>9} {'-':>8} {'-':>8}"
+    print(
+        f"{endpoint:<16} {concurrency:>5} {len(ok) / elapsed:>8.2f} {stats} "
+        f"{rejected:>8} {errors:>6}"
+    )
+
+
+async def main(args):
+    print(
+        f"{'endpoint':<16} {'conc':>5} {'req/s':>8} {'ttft p50':>9} {'ttft p99':>9} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'rejected':>8} {'errors':>6}"
+    )
+    for endpoint in args.endpoints.split(","):
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            requests = max(args.requests, concurrency)
+            await run_level(args.base_url, endpoint, concurrency, requests, args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load-test the AI endpoints: throughput, time to first token "
+        "and latency percentiles per concurrency level. Run the API against "
+        "scripts/fake_openai.py to avoid OpenAI costs."
+    )
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument(
+        "--requests", type=int, default=32, help="Requests per concurrency level."
+    )
+    parser.add_argument(
+        "--repeat",
+        action="store_true",
+        help="Reuse the same questions, so the answer cache can serve them.",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+from app.ai.index_factory import INDEX_TYPES, configure_search, create_index
+from app.ai.sharded_index import load_shard_indexes, merge_indexes
+from app.core.config import FAISS_REFINE_K_FACTOR
+import argparse
+import faiss
+import numpy as np
+import time
+
+FAISS_INDEX_PATH = "data/faiss_index"
+
+# Suffix of an index type that adds exact re-ranking, e.g. "ivf_pq+refine"
+REFINE_SUFFIX = "+refine"
+
+DEFAULT_TYPES = INDEX_TYPES + ("sq_int8+refine", "ivf_pq+refine")
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """
+    Reads every vector back out of a saved FAISS index, sharded or not, in
+    row order (the order of the build's chunk_ids.json).
+    """
+    index = merge_indexes(load_shard_indexes(index_path))
+    return index.reconstruct_batch(np.arange(index.ntotal, dtype=np.int64))
+
+
+def synthetic_vectors(num_vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered random vectors, roughly shaped like real embeddings."""
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_vectors // 100)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    labels = rng.integers(num_clusters, size=num_vectors)
+    noise = rng.normal(scale=0.3, size=(num_vectors, dim)).astype(np.float32)
+    return centers[labels] + noise
+
+
+def make_queries(vectors: np.ndarray, num_queries: int, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of corpus vectors, so queries have true neighbours."""
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.integers(len(vectors), size=num_queries)]
+    scale = 0.05 * float(np.std(vectors))
+    return picked + rng.normal(scale=scale, size=picked.shape).astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, expected: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]).intersection(e)) for f, e in zip(found, expected))
+    return hits / expected.size
+
+
+def index_size_mb(index: faiss.Index) -> float:
+    """Size of the serialized index, which is close to its size in memory."""
+    return faiss.serialize_index(index).nbytes / 1024**2
+
+
+def benchmark(index: faiss.Index, queries: np.ndarray, k: int):
+    """Runs one query at a time, as the API does, and records latencies."""
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results[i] = ids[0]
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def run(
+    vectors: np.ndarray, index_types, k: int, num_queries: int, refine_k_factor: float
+):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = make_queries(vectors, num_queries)
+    print(
+        f"Corpus: {len(vectors)} vectors x {vectors.shape[1]} dims, "
+        f"{num_queries} queries, k={k}, refine k_factor={refine_k_factor}\n"
+    )
+
+    # Exact brute-force results are the ground truth for recall
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, expected = exact.search(queries, k)
+
+    print(
+        f"{'index':<16} {'MB':>9} {'B/vec':>7} {'build s':>8} "
+        f"{f'recall@{k}':>10} {'p50 ms':>8} {'p99 ms':>8}"
+    )
+    for name in index_types:
+        index_type = name.removesuffix(REFINE_SUFFIX)
+        refine = refine_k_factor if name.endswith(REFINE_SUFFIX) else 0
+        start = time.perf_counter()
+        index = create_index(vectors, index_type, refine_k_factor=refine)
+        index = configure_search(index, refine_k_factor=refine)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        size_mb = index_size_mb(index)
+        found, p50, p99 = benchmark(index, queries, k)
+        print(
+            f"{name:<16} {size_mb:>9.1f} {size_mb * 1024**2 / len(vectors):>7.0f} "
+            f"{build_seconds:>8.2f} {recall_at_k(found, expected):>10.3f} "
+            f"{p50:>8.3f} {p99:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare FAISS index types by memory, recall@k and query "
+        "latency."
+    )
+    parser.add_argument("--index-path", default=FAISS_INDEX_PATH)
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        metavar="N",
+        help="Benchmark on N synthetic vectors instead of the saved index.",
+    )
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument(
+        "--types",
+        default=",".join(DEFAULT_TYPES),
+        help=f"Index types to compare; add '{REFINE_SUFFIX}' to re-rank exactly.",
+    )
+    parser.add_argument(
+        "--refine-k-factor",
+        type=float,
+        default=FAISS_REFINE_K_FACTOR or 4,
+        help="Candidates re-ranked per result by the '+refine' variants.",
+    )
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus = synthetic_vectors(args.synthetic, args.dim)
+    else:
+        corpus = load_vectors(args.index_path)
+    run(
+        corpus,
+        args.types.split(","),
+        k=args.k,
+        num_queries=args.queries,
+        refine_k_factor=args.refine_k_factor,
+    )
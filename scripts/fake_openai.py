@@ -0,0 +1,265 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+import argparse
+import asyncio
+import hashlib
+import json
+import numpy as np
+import re
+import time
+import uuid
+import uvicorn
+
+# Simulated behaviour, set from the command line
+SETTINGS = {
+    "latency": 0.3,  # seconds before the first token / response
+    "tokens_per_second": 50.0,
+    "answer_tokens": 60,
+    "embedding_latency": 0.05,
+    "embedding_dim": 1536,
+}
+
+COUNT_WORDS = ("berapa", "jumlah", "daftar", "how many", "count", "list")
+CONTENT_WORDS = ("pasal", "isi", "mengatur", "what does", "say about")
+
+app = FastAPI(title="Fake OpenAI API")
+
+
+# --- Embeddings ---
+def embed(text) -> list:
+    """
+    Deterministic bag-of-words embedding: every word (or token id) adds to a
+    hashed dimension, so texts sharing words are close, like real embeddings.
+    """
+    words = (
+        [str(t) for t in text]
+        if isinstance(text, list)
+        else re.findall(r"\w+", text.lower())
+    )
+    vector = np.zeros(SETTINGS["embedding_dim"], dtype=np.float32)
+    for word in words or [""]:
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % len(vector)
+        vector[index] += 1.0 if digest[4] % 2 else -1.0
+    vector /= max(float(np.linalg.norm(vector)), 1e-12)
+    return vector.tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"]
+    # A single string (or a single token list) is one input
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    await asyncio.sleep(SETTINGS["embedding_latency"])
+    tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", "fake-embedding"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": embed(text)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+# --- Chat completions ---
+def _tools(body: dict) -> list:
+    """Function definitions from either the `tools` or the legacy `functions` field."""
+    if body.get("tools"):
+        return [tool["function"] for tool in body["tools"]]
+    return body.get("functions") or []
+
+
+def _question(messages: list) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content")
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _pick_calls(body: dict) -> list:
+    """
+    Acts like a tool-using model: on the first turn it calls a tool (SQL-like
+    tools for counting questions, search tools otherwise, both at once for
+    questions that ask for both when parallel tool calls are possible); once a
+    tool result is in the conversation it answers.
+    """
+    tools = _tools(body)
+    messages = body.get("messages", [])
+    if not tools or any(m.get("role") in ("tool", "function") for m in messages):
+        return []
+
+    question = _question(messages)
+    wants_count = any(word in question.lower() for word in COUNT_WORDS)
+    wants_content = any(word in question.lower() for word in CONTENT_WORDS)
+
+    def score(tool, count):
+        text = f"{tool['name']} {tool.get('description', '')}".lower()
+        if "checker" in text:
+            return -1
+        if count:
+            return int("database" in text or "sql" in text)
+        return int("document" in text or "search" in text)
+
+    wanted = [wants_count]
+    if wants_count and wants_content and body.get("tools"):
+        wanted.append(False)
+
+    calls = []
+    for count in wanted:
+        tool = max(tools, key=lambda tool: score(tool, count))
+        properties = (tool.get("parameters") or {}).get("properties") or {"__arg1": {}}
+        if tool["name"] == "sql_db_query":
+            arguments = {"query": "SELECT COUNT(*) FROM regulation"}
+        else:
+            arguments = {name: question for name in properties}
+        calls.append((tool["name"], json.dumps(arguments)))
+    return calls
+
+
+def _answer_tokens(messages: list) -> list:
+    results = [m for m in messages if m.get("role") in ("tool", "function")]
+    context = str(results[-1].get("content", ""))[:80] if results else ""
+    words = f"Berdasarkan data yang tersedia: {context}".split()
+    filler = ["regulasi", "ini", "mengatur", "ketentuan", "yang", "berlaku"]
+    while len(words) < SETTINGS["answer_tokens"]:
+        words.append(filler[len(words) % len(filler)])
+    return [("" if i == 0 else " ") + word for i, word in enumerate(words)]
+
+
+def _usage(messages: list, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _tool_message(body: dict, calls: list):
+    """The assistant message for the calls, in the format the request used."""
+    if body.get("tools"):
+        tool_calls = [
+            {
+                "id": f"call_{uuid.uuid4().hex[:12]}",
+                "type": "function",
+                "function": {"name": name, "arguments": arguments},
+            }
+            for name, arguments in calls
+        ]
+        return {"tool_calls": tool_calls}, "tool_calls"
+    name, arguments = calls[0]
+    return {"function_call": {"name": name, "arguments": arguments}}, "function_call"
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    chunk = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n"
+
+
+async def _stream(body: dict, completion_id: str, model: str):
+    messages = body.get("messages", [])
+    calls = _pick_calls(body)
+    await asyncio.sleep(SETTINGS["latency"])
+
+    if calls:
+        message, finish_reason = _tool_message(body, calls)
+        for index, tool_call in enumerate(message.get("tool_calls", [])):
+            tool_call["index"] = index
+        yield _chunk(completion_id, model, {"role": "assistant", **message})
+        completion_tokens = sum(len(arguments) // 4 + 1 for _, arguments in calls)
+    else:
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+        tokens = _answer_tokens(messages)
+        for token in tokens:
+            await asyncio.sleep(1 / SETTINGS["tokens_per_second"])
+            yield _chunk(completion_id, model, {"content": token})
+        finish_reason = "stop"
+        completion_tokens = len(tokens)
+
+    yield _chunk(completion_id, model, {}, finish_reason)
+    if (body.get("stream_options") or {}).get("include_usage"):
+        usage = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [],
+            "usage": _usage(messages, completion_tokens),
+        }
+        yield f"data: {json.dumps(usage)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake-model")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    if body.get("stream"):
+        return StreamingResponse(
+            _stream(body, completion_id, model), media_type="text/event-stream"
+        )
+
+    messages = body.get("messages", [])
+    calls = _pick_calls(body)
+    if calls:
+        message, finish_reason = _tool_message(body, calls)
+        message = {"role": "assistant", "content": None, **message}
+        completion_tokens = sum(len(arguments) // 4 + 1 for _, arguments in calls)
+    else:
+        tokens = _answer_tokens(messages)
+        message = {"role": "assistant", "content": "".join(tokens)}
+        finish_reason = "stop"
+        completion_tokens = len(tokens)
+
+    # Non-streaming responses arrive once all tokens are "generated"
+    await asyncio.sleep(
+        SETTINGS["latency"] + completion_tokens / SETTINGS["tokens_per_second"]
+    )
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": _usage(messages, completion_tokens),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local OpenAI-compatible server for offline load testing. "
+        "Point the app at it with OPENAI_BASE_URL=http://localhost:<port>/v1."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=SETTINGS["latency"])
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=SETTINGS["tokens_per_second"]
+    )
+    parser.add_argument("--answer-tokens", type=int, default=SETTINGS["answer_tokens"])
+    parser.add_argument(
+        "--embedding-latency", type=float, default=SETTINGS["embedding_latency"]
+    )
+    parser.add_argument("--embedding-dim", type=int, default=SETTINGS["embedding_dim"])
+    args = parser.parse_args()
+
+    SETTINGS.update(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        embedding_latency=args.embedding_latency,
+        embedding_dim=args.embedding_dim,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
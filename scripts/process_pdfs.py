@@ -1,78 +1,529 @@
-from app.core.config import OPENAI_API_KEY
+from app.ai.index_factory import (
+    INDEX_TYPES,
+    TRAINED_INDEX_TYPES,
+    build_vector_store,
+    remove_documents,
+)
+from app.ai.embedding_store import BatchEmbedder, EmbeddingStore
+from app.ai.lexical_index import BM25Index
+from app.ai.llm import get_embeddings_model
+from app.ai.sharded_index import (
+    ROOT_SHARD,
+    SHARD_BY_OPTIONS,
+    load_chunk_ids,
+    load_shard_indexes,
+    merge_shards,
+    remove_index_files,
+    save_chunk_ids,
+    save_shards,
+    shard_key,
+    sharding_scheme,
+)
+from app.ai.vector_index import MetadataIndex
+from app.core.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_IN_FLIGHT,
+    FAISS_INDEX_TYPE,
+    FAISS_SHARD_BY,
+    FAISS_SHARD_YEAR_RANGE,
+    FAISS_TRAIN_SAMPLE_SIZE,
+    OPENAI_EMBEDDING_MODEL,
+)
 from app.core.database import SessionLocal
 from app.models.regulation import Regulation
+from app.repositories import regulation_chunk_repository
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.documents import Document
 from sqlalchemy.orm import Session
+from uuid import UUID
+import argparse
+import hashlib
+import json
 import os
 import requests
 
 PDFS_DIR = "data/pdfs"
 FAISS_INDEX_PATH = "data/faiss_index"
+MANIFEST_PATH = os.path.join(FAISS_INDEX_PATH, "manifest.json")
 NUM_PDFS_TO_PROCESS = 15
 
+# Pipeline settings
+DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_TIMEOUT = 60
+PARSE_WORKERS = os.cpu_count() or 1
+# Chunks handed to the embedder at once: enough to keep every batch slot busy
+EMBED_FLUSH_SIZE = EMBED_BATCH_SIZE * EMBED_MAX_IN_FLIGHT
 
-def process_all_pdfs():
+# Define a User-Agent header to mimic a browser
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+
+def regulation_metadata(reg: Regulation) -> dict:
+    """Metadata attached to every chunk, used for filtered vector search."""
+    return {
+        "regulation_id": str(reg.regulation_id),
+        "nama_peraturan": reg.nama_peraturan,
+        "tahun": reg.tahun,
+        "bentuk_singkat": reg.bentuk_singkat,
+    }
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict | None:
+    """
+    The ingestion manifest records, per regulation_id, the hash of the PDF
+    that was indexed and the ids of the chunks it produced.
+    """
+    if not os.path.exists(MANIFEST_PATH):
+        return None
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+
+
+def create_http_session(pool_size: int) -> requests.Session:
+    """A keep-alive session whose connection pool matches the download concurrency."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download_pdf(session: requests.Session, reg: Regulation):
+    """
+    Downloads the regulation's PDF unless it is already on disk.
+    Returns (regulation, pdf_path, sha256), or None if the download failed.
+    """
+    pdf_path = os.path.join(PDFS_DIR, f"{reg.regulation_id}.pdf")
+    if not os.path.exists(pdf_path):
+        print(f"Downloading {reg.file_pdf}...")
+        try:
+            # Stream to a temporary file so a failed download leaves no partial PDF
+            with session.get(
+                reg.file_pdf, stream=True, timeout=DOWNLOAD_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                with open(f"{pdf_path}.part", "wb") as f:
+                    for block in response.iter_content(chunk_size=1 << 16):
+                        f.write(block)
+            os.replace(f"{pdf_path}.part", pdf_path)
+        except requests.RequestException as e:
+            print(f"Failed to download {reg.file_pdf}: {e}")
+            return None
+    return reg, pdf_path, file_sha256(pdf_path)
+
+
+def iter_downloads(regulations: list, concurrency: int):
+    """Yields download results as they finish, at most `concurrency` at a time."""
+    session = create_http_session(concurrency)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(download_pdf, session, reg) for reg in regulations]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is not None:
+                yield result
+    session.close()
+
+
+def parse_pdf(pdf_path: str) -> list:
+    """Parses a PDF into page documents. Runs in a worker process."""
+    try:
+        return PyPDFLoader(pdf_path).load()
+    except Exception as e:
+        print(f"Failed to load or parse PDF {pdf_path}: {e}")
+        return []
+
+
+def iter_parsed(jobs, workers: int):
+    """
+    Parses PDFs from `jobs` ((regulation, pdf_path) pairs) in a process pool
+    and yields (regulation, pages) as each one finishes. At most two PDFs per
+    worker are in flight, so parsed pages never pile up in memory.
+    """
+    max_pending = 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for reg, pdf_path in jobs:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+            print(f"Loading document {pdf_path}...")
+            pending[pool.submit(parse_pdf, pdf_path)] = reg
+        for future in as_completed(pending):
+            yield pending[future], future.result()
+
+
+def load_vector_stores(db: Session, embeddings) -> dict[str, FAISS] | None:
+    """
+    The index's shards by key (one root shard if unsharded), if it exists,
+    as vector stores over the chunks in the regulation_chunk table. Returns
+    None if the index and the table don't line up, so it is rebuilt.
+    """
+    try:
+        indexes = load_shard_indexes(FAISS_INDEX_PATH)
+        chunk_ids = load_chunk_ids(FAISS_INDEX_PATH)
+    except Exception:
+        return None
+    chunks = {row.chunk_id: row for row in regulation_chunk_repository.get_all(db)}
+    if len(chunk_ids) != sum(index.ntotal for index in indexes.values()):
+        return None
+    if len(chunks) != len(chunk_ids) or not all(i in chunks for i in chunk_ids):
+        return None
+    rows = [chunks[chunk_id] for chunk_id in chunk_ids]
+
+    # Shards are merged in key order, so each one holds the next run of rows
+    vector_stores = {}
+    offset = 0
+    for key, index in sorted(indexes.items()):
+        shard_rows = rows[offset : offset + index.ntotal]
+        offset += index.ntotal
+        vector_stores[key] = FAISS(
+            embeddings,
+            index,
+            InMemoryDocstore(
+                {
+                    row.chunk_id: Document(
+                        page_content=row.text,
+                        metadata=regulation_chunk_repository.chunk_metadata(row),
+                    )
+                    for row in shard_rows
+                }
+            ),
+            {i: row.chunk_id for i, row in enumerate(shard_rows)},
+        )
+    return vector_stores
+
+
+def chunk_row(chunk_id: str, chunk: Document) -> dict:
+    """The regulation_chunk row of a newly split chunk."""
+    return {
+        "chunk_id": chunk_id,
+        "regulation_id": UUID(chunk.metadata["regulation_id"]),
+        "page": chunk.metadata.get("page"),
+        "offset": chunk.metadata.get("start_index"),
+        "text": chunk.page_content,
+        "hash": hashlib.sha256(chunk.page_content.encode("utf-8")).hexdigest(),
+    }
+
+
+def shard_label(key: str) -> str:
+    return "" if key == ROOT_SHARD else f" (shard '{key}')"
+
+
+def process_all_pdfs(
+    index_type: str = FAISS_INDEX_TYPE,
+    rebuild: bool = False,
+    shard_by: str = FAISS_SHARD_BY,
+    rebuild_shard: str | None = None,
+):
+    """
+    Brings the FAISS index in line with the regulations that have PDFs.
+    Only new or changed PDFs are embedded; chunks of changed or removed
+    regulations are deleted. Pass rebuild=True to start from scratch.
+
+    With shard_by, chunks are partitioned into one index per bentuk_singkat
+    or year range, and only the shards whose regulations changed are
+    updated and saved. rebuild_shard rebuilds a single shard from scratch.
+
+    Ingestion runs as a streaming pipeline: PDFs are downloaded concurrently
+    over a pooled session, parsed in a process pool, and split, embedded and
+    added to the index and the chunk table batch by batch as parsed pages
+    arrive. Only one batch of chunks is held at a time, except that a new
+    shard of a trained index type keeps up to FAISS_TRAIN_SAMPLE_SIZE chunks
+    to train on.
+    """
     os.makedirs(PDFS_DIR, exist_ok=True)
     db: Session = SessionLocal()
 
     regulations = (
         db.query(Regulation)
         .filter(Regulation.file_pdf.isnot(None))
+        .order_by(Regulation.regulation_id)
         .limit(NUM_PDFS_TO_PROCESS)
         .all()
     )
-    db.close()
 
-    # Define a User-Agent header to mimic a browser
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
+    # Retries are handled by the batch embedder, which also skips every chunk
+    # that an earlier (possibly interrupted) run already embedded
+    embeddings = BatchEmbedder(
+        get_embeddings_model(OPENAI_EMBEDDING_MODEL, max_retries=0),
+        model_name=OPENAI_EMBEDDING_MODEL,
+        store=EmbeddingStore(),
+    )
 
-    documents = []
-    for reg in regulations:
-        pdf_path = os.path.join(PDFS_DIR, f"{reg.regulation_id}.pdf")
-        if not os.path.exists(pdf_path):
-            print(f"Downloading {reg.file_pdf}...")
-            try:
-                # Use the headers in the request
-                response = requests.get(reg.file_pdf, headers=headers)
-                response.raise_for_status()
-                with open(pdf_path, "wb") as f:
-                    f.write(response.content)
-            except requests.RequestException as e:
-                print(f"Failed to download {reg.file_pdf}: {e}")
+    scheme = sharding_scheme(shard_by, FAISS_SHARD_YEAR_RANGE)
+    manifest = load_manifest()
+    vector_stores = None if rebuild else load_vector_stores(db, embeddings)
+    from_scratch = (
+        vector_stores is None
+        or manifest is None
+        or manifest["embedding_model"] != OPENAI_EMBEDDING_MODEL
+        or manifest.get("sharding", sharding_scheme("none", 0)) != scheme
+    )
+    if from_scratch:
+        print("Building the FAISS index from scratch...")
+        vector_stores = {}
+        manifest = {
+            "embedding_model": OPENAI_EMBEDDING_MODEL,
+            "sharding": scheme,
+            "regulations": {},
+        }
+    indexed = manifest["regulations"]
+
+    # Forgetting a shard's regulations makes them new, so the shard is rebuilt
+    # (with a freshly trained index) from their cached embeddings
+    if rebuild_shard is not None:
+        print(f"Rebuilding shard '{rebuild_shard}'...")
+        vector_stores.pop(rebuild_shard, None)
+        for reg_id, entry in list(indexed.items()):
+            if entry.get("shard", ROOT_SHARD) == rebuild_shard:
+                del indexed[reg_id]
+
+    selected_ids = {str(reg.regulation_id) for reg in regulations}
+    removed = [reg_id for reg_id in indexed if reg_id not in selected_ids]
+    changed, new = [], []
+    pdf_hashes = {}
+
+    def changed_pdfs():
+        """Passes on only the downloads whose content differs from the manifest."""
+        for reg, pdf_path, pdf_hash in iter_downloads(
+            regulations, DOWNLOAD_CONCURRENCY
+        ):
+            reg_id = str(reg.regulation_id)
+            entry = indexed.get(reg_id)
+            if entry is not None and entry["pdf_sha256"] == pdf_hash:
                 continue
+            if entry is None:
+                new.append(reg_id)
+            else:
+                changed.append(reg_id)
+            pdf_hashes[reg_id] = pdf_hash
+            yield reg, pdf_path
 
-        # This part only runs if the PDF exists or was downloaded successfully
-        print(f"Loading document {pdf_path}...")
-        try:
-            loader = PyPDFLoader(pdf_path)
-            documents.extend(loader.load())
-        except Exception as e:
-            print(f"Failed to load or parse PDF {pdf_path}: {e}")
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=200, add_start_index=True
+    )
+    # Chunks of removed and changed regulations, dropped from their shards
+    # and from the chunk table before the next batch is added
+    changed_shards = set() if rebuild_shard is None else {rebuild_shard}
+    stale_ids: dict[str, list] = {}
+    stale_regs: list[str] = []
+    # Chunks of new shards whose index type must be trained first
+    unbuilt: dict[str, list] = {}
+    batch: list = []
+    new_entries = {}
+    added = 0
 
-    # Add a check to ensure documents were actually loaded before proceeding
-    if not documents:
-        print("No documents were loaded. Aborting FAISS index creation.")
+    def forget(reg_id: str):
+        """Marks a regulation's indexed chunks as stale."""
+        stale_regs.append(reg_id)
+        entry = indexed.pop(reg_id, None)
+        if entry is not None:
+            stale_ids.setdefault(entry.get("shard", ROOT_SHARD), []).extend(
+                entry["chunk_ids"]
+            )
+
+    def build_shard(key: str):
+        rows = unbuilt.pop(key)
+        print(f"Building '{index_type}' FAISS index{shard_label(key)}...")
+        vector_stores[key] = build_vector_store(
+            [chunk for _, chunk, _ in rows],
+            [vector for _, _, vector in rows],
+            embeddings,
+            index_type,
+            ids=[chunk_id for chunk_id, _, _ in rows],
+        )
+
+    def flush():
+        """
+        Embeds the pending chunks and adds them to their shards and to the
+        chunk table, so only one batch of chunks is held at a time.
+        """
+        nonlocal batch, added
+        # Stale chunks go first: a changed regulation's new chunks reuse
+        # the ids of its old ones
+        for key, ids in stale_ids.items():
+            if key in vector_stores:
+                print(f"Deleting {len(ids)} stale chunks{shard_label(key)}...")
+                vector_stores[key] = remove_documents(vector_stores[key], ids)
+                changed_shards.add(key)
+        stale_ids.clear()
+        regulation_chunk_repository.delete_chunks(
+            db, [UUID(reg_id) for reg_id in stale_regs]
+        )
+        stale_regs.clear()
+        if not batch:
+            return
+
+        print(f"Adding {len(batch)} new chunks...")
+        vectors = embeddings.embed_documents([chunk.page_content for _, chunk in batch])
+        regulation_chunk_repository.add_chunks(
+            db, [chunk_row(chunk_id, chunk) for chunk_id, chunk in batch]
+        )
+        shard_rows: dict[str, list] = {}
+        for (chunk_id, chunk), vector in zip(batch, vectors):
+            shard_rows.setdefault(shard_key(chunk.metadata, scheme), []).append(
+                (chunk_id, chunk, vector)
+            )
+        for key, rows in shard_rows.items():
+            changed_shards.add(key)
+            if key in vector_stores:
+                vector_stores[key].add_embeddings(
+                    [(chunk.page_content, vector) for _, chunk, vector in rows],
+                    metadatas=[chunk.metadata for _, chunk, _ in rows],
+                    ids=[chunk_id for chunk_id, _, _ in rows],
+                )
+                continue
+            # A trained index is built once its training sample is complete
+            unbuilt.setdefault(key, []).extend(rows)
+            if (
+                index_type not in TRAINED_INDEX_TYPES
+                or len(unbuilt[key]) >= FAISS_TRAIN_SAMPLE_SIZE
+            ):
+                build_shard(key)
+        added += len(batch)
+        batch = []
+
+    if from_scratch:
+        regulation_chunk_repository.delete_chunks(db, None)
+    for reg_id in removed:
+        forget(reg_id)
+
+    for reg, pages in iter_parsed(changed_pdfs(), PARSE_WORKERS):
+        reg_id = str(reg.regulation_id)
+        forget(reg_id)
+        if not pages:
+            continue
+        for page in pages:
+            page.metadata.update(regulation_metadata(reg))
+        chunks = text_splitter.split_documents(pages)
+        chunk_ids = [f"{reg_id}:{n}" for n in range(len(chunks))]
+        batch.extend(zip(chunk_ids, chunks))
+        new_entries[reg_id] = {
+            "pdf_sha256": pdf_hashes[reg_id],
+            "chunk_ids": chunk_ids,
+            "shard": shard_key(regulation_metadata(reg), scheme),
+        }
+
+        # Embed and add full batches while later PDFs are still downloading
+        # and parsing
+        if len(batch) >= EMBED_FLUSH_SIZE:
+            flush()
+
+    print(f"{len(new)} new, {len(changed)} changed, {len(removed)} removed.")
+    if not (new or changed or removed or rebuild_shard is not None):
+        print("FAISS index is up to date.")
+        db.close()
         return
 
-    # Split documents into chunks
-    print("Splitting documents into chunks...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    splits = text_splitter.split_documents(documents)
+    flush()
+    for key in list(unbuilt):
+        build_shard(key)
+    indexed.update(new_entries)
+    print(
+        f"Embedding cache: {embeddings.cache_hits} hits, "
+        f"{embeddings.cache_misses} chunks sent to the API."
+    )
+
+    # Shards left without chunks are deleted
+    vector_stores = {
+        key: store for key, store in vector_stores.items() if store.index.ntotal
+    }
+    if not vector_stores:
+        print("No documents were loaded. Aborting FAISS index creation.")
+        db.close()
+        return
 
-    # Create embeddings and store in FAISS
-    print("Creating embeddings and building FAISS index...")
-    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-    vector_store = FAISS.from_documents(splits, embeddings)
+    # Save the changed shards' vectors locally; the others are left untouched
+    if from_scratch:
+        remove_index_files(FAISS_INDEX_PATH)
+    save_shards(
+        FAISS_INDEX_PATH,
+        {key: store.index for key, store in vector_stores.items()},
+        scheme,
+        sorted(changed_shards),
+    )
 
-    # Save the FAISS index locally
-    vector_store.save_local(FAISS_INDEX_PATH)
-    print(f"FAISS index created and saved to {FAISS_INDEX_PATH}")
+    # Row ids shift when chunks are deleted, so the metadata and BM25 indexes
+    # and the rows' chunk ids are rebuilt from the merged docstore of all
+    # shards (no embedding needed). The chunk table only changes for changed
+    # regulations, so processes serving the previous build keep hydrating
+    # their rows by the chunk ids they loaded.
+    vector_store = merge_shards(vector_stores, embeddings)
+    MetadataIndex.from_vector_store(vector_store).save(FAISS_INDEX_PATH)
+    BM25Index.from_vector_store(vector_store).save(FAISS_INDEX_PATH)
+    save_chunk_ids(
+        FAISS_INDEX_PATH,
+        [
+            vector_store.index_to_docstore_id[row_id]
+            for row_id in range(vector_store.index.ntotal)
+        ],
+    )
+    db.commit()
+    db.close()
+    save_manifest(manifest)
+    print(f"FAISS index saved to {FAISS_INDEX_PATH}")
 
 
 if __name__ == "__main__":
-    process_all_pdfs()
+    parser = argparse.ArgumentParser(description="Build the FAISS index from PDFs.")
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        default=FAISS_INDEX_TYPE,
+        help="FAISS index type used when building from scratch; "
+        "see scripts/benchmark_index.py to compare them.",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Ignore the existing index and manifest and re-embed everything.",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_BY_OPTIONS,
+        default=FAISS_SHARD_BY,
+        help="Partition the index into one shard per bentuk_singkat or year "
+        "range. Changing it rebuilds the index.",
+    )
+    parser.add_argument(
+        "--rebuild-shard",
+        metavar="KEY",
+        help="Rebuild one shard (a key from data/faiss_index/shards.json) "
+        "from cached embeddings, leaving the other shards untouched.",
+    )
+    args = parser.parse_args()
+    process_all_pdfs(
+        index_type=args.index_type,
+        rebuild=args.rebuild,
+        shard_by=args.shard_by,
+        rebuild_shard=args.rebuild_shard,
+    )
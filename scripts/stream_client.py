@@ -18,28 +18,41 @@ try:
         response.raise_for_status()  # Raise an exception for bad status codes
 
         print("AI Response: ")
+        event = "message"
         # Iterate over the response line by line
         for line in response.iter_lines():
-            # Filter out empty lines
-            if line:
-                # Decode the line from bytes to a string
-                decoded_line = line.decode("utf-8")
-
-                # Check if the line is an SSE data line
-                if decoded_line.startswith("data:"):
-                    # Strip the "data: " prefix to get the JSON string
-                    json_str = decoded_line[len("data: ") :]
-
-                    try:
-                        # Parse the JSON string
-                        data = json.loads(json_str)
-                        token = data.get("token", "")
-
-                        # Print the token without a newline and flush the output
-                        print(token, end="", flush=True)
-                    except json.JSONDecodeError:
-                        # Ignore lines that are not valid JSON
-                        pass
+            # An empty line ends an event
+            if not line:
+                event = "message"
+                continue
+
+            # Decode the line from bytes to a string
+            decoded_line = line.decode("utf-8")
+
+            # The server names its final "done" and "error" events
+            if decoded_line.startswith("event:"):
+                event = decoded_line[len("event: ") :]
+                continue
+
+            # Check if the line is an SSE data line (": ping" heartbeats are not)
+            if not decoded_line.startswith("data:"):
+                continue
+
+            # Strip the "data: " prefix to get the JSON string
+            json_str = decoded_line[len("data: ") :]
+
+            try:
+                # Parse the JSON string
+                data = json.loads(json_str)
+            except json.JSONDecodeError:
+                # Ignore lines that are not valid JSON
+                continue
+
+            if event == "error":
+                print(f"\n[error] {data.get('message')}")
+            elif event == "message":
+                # Print the token without a newline and flush the output
+                print(data.get("token", ""), end="", flush=True)
         print()  # Print a final newline for a clean exit
 
 except requests.RequestException as e:
@@ -0,0 +1,88 @@
+from app.ai import chat_memory, chat_service
+from fastapi.testclient import TestClient
+import redis
+import uuid
+
+
+def test_chat_returns_server_timing(client: TestClient, monkeypatch):
+    """Test that /chat reports the traced steps in a Server-Timing header"""
+
+    async def fake_response(question, callbacks=None, session_id=None):
+        [tracer] = callbacks
+        run_id = uuid.uuid4()
+        tracer.on_tool_start({"name": "RegulationDatabase"}, question, run_id=run_id)
+        tracer.on_tool_end("12", run_id=run_id)
+        return "Ada 12 peraturan."
+
+    monkeypatch.setattr(chat_service, "get_intelligent_response", fake_response)
+
+    response = client.post("/api/v1/ai/chat", json={"question": "berapa?"})
+    assert response.status_code == 200
+    assert response.json() == {"response": "Ada 12 peraturan.", "session_id": None}
+    assert "tool;dur=" in response.headers["server-timing"]
+
+
+def test_metrics_endpoint(client: TestClient):
+    """Test that agent metrics are exposed as Prometheus text"""
+    response = client.get("/api/v1/ai/metrics")
+    assert response.status_code == 200
+    assert "# TYPE agent_span_duration_seconds histogram" in response.text
+
+
+def test_stream_chat_sends_tokens_and_done_event(client: TestClient, monkeypatch):
+    """Test that /stream-chat frames the answer as SSE and ends with done"""
+
+    async def fake_stream(question, callbacks=None, session_id=None):
+        for token in ["Ada", " 12", " peraturan."]:
+            yield token
+
+    monkeypatch.setattr(chat_service, "get_intelligent_response_stream", fake_stream)
+
+    response = client.post("/api/v1/ai/stream-chat", json={"question": "berapa?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert 'data: {"token": "Ada 12 peraturan."}' in response.text
+    assert "event: done" in response.text
+
+
+def test_chat_session_lifecycle(client: TestClient, monkeypatch):
+    """Test that sessions are created, used by /chat and deleted"""
+    store = {}
+    monkeypatch.setattr(chat_memory, "get_cache", store.get)
+    monkeypatch.setattr(
+        chat_memory, "set_cache", lambda key, value, ttl: store.update({key: value})
+    )
+    monkeypatch.setattr(chat_memory, "delete_cache", lambda key: store.pop(key, None))
+    seen = []
+
+    async def fake_response(question, callbacks=None, session_id=None):
+        seen.append(session_id)
+        return "Ada 12 peraturan."
+
+    monkeypatch.setattr(chat_service, "get_intelligent_response", fake_response)
+
+    session_id = client.post("/api/v1/ai/chat/sessions").json()["session_id"]
+    response = client.post(
+        "/api/v1/ai/chat", json={"question": "berapa?", "session_id": session_id}
+    )
+    assert response.json()["session_id"] == session_id
+    assert seen == [session_id]
+
+    assert client.delete(f"/api/v1/ai/chat/sessions/{session_id}").status_code == 204
+    response = client.post(
+        "/api/v1/ai/stream-chat", json={"question": "lalu?", "session_id": session_id}
+    )
+    assert response.status_code == 404
+
+
+def test_chat_sessions_fail_with_503_without_redis(client: TestClient, monkeypatch):
+    """Test that session endpoints report an unavailable Redis as 503"""
+
+    def unavailable(*args):
+        raise redis.ConnectionError("redis is down")
+
+    monkeypatch.setattr(chat_memory, "set_cache", unavailable)
+    monkeypatch.setattr(chat_memory, "delete_cache", unavailable)
+
+    assert client.post("/api/v1/ai/chat/sessions").status_code == 503
+    assert client.delete("/api/v1/ai/chat/sessions/abc").status_code == 503
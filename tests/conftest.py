@@ -34,6 +34,7 @@ def mock_redis(monkeypatch):
     monkeypatch.setattr("app.services.regulation_service.get_cache", mock_get_cache)
     monkeypatch.setattr("app.services.regulation_service.set_cache", no_op)
     monkeypatch.setattr("app.services.regulation_service.delete_cache", no_op)
+    monkeypatch.setattr("app.services.regulation_service.bump_data_version", no_op)
     # If you added mget/mset, mock them as well
     # monkeypatch.setattr("app.services.regulation_service.mget_cache", lambda keys: [None] * len(keys))
     # monkeypatch.setattr("app.services.regulation_service.mset_cache", no_op)
@@ -0,0 +1,211 @@
+from app.ai import answer_cache, vector_search_service
+from app.ai.answer_cache import AnswerCache
+from app.ai.embedding_cache import citation_signature
+from langchain_core.embeddings import Embeddings
+import asyncio
+import pytest
+import threading
+
+QUESTION = "Apa isi PP 34 tahun 2005?"
+REPHRASED = "PP 34/2005 mengatur tentang apa?"
+UNRELATED = "Apa sanksi pelanggaran data pribadi?"
+OTHER_REGULATION = "Apa isi PP 35 tahun 2005?"
+
+
+class TopicEmbeddings(Embeddings):
+    """Fake embeddings that map questions about the same topic close together"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        if "PP" in text:
+            return [1.0, 0.01 * len(text), 0.0]
+        return [0.0, 0.0, 1.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+class SameTopicEmbeddings(Embeddings):
+    """Fake embeddings that can't tell any two questions apart"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+class FakeRedis:
+    """In-memory stand-in for the binary Redis client"""
+
+    def __init__(self):
+        self.strings = {}
+        self.hashes = {}
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return self.strings.get(key)
+
+    def set(self, key, value, ex=None):
+        self.strings[key] = value.encode() if isinstance(value, str) else value
+
+    def hlen(self, key):
+        return len(self.hashes.get(key, {}))
+
+    def hgetall(self, key):
+        return {k.encode(): v for k, v in self.hashes.get(key, {}).items()}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field, None)
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    versions = {"data": "1"}
+    monkeypatch.setattr(answer_cache, "get_binary_redis_client", lambda: fake)
+    monkeypatch.setattr(answer_cache, "get_data_version", lambda: versions["data"])
+    monkeypatch.setattr(vector_search_service, "index_version", "index-1")
+    fake.versions = versions
+    return fake
+
+
+def test_exact_question_is_served_without_embedding(fake_redis):
+    """Test that the same question hits the cache without an embedding call"""
+    embeddings = TopicEmbeddings()
+    cache = AnswerCache(embeddings, threshold=0.95)
+
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+    calls = embeddings.calls
+
+    assert asyncio.run(cache.get("  apa isi pp 34 tahun 2005? ")) == (
+        "Tentang pendaftaran."
+    )
+    assert embeddings.calls == calls
+
+
+def test_near_duplicate_question_returns_cached_answer(fake_redis):
+    """Test that a rephrased question above the threshold shares the answer"""
+    cache = AnswerCache(TopicEmbeddings(), threshold=0.95)
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+
+    assert asyncio.run(cache.get(REPHRASED)) == "Tentang pendaftaran."
+    assert asyncio.run(cache.get(UNRELATED)) is None
+
+
+def test_other_regulation_number_is_not_a_near_duplicate(fake_redis):
+    """Test that similar questions citing different numbers never share answers"""
+    cache = AnswerCache(TopicEmbeddings(), threshold=0.95)
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+
+    assert asyncio.run(cache.get(OTHER_REGULATION)) is None
+    assert threading.get_ident() not in fake_redis.threads
+
+
+@pytest.mark.parametrize(
+    "stored, asked",
+    [
+        (
+            "Berapa peraturan pajak yang masih berlaku?",
+            "Berapa peraturan pajak yang sudah dicabut?",
+        ),
+        (
+            "Berapa peraturan pajak yang berlaku?",
+            "Berapa peraturan pajak yang tidak berlaku?",
+        ),
+        ("Sebutkan peraturan gubernur tentang pajak", "Sebutkan perbup tentang pajak"),
+        ("Apa isi PMK tentang bea masuk?", "Apa isi Permen tentang bea masuk?"),
+        ("Jumlah peraturan pajak per tahun", "Jumlah peraturan pajak per jenis"),
+    ],
+)
+def test_near_misses_in_status_form_or_grouping_are_not_shared(
+    fake_redis, stored, asked
+):
+    """Test that questions differing in status, form or grouping never share answers"""
+    cache = AnswerCache(SameTopicEmbeddings(), threshold=0.95)
+    asyncio.run(cache.set(stored, "Jawaban."))
+
+    assert asyncio.run(cache.get(stored)) == "Jawaban."
+    assert asyncio.run(cache.get(asked)) is None
+
+
+def test_template_questions_skip_the_cache(fake_redis):
+    """Test that questions the SQL templates answer are neither stored nor served"""
+    cache = AnswerCache(SameTopicEmbeddings(), threshold=0.95)
+    asyncio.run(cache.set("Berapa jumlah peraturan yang berlaku?", "Ada 12."))
+
+    assert fake_redis.strings == {} and fake_redis.hashes == {}
+    asyncio.run(cache.set("Peraturan apa soal pajak yang berlaku?", "PP 5."))
+    assert asyncio.run(cache.get("Daftar peraturan yang berlaku")) is None
+
+
+def test_citation_signature():
+    """Test that forms, numbers, years, statuses and groupings make the signature"""
+    assert citation_signature(QUESTION) == citation_signature(REPHRASED)
+    assert citation_signature(QUESTION) == "34 pp y2005"
+    assert citation_signature("Pasal 5 UU 11/2008") != citation_signature(
+        "Pasal 11 UU 5/2008"
+    )
+    assert citation_signature("Apa itu data pribadi?") == ""
+    assert citation_signature("Peraturan Pemerintah 34/2005") == "34 pp y2005"
+    assert citation_signature("Peraturan Wali Kota yang tidak berlaku") == (
+        "perwali tidak_berlaku"
+    )
+    assert citation_signature("Jumlah PERDA per tahun") == "per tahun perda"
+
+
+def test_version_change_invalidates_answers(fake_redis, monkeypatch):
+    """Test that a new data or index version starts from an empty cache"""
+    cache = AnswerCache(TopicEmbeddings(), threshold=0.95)
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+
+    fake_redis.versions["data"] = "2"
+    assert asyncio.run(cache.get(QUESTION)) is None
+
+    fake_redis.versions["data"] = "1"
+    monkeypatch.setattr(vector_search_service, "index_version", "index-2")
+    assert asyncio.run(cache.get(QUESTION)) is None
+
+
+def test_cache_stops_growing_when_full(fake_redis):
+    """Test that no new entries are stored beyond max_size"""
+    cache = AnswerCache(TopicEmbeddings(), max_size=1, threshold=0.95)
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+    asyncio.run(cache.set(UNRELATED, "Ada 12 peraturan."))
+
+    assert asyncio.run(cache.get(UNRELATED)) is None
+
+
+def test_redis_errors_are_treated_as_misses(monkeypatch):
+    """Test that an unavailable Redis never breaks the chat path"""
+
+    def broken_client():
+        raise ConnectionError("redis is down")
+
+    monkeypatch.setattr(answer_cache, "get_binary_redis_client", broken_client)
+    cache = AnswerCache(TopicEmbeddings())
+
+    asyncio.run(cache.set(QUESTION, "Tentang pendaftaran."))
+    assert asyncio.run(cache.get(QUESTION)) is None
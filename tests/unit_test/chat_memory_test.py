@@ -0,0 +1,144 @@
+from app.ai import chat_memory, chat_service, context_assembly
+from app.ai.chat_memory import history_messages, split_history
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Dict-backed stand-in for the Redis cache helpers"""
+    data = {}
+    monkeypatch.setattr(chat_memory, "get_cache", data.get)
+    monkeypatch.setattr(
+        chat_memory, "set_cache", lambda key, value, ttl: data.update({key: value})
+    )
+    monkeypatch.setattr(chat_memory, "delete_cache", lambda key: data.pop(key, None))
+    monkeypatch.setattr(context_assembly, "_get_encoding", lambda: None)
+    return data
+
+
+def turn(n, size=40):
+    return {"question": f"q{n}", "answer": "x" * size}
+
+
+def test_recent_turns_are_kept_within_the_budget(store):
+    """Test that the newest turns fitting the budget stay verbatim"""
+    turns = [turn(1), turn(2), turn(3)]  # 11 tokens each
+
+    older, recent = split_history(turns, token_budget=25)
+
+    assert older == [turn(1)]
+    assert recent == [turn(2), turn(3)]
+
+
+def test_oversized_last_turn_is_cut(store):
+    """Test that the last turn is always kept, trimmed to the budget"""
+    older, recent = split_history([turn(1, size=400)], token_budget=20)
+
+    assert older == []
+    assert len(recent[0]["answer"]) == 19 * 4
+
+
+def test_overflowing_turns_are_folded_into_the_summary(store, monkeypatch):
+    """Test that turns beyond the budget go to the rolling summary"""
+    folded = []
+
+    async def fake_summarize(summary, turns):
+        folded.extend(turns)
+        return "User asked about PP 5."
+
+    monkeypatch.setattr(chat_memory, "summarize", fake_summarize)
+    monkeypatch.setattr(chat_memory, "CHAT_HISTORY_TOKEN_BUDGET", 25)
+    session_id = chat_memory.create_session()
+
+    for n in range(1, 4):
+        session = chat_memory.load_session(session_id)
+        older = asyncio.run(
+            chat_memory.save_turn(session_id, session, f"q{n}", "x" * 40)
+        )
+        if older:
+            asyncio.run(chat_memory.fold_history(session_id, older))
+
+    session = chat_memory.load_session(session_id)
+    assert folded == [turn(1)]
+    assert session["summary"] == "User asked about PP 5."
+    assert [t["question"] for t in session["turns"]] == ["q2", "q3"]
+    messages = history_messages(session)
+    assert messages[0].content.endswith("User asked about PP 5.")
+    assert [m.content for m in messages[1:3]] == ["q2", "x" * 40]
+
+
+def test_summary_is_written_after_the_response(store, monkeypatch):
+    """Test that a turn is saved without waiting for the summary LLM call"""
+    monkeypatch.setattr(chat_memory, "CHAT_HISTORY_TOKEN_BUDGET", 25)
+    session_id = chat_memory.create_session()
+    key = f"chat_session:{session_id}"
+    store[key]["turns"] = [turn(1), turn(2)]
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow_summarize(summary, turns):
+            await release.wait()
+            return "User asked about PP 5."
+
+        monkeypatch.setattr(chat_memory, "summarize", slow_summarize)
+        session = chat_memory.load_session(session_id)
+        await chat_service.remember_turn(session_id, session, "q3", "x" * 40)
+        saved = [t["question"] for t in store[key]["turns"]]
+
+        # A follow-up is saved while the summary is still being written
+        session = chat_memory.load_session(session_id)
+        await chat_memory.save_turn(session_id, session, "q4", "x" * 40)
+        release.set()
+        await asyncio.gather(*chat_service._background_tasks)
+        return saved
+
+    assert asyncio.run(scenario()) == ["q1", "q2", "q3"]
+    assert store[key]["summary"] == "User asked about PP 5."
+    assert [t["question"] for t in store[key]["turns"]] == ["q2", "q3", "q4"]
+
+
+def test_session_chunk_pool_is_per_index_version(store):
+    """Test that remembered passages are dropped when the index changes"""
+    first = {"vector": [1.0, 0.0], "signature": ""}
+    second = {"vector": [0.0, 1.0], "signature": "pp"}
+    chat_memory.add_session_chunks("s1", "v1", [3, 4], first)
+    chat_memory.add_session_chunks("s1", "v1", [5, 3], second)
+
+    pool = chat_memory.get_session_pool("s1", "v1")
+    assert pool["row_ids"] == [5, 3, 4]
+    assert pool["query"] == second
+    assert chat_memory.get_session_pool("s1", "v2") is None
+
+
+def test_session_history_reaches_the_agent(store, monkeypatch):
+    """Test that follow-ups skip the router and cache and get the history"""
+    calls = []
+
+    class FakeExecutor:
+        async def ainvoke(self, inputs, config):
+            calls.append(inputs)
+            return {"output": f"answer {len(calls)}"}
+
+    class NoAnswerCache:
+        async def get(self, question):
+            return None
+
+        async def set(self, question, answer):
+            raise AssertionError("answers with history must not be cached")
+
+    monkeypatch.setattr(chat_service, "agent_executor", FakeExecutor())
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: NoAnswerCache())
+    monkeypatch.setattr(chat_service, "CHAT_ROUTER_ENABLED", False)
+    session_id = chat_memory.create_session()
+    store[f"chat_session:{session_id}"]["turns"].append(turn(1))
+
+    answer = asyncio.run(
+        chat_service.get_intelligent_response("Pasal 6?", session_id=session_id)
+    )
+
+    assert answer == "answer 1"
+    assert [m.content for m in calls[0]["chat_history"]] == ["q1", "x" * 40]
+    turns = store[f"chat_session:{session_id}"]["turns"]
+    assert turns[-1] == {"question": "Pasal 6?", "answer": "answer 1"}
@@ -0,0 +1,269 @@
+from app.ai import chat_service
+from app.api.endpoints import chat as chat_endpoint
+from fastapi import HTTPException
+from langchain.agents import AgentExecutor, create_openai_tools_agent
+from langchain.tools import Tool
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+import asyncio
+import json
+import pytest
+import uuid
+
+
+class NoAnswerCache:
+    def __init__(self):
+        self.stored = {}
+
+    async def get(self, question):
+        return None
+
+    async def set(self, question, answer):
+        self.stored[question] = answer
+
+
+class FakeExecutor:
+    """Streams tokens from two LLM calls, like a function-calling agent"""
+
+    def __init__(self, fail=False, hang=False):
+        self.fail = fail
+        self.hang = hang
+        self.cancelled = False
+
+    async def ainvoke(self, inputs, config):
+        [handler, *_] = config["callbacks"]
+        try:
+            run_id = await start_agent_llm(handler)  # the function-call step
+            await handler.on_llm_new_token("", run_id=run_id)
+            await handler.on_llm_end(None, run_id=run_id)
+            if self.hang:
+                await asyncio.sleep(60)
+            if self.fail:
+                raise RuntimeError("tool exploded")
+            run_id = await start_agent_llm(handler)
+            for token in ["Ada", " 12", " peraturan."]:
+                await handler.on_llm_new_token(token, run_id=run_id)
+                await asyncio.sleep(0)
+            return {"output": "Ada 12 peraturan."}
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def start_agent_llm(handler):
+    run_id = uuid.uuid4()
+    await handler.on_chat_model_start(
+        {}, [[]], run_id=run_id, tags=[chat_service.STREAMED_LLM_TAG]
+    )
+    return run_id
+
+
+@pytest.fixture
+def answer_cache(monkeypatch):
+    cache = NoAnswerCache()
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: cache)
+    return cache
+
+
+async def collect(generator):
+    return [item async for item in generator]
+
+
+def test_stream_yields_tokens_after_the_first_llm_call(answer_cache, monkeypatch):
+    """Test that tokens after the function-call step are not lost"""
+    monkeypatch.setattr(chat_service, "streaming_agent_executor", FakeExecutor())
+
+    tokens = asyncio.run(collect(chat_service.get_intelligent_response_stream("q")))
+
+    assert "".join(tokens) == "Ada 12 peraturan."
+    assert answer_cache.stored == {"q": "Ada 12 peraturan."}
+
+
+def test_stream_leaves_out_tokens_of_llm_calls_inside_tools(answer_cache, monkeypatch):
+    """Test that only the agent's own LLM reaches the stream, not a tool's"""
+    sub_agent_llm = GenericFakeChatModel(
+        messages=iter([AIMessage(content="Hasil query: [(4,)]")])
+    )
+
+    async def query_database(question):
+        return "".join(
+            [chunk.content async for chunk in sub_agent_llm.astream(question)]
+        )
+
+    tool = Tool(
+        name="query_database",
+        func=None,
+        coroutine=query_database,
+        description="Counts regulations.",
+    )
+    tool_call = {
+        "id": "call_1",
+        "type": "function",
+        "function": {"name": "query_database", "arguments": '{"__arg1": "q"}'},
+    }
+    agent_llm = GenericFakeChatModel(
+        messages=iter(
+            [
+                AIMessage(content="", additional_kwargs={"tool_calls": [tool_call]}),
+                AIMessage(content="Ada 4 peraturan."),
+            ]
+        )
+    ).with_config(tags=[chat_service.STREAMED_LLM_TAG])
+    executor = AgentExecutor(
+        agent=create_openai_tools_agent(agent_llm, [tool], chat_service.prompt),
+        tools=[tool],
+    )
+    monkeypatch.setattr(chat_service, "streaming_agent_executor", executor)
+
+    tokens = asyncio.run(collect(chat_service.get_intelligent_response_stream("q")))
+
+    assert "".join(tokens) == "Ada 4 peraturan."
+
+
+def test_stream_raises_agent_errors(answer_cache, monkeypatch):
+    """Test that a failing agent run surfaces as an exception"""
+    monkeypatch.setattr(
+        chat_service, "streaming_agent_executor", FakeExecutor(fail=True)
+    )
+
+    with pytest.raises(RuntimeError, match="tool exploded"):
+        asyncio.run(collect(chat_service.get_intelligent_response_stream("q")))
+
+
+def test_closing_the_stream_cancels_the_agent(answer_cache, monkeypatch):
+    """Test that the agent run is cancelled when the consumer goes away"""
+    executor = FakeExecutor(hang=True)
+    monkeypatch.setattr(chat_service, "streaming_agent_executor", executor)
+
+    async def scenario():
+        stream = chat_service.get_intelligent_response_stream("q")
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await reader
+
+    asyncio.run(scenario())
+    assert executor.cancelled
+
+
+def parse_events(frames):
+    events = []
+    for frame in frames:
+        if frame.startswith(":"):
+            events.append(("ping", None))
+            continue
+        lines = frame.strip().split("\n")
+        event = lines[0][len("event: ") :] if len(lines) == 2 else "message"
+        events.append((event, json.loads(lines[-1][len("data: ") :])))
+    return events
+
+
+def fake_stream(tokens, delay=0.0, error=None):
+    async def stream(question, callbacks=None, session_id=None):
+        for token in tokens:
+            await asyncio.sleep(delay)
+            yield token
+        if error:
+            raise error
+
+    return stream
+
+
+def test_sse_coalesces_tokens_and_ends_with_done(monkeypatch):
+    """Test that tokens are merged into few frames followed by a done event"""
+    tokens = [f"t{i} " for i in range(40)]
+    monkeypatch.setattr(
+        chat_service, "get_intelligent_response_stream", fake_stream(tokens)
+    )
+
+    events = parse_events(
+        asyncio.run(collect(chat_endpoint.format_stream_for_sse("q")))
+    )
+
+    messages = [data["token"] for event, data in events if event == "message"]
+    assert "".join(messages) == "".join(tokens)
+    assert len(messages) < len(tokens)
+    assert events[-1][0] == "done"
+    assert "timing" in events[-1][1]
+
+
+def test_sse_sends_heartbeats_and_error_event(monkeypatch):
+    """Test idle heartbeats and a structured error event on failure"""
+    monkeypatch.setattr(chat_endpoint, "SSE_HEARTBEAT_INTERVAL", 0.01)
+    monkeypatch.setattr(
+        chat_service,
+        "get_intelligent_response_stream",
+        fake_stream(["a"], delay=0.05, error=RuntimeError("boom")),
+    )
+
+    events = parse_events(
+        asyncio.run(collect(chat_endpoint.format_stream_for_sse("q")))
+    )
+
+    assert ("ping", None) in events
+    assert events[-1] == (
+        "error",
+        {"error": "RuntimeError", "message": "The assistant could not answer."},
+    )
+
+
+def test_sse_stops_when_the_client_disconnects(monkeypatch):
+    """Test that a disconnected client stops the stream and closes the agent"""
+    closed = []
+
+    async def endless(question, callbacks=None, session_id=None):
+        try:
+            while True:
+                await asyncio.sleep(1)
+                yield "x"
+        finally:
+            closed.append(True)
+
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    monkeypatch.setattr(chat_endpoint, "SSE_HEARTBEAT_INTERVAL", 0.01)
+    monkeypatch.setattr(chat_service, "get_intelligent_response_stream", endless)
+
+    frames = asyncio.run(
+        collect(chat_endpoint.format_stream_for_sse("q", DisconnectedRequest()))
+    )
+
+    assert frames == []
+    assert closed == [True]
+
+
+def test_agent_run_is_bounded_by_the_time_budget(answer_cache, monkeypatch):
+    """Test that a run exceeding CHAT_TIMEOUT fails with 504 and is cancelled"""
+    executor = FakeExecutor(hang=True)
+    monkeypatch.setattr(chat_service, "streaming_agent_executor", executor)
+    monkeypatch.setattr(chat_service, "CHAT_TIMEOUT", 0.05)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(collect(chat_service.get_intelligent_response_stream("q")))
+    assert error.value.status_code == 504
+    assert executor.cancelled
+
+
+def test_degraded_chat_answers_from_search(monkeypatch):
+    """Test that an open breaker returns search passages without the agent"""
+    searches = []
+
+    def fake_search(query, k, mode):
+        searches.append(mode)
+        return [{"content": "Pasal 1 ...", "metadata": {"nama_peraturan": "PP 5"}}]
+
+    monkeypatch.setattr(chat_service, "is_degraded", lambda: True)
+    monkeypatch.setattr(
+        chat_service.vector_search_service, "semantic_search", fake_search
+    )
+    monkeypatch.setattr(chat_service, "agent_executor", None)
+
+    answer = asyncio.run(chat_service.get_intelligent_response("q"))
+    tokens = asyncio.run(collect(chat_service.get_intelligent_response_stream("q")))
+
+    assert "[1] PP 5:\nPasal 1 ..." in answer
+    assert "".join(tokens) == answer
+    assert searches == ["lexical", "lexical"]
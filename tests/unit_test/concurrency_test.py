@@ -0,0 +1,68 @@
+from app.core.concurrency import ConcurrencyLimiter
+from fastapi import HTTPException
+import asyncio
+import pytest
+
+
+def test_limiter_runs_up_to_max_concurrency():
+    """Requests within the concurrency limit run without waiting."""
+
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=2, max_queue=0, queue_timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.active == 2
+        limiter.release()
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_rejects_with_429_when_queue_is_full():
+    """A request arriving to a full queue fails fast with Retry-After."""
+
+    async def scenario():
+        limiter = ConcurrencyLimiter(
+            max_concurrency=1, max_queue=0, queue_timeout=1, retry_after=7
+        )
+        async with limiter.slot():
+            with pytest.raises(HTTPException) as error:
+                await limiter.acquire()
+        return error.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "7"
+
+
+def test_limiter_returns_503_after_queue_timeout():
+    """A queued request that never gets a slot times out with 503."""
+
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.01)
+        async with limiter.slot():
+            with pytest.raises(HTTPException) as error:
+                await limiter.acquire()
+        assert limiter.waiting == 0
+        return error.value
+
+    assert asyncio.run(scenario()).status_code == 503
+
+
+def test_queued_request_runs_when_a_slot_frees_up():
+    """Waiting requests are admitted in turn as running ones finish."""
+
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, max_queue=1, queue_timeout=1)
+        order = []
+
+        async def job(name):
+            async with limiter.slot():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(job("first"), job("second"))
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "second"]
@@ -0,0 +1,62 @@
+from app.ai import context_assembly
+from app.ai.context_assembly import (
+    assemble_context,
+    count_tokens,
+    fit_token_budget,
+    merge_overlapping,
+    mmr,
+)
+import numpy as np
+
+TEXT = " ".join(f"kata{i}" for i in range(300))
+
+
+def passage(content, regulation_id="reg-a"):
+    return {"content": content, "metadata": {"regulation_id": regulation_id}}
+
+
+def test_overlapping_chunks_of_a_regulation_are_merged():
+    """Neighbouring chunks are joined so their shared text appears once."""
+    first, second = TEXT[:1000], TEXT[800:1800]
+
+    merged = merge_overlapping([passage(second), passage(first)])
+
+    assert len(merged) == 1
+    assert merged[0]["content"] == TEXT[:1800]
+
+
+def test_chunks_of_different_regulations_are_not_merged():
+    """Overlap only counts within the same regulation."""
+    first, second = TEXT[:1000], TEXT[800:1800]
+
+    merged = merge_overlapping([passage(first), passage(second, "reg-b")])
+
+    assert [p["content"] for p in merged] == [first, second]
+
+
+def test_mmr_skips_near_duplicates():
+    """A candidate close to an already picked one loses to a diverse one."""
+    query = np.array([1.0, 0.0])
+    vectors = np.array([[1.0, 0.1], [1.0, 0.11], [0.6, 0.8]])
+
+    assert mmr(query, vectors, k=2, lambda_mult=0.3) == [0, 2]
+
+
+def test_token_budget_cuts_the_last_passage(monkeypatch):
+    """Passages are kept until the budget is spent; the last one is cut."""
+    monkeypatch.setattr(context_assembly, "_get_encoding", lambda: None)
+    passages = [passage("a" * 400), passage("b" * 400), passage("c" * 400)]
+
+    kept = fit_token_budget(passages, token_budget=160)
+
+    assert [count_tokens(p["content"]) for p in kept] == [100, 60]
+
+
+def test_assemble_context_drops_duplicates_and_keeps_k():
+    """Exact duplicates are removed before picking k passages."""
+    candidates = [passage("alpha"), passage("alpha"), passage("beta", "reg-b")]
+    candidates.append(passage("gamma", "reg-c"))
+
+    context = assemble_context(candidates, k=2, token_budget=1000)
+
+    assert [p["content"] for p in context] == ["alpha", "beta"]
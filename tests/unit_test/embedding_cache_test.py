@@ -0,0 +1,108 @@
+from app.ai import embedding_cache
+from app.ai.embedding_cache import CachedQueryEmbeddings, normalize_query
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import pytest
+
+
+class CountingEmbeddings(Embeddings):
+    """Fake embeddings model that counts how often it is called"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 0.5, -1.25]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store = {}
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(embedding_cache, "get_binary_redis_client", lambda: fake)
+    return fake
+
+
+def test_normalize_query():
+    """Test that case and whitespace differences are normalized away"""
+    assert normalize_query("  Apa itu  PP 34\t2005 ") == "apa itu pp 34 2005"
+
+
+def test_repeated_query_skips_embedding_call(fake_redis):
+    """Test that a repeated query is served from the in-process cache"""
+    model = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(model, model_name="test-model")
+
+    first = cached.embed_query("apa itu PP 34 2005")
+    second = cached.embed_query("Apa itu PP 34  2005")
+    assert first == second
+    assert model.calls == 1
+
+
+def test_vectors_stored_in_redis_as_float32(fake_redis):
+    """Test that vectors are shared through Redis as compact float32 bytes"""
+    model = CountingEmbeddings()
+    cached = CachedQueryEmbeddings(model, model_name="test-model")
+    vector = cached.embed_query("pajak daerah")
+
+    payload = fake_redis.store[cached.cache_key("pajak daerah")]
+    assert len(payload) == 3 * 4
+    assert np.frombuffer(payload, dtype=np.float32).tolist() == vector
+
+    # A fresh process (empty LRU) should still skip the embedding call
+    other = CachedQueryEmbeddings(model, model_name="test-model")
+    assert other.embed_query("pajak daerah") == vector
+    assert model.calls == 1
+
+
+def test_cache_key_includes_model_name(fake_redis):
+    """Test that different embedding models never share cache entries"""
+    model = CountingEmbeddings()
+    a = CachedQueryEmbeddings(model, model_name="model-a")
+    b = CachedQueryEmbeddings(model, model_name="model-b")
+    assert a.cache_key("pajak") != b.cache_key("pajak")
+
+
+def test_lru_evicts_oldest_entry(fake_redis):
+    """Test that the in-process cache is bounded"""
+    cached = CachedQueryEmbeddings(CountingEmbeddings(), "test-model", max_size=2)
+    cached.embed_query("satu")
+    cached.embed_query("dua")
+    cached.embed_query("tiga")
+    assert len(cached._lru) == 2
+    assert cached.cache_key("satu") not in cached._lru
+
+
+def test_embed_queries_batches_and_deduplicates_misses(fake_redis):
+    """Test that batch embedding sends only unique cache misses in one call"""
+    model = CountingEmbeddings()
+    batch_sizes = []
+    original = model.embed_documents
+
+    def recording_embed_documents(texts):
+        batch_sizes.append(len(texts))
+        return original(texts)
+
+    model.embed_documents = recording_embed_documents
+    cached = CachedQueryEmbeddings(model, model_name="test-model")
+    cached.embed_query("pajak")
+
+    matrix = cached.embed_queries(["pajak", "cukai", "Cukai", "bea masuk"])
+    assert matrix.shape == (4, 3)
+    assert matrix.dtype == np.float32
+    assert batch_sizes == [2]
+    assert np.array_equal(matrix[1], matrix[2])
@@ -0,0 +1,86 @@
+from app.ai import embedding_store
+from app.ai.embedding_store import BatchEmbedder, EmbeddingStore
+from langchain_core.embeddings import Embeddings
+import pytest
+
+
+class RecordingEmbeddings(Embeddings):
+    """Fake embeddings model that records batches and can fail on demand"""
+
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    def embed_documents(self, texts):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("temporary outage")
+        self.batches.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [0.0, 0.0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "cache.sqlite"))
+    yield store
+    store.close()
+
+
+def test_embeds_in_batches_and_deduplicates(store):
+    """Test that unique chunks are embedded in fixed-size batches"""
+    model = RecordingEmbeddings()
+    embedder = BatchEmbedder(model, "test-model", store, batch_size=2)
+
+    vectors = embedder.embed_documents(["a", "bb", "a", "ccc", "dddd"])
+    assert vectors[0] == vectors[2] == [1.0, 1.0]
+    assert sorted(len(batch) for batch in model.batches) == [2, 2]
+    assert embedder.cache_misses == 4
+
+
+def test_cache_persists_across_runs(tmp_path):
+    """Test that a second run re-uses every previously embedded chunk"""
+    path = str(tmp_path / "cache.sqlite")
+    first = BatchEmbedder(RecordingEmbeddings(), "test-model", EmbeddingStore(path))
+    first.embed_documents(["pasal 1", "pasal 2"])
+
+    model = RecordingEmbeddings()
+    second = BatchEmbedder(model, "test-model", EmbeddingStore(path))
+    assert second.embed_documents(["pasal 2", "pasal 1"]) == [
+        [7.0, 1.0],
+        [7.0, 1.0],
+    ]
+    assert model.batches == []
+    assert second.cache_hits == 2
+
+
+def test_cache_is_keyed_by_model(store):
+    """Test that switching the embedding model does not reuse old vectors"""
+    BatchEmbedder(RecordingEmbeddings(), "model-a", store).embed_documents(["x"])
+    model = RecordingEmbeddings()
+    BatchEmbedder(model, "model-b", store).embed_documents(["x"])
+    assert model.batches == [["x"]]
+
+
+def test_failed_batches_are_retried(store, monkeypatch):
+    """Test that transient errors are retried with backoff"""
+    sleeps = []
+    monkeypatch.setattr(embedding_store.time, "sleep", sleeps.append)
+    model = RecordingEmbeddings(failures=2)
+    embedder = BatchEmbedder(model, "test-model", store, max_retries=3)
+
+    assert embedder.embed_documents(["a"]) == [[1.0, 1.0]]
+    assert len(sleeps) == 2
+    assert sleeps[1] > sleeps[0] / 2
+
+
+def test_gives_up_after_max_retries(store, monkeypatch):
+    """Test that a persistent failure is raised"""
+    monkeypatch.setattr(embedding_store.time, "sleep", lambda _: None)
+    embedder = BatchEmbedder(
+        RecordingEmbeddings(failures=5), "test-model", store, max_retries=1
+    )
+    with pytest.raises(ConnectionError):
+        embedder.embed_documents(["a"])
@@ -0,0 +1,128 @@
+from app.ai.index_factory import (
+    INDEX_TYPES,
+    build_vector_store,
+    configure_search,
+    create_index,
+    default_nlist,
+    remove_documents,
+    search_parameters,
+)
+from app.ai.vector_index import search_index
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+import faiss
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(2000, 32)).astype(np.float32)
+
+
+def test_default_nlist_respects_training_size():
+    """Test that small corpora never get more lists than they can train"""
+    assert default_nlist(10) == 1
+    assert default_nlist(10000) == 256
+    assert default_nlist(1_000_000) == 4000
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_every_index_type_finds_exact_match(vectors, index_type):
+    """Test each index type can be built, trained and searched"""
+    index = configure_search(create_index(vectors, index_type, nlist=16, pq_m=8))
+    index.add(vectors)
+    assert index.ntotal == len(vectors)
+
+    _, ids = index.search(vectors[:5], 1)
+    if index_type != "ivf_pq":  # PQ codes are lossy
+        assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_unknown_index_type(vectors):
+    """Test that an unsupported index type is rejected"""
+    with pytest.raises(ValueError):
+        create_index(vectors, "annoy")
+
+
+@pytest.mark.parametrize(
+    "index_type", ["flat", "sq_fp16", "sq_int8", "ivf_flat", "ivf_sq8", "hnsw"]
+)
+def test_filtered_search_on_every_index_type(vectors, index_type):
+    """Test that filtered search only returns allowed rows"""
+    index = configure_search(create_index(vectors, index_type, nlist=16))
+    index.add(vectors)
+    allowed = np.array([7, 300, 1999], dtype=np.int64)
+
+    _, ids = search_index(index, vectors[:3], 5, allowed_ids=allowed)
+    assert set(ids[0][:3]) == {7, 300, 1999}
+    assert ids[0][3:].tolist() == [-1, -1]
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_remove_documents_keeps_rows_aligned(vectors, index_type):
+    """Test removing chunks keeps FAISS rows and docstore ids in sync"""
+    documents = [Document(page_content=f"chunk {i}") for i in range(len(vectors))]
+    ids = [f"reg:{i}" for i in range(len(vectors))]
+    store = build_vector_store(
+        documents, vectors, FakeEmbeddings(size=32), index_type, ids=ids
+    )
+
+    store = remove_documents(store, ["reg:0", "reg:1", "missing"])
+    assert store.index.ntotal == len(vectors) - 2
+    assert "reg:0" not in store.index_to_docstore_id.values()
+
+    # Searching for a kept vector must still return its own chunk
+    _, rows = store.index.search(vectors[5:6], 1)
+    doc_id = store.index_to_docstore_id[int(rows[0][0])]
+    assert store.docstore.search(doc_id).page_content == "chunk 5"
+
+
+@pytest.mark.parametrize("index_type", ["sq_fp16", "sq_int8", "ivf_sq8"])
+def test_scalar_quantization_shrinks_the_index(vectors, index_type):
+    """Test that scalar-quantized indexes are smaller than flat ones"""
+    flat = create_index(vectors, "flat")
+    flat.add(vectors)
+    quantized = configure_search(create_index(vectors, index_type, nlist=16))
+    quantized.add(vectors)
+
+    flat_size = faiss.serialize_index(flat).nbytes
+    assert faiss.serialize_index(quantized).nbytes < 0.6 * flat_size
+    _, ids = quantized.search(vectors[:5], 1)
+    assert ids[:, 0].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_refine_recovers_recall_lost_to_product_quantization(vectors):
+    """Test that the exact re-rank brings back neighbours PQ codes miss"""
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    queries = vectors[:50] + 0.01
+    _, expected = exact.search(queries, 5)
+
+    recalls = []
+    for refine_k_factor in (0, 8):
+        index = create_index(
+            vectors, "ivf_pq", nlist=16, pq_m=8, refine_k_factor=refine_k_factor
+        )
+        index = configure_search(index, nprobe=16, refine_k_factor=refine_k_factor)
+        index.add(vectors)
+        _, found = index.search(queries, 5)
+        recalls.append((found == expected).mean())
+
+    assert isinstance(index, faiss.IndexRefineFlat)
+    assert recalls[1] > recalls[0] + 0.3
+
+
+def test_filtered_search_through_refine(vectors):
+    """Test that ID selectors reach the quantized index inside a refine"""
+    index = configure_search(
+        create_index(vectors, "sq_int8", refine_k_factor=4), refine_k_factor=2
+    )
+    index.add(vectors)
+    assert index.k_factor == 2
+    allowed = np.arange(0, len(vectors), 2, dtype=np.int64)
+
+    selector = faiss.IDSelectorBatch(allowed)
+    _, ids = index.search(vectors[:3], 5, params=search_parameters(index, selector))
+    assert (ids % 2 == 0).all()
@@ -0,0 +1,64 @@
+from app.ai.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+import numpy as np
+import pytest
+
+CHUNKS = [
+    "Pasal 5 ayat (2) mengatur kewajiban wajib pajak.",
+    "Pasal 2 ayat (5) mengatur tarif pajak daerah.",
+    "Peraturan Pemerintah Nomor 34 Tahun 2005 tentang cukai.",
+    "Ketentuan umum mengenai retribusi daerah dan pajak daerah.",
+]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.from_texts(CHUNKS)
+
+
+def test_tokenize_keeps_citation_numbers():
+    """Test that citations are split into exact lowercase tokens"""
+    assert tokenize("Pasal 5 ayat (2), PP 34/2005") == [
+        "pasal",
+        "5",
+        "ayat",
+        "2",
+        "pp",
+        "34",
+        "2005",
+    ]
+
+
+def test_exact_regulation_number_ranks_first(index):
+    """Test that a rare regulation number finds its chunk"""
+    scores, ids = index.search("PP 34 2005", k=2)
+    assert ids[0] == 2
+    assert scores[0] > 0
+
+
+def test_only_matching_chunks_are_returned(index):
+    """Test that chunks sharing no term with the query are left out"""
+    _, ids = index.search("cukai", k=10)
+    assert ids.tolist() == [2]
+
+
+def test_search_respects_allowed_ids(index):
+    """Test that the metadata pre-filter also applies to lexical search"""
+    _, ids = index.search("pajak daerah", k=10, allowed_ids=np.array([0, 2]))
+    assert ids.tolist() == [0]
+
+
+def test_save_and_load_round_trip(index, tmp_path):
+    """Test that the compact on-disk format gives identical results"""
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    expected_scores, expected_ids = index.search("pajak daerah", k=3)
+    scores, ids = loaded.search("pajak daerah", k=3)
+    assert ids.tolist() == expected_ids.tolist()
+    assert np.allclose(scores, expected_scores)
+
+
+def test_reciprocal_rank_fusion():
+    """Test that items ranked well by both lists come first"""
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+    assert [row_id for row_id, _ in fused] == [1, 3, 2, 4]
+    assert fused[0][1] == pytest.approx(1 / 61 + 1 / 62)
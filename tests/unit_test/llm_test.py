@@ -0,0 +1,49 @@
+from app.ai.llm import (
+    CircuitBreakerTransport,
+    CircuitOpenError,
+    get_async_http_client,
+    get_chat_model,
+    get_embeddings_model,
+    get_http_client,
+)
+from app.core.circuit_breaker import CircuitBreaker
+import httpx
+import pytest
+
+
+def test_http_clients_are_singletons():
+    """The pooled HTTP clients are created once and reused."""
+    assert get_http_client() is get_http_client()
+    assert get_async_http_client() is get_async_http_client()
+
+
+def test_models_share_the_connection_pool():
+    """Chat and embedding models are built on the shared HTTP clients."""
+    chat = get_chat_model("gpt-4-turbo-preview", temperature=0)
+    other = get_chat_model("gpt-3.5-turbo")
+    embeddings = get_embeddings_model("text-embedding-ada-002")
+
+    assert chat.http_client is other.http_client is get_http_client()
+    assert chat.http_async_client is get_async_http_client()
+    assert embeddings.http_client is get_http_client()
+    assert chat.temperature == 0
+
+
+def test_transport_reports_to_the_breaker_and_refuses_when_open():
+    """Server errors open the breaker; then requests fail without being sent."""
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(503)
+
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    client = httpx.Client(
+        transport=CircuitBreakerTransport(httpx.MockTransport(handler), breaker)
+    )
+
+    assert client.get("http://openai.test/v1/models").status_code == 503
+    assert client.get("http://openai.test/v1/models").status_code == 503
+    with pytest.raises(CircuitOpenError):
+        client.get("http://openai.test/v1/models")
+    assert len(sent) == 2
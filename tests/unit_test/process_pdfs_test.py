@@ -0,0 +1,292 @@
+from app.ai.embedding_store import EmbeddingStore
+from app.ai.sharded_index import (
+    CHUNK_IDS_FILE,
+    INDEX_FILE,
+    load_chunk_ids,
+    load_shard_indexes,
+    load_shard_manifest,
+    merge_indexes,
+    shard_path,
+)
+from app.models.regulation import Regulation
+from app.models.regulation_chunk import RegulationChunk
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_core.documents import Document
+from scripts import process_pdfs
+from sqlalchemy.orm import sessionmaker
+import hashlib
+import numpy as np
+import os
+import pytest
+import uuid
+
+# name: (bentuk_singkat, tahun)
+REGULATIONS = {
+    "pp-2005": ("PP", "2005"),
+    "uu-2011": ("UU", "2011"),
+    "pp-2019": ("PP", "2019"),
+}
+REGULATION_IDS = {name: uuid.uuid5(uuid.NAMESPACE_URL, name) for name in REGULATIONS}
+
+
+class FakePdfs:
+    """Stands in for downloading and parsing: each PDF is just a version number"""
+
+    def __init__(self):
+        self.versions = {name: 1 for name in REGULATIONS}
+        self.parsed = []
+
+    def iter_downloads(self, regulations, concurrency):
+        for reg in regulations:
+            version = self.versions[reg.nama_peraturan]
+            yield reg, f"{reg.regulation_id}.pdf", f"sha-{version}"
+
+    def iter_parsed(self, jobs, workers):
+        for reg, _ in jobs:
+            self.parsed.append(reg.nama_peraturan)
+            version = self.versions[reg.nama_peraturan]
+            yield reg, [
+                Document(
+                    page_content=f"Pasal {page} {reg.nama_peraturan} versi {version}"
+                    + " isi" * 300,
+                    metadata={"page": page},
+                )
+                for page in range(2)
+            ]
+
+
+@pytest.fixture
+def pdfs(tmp_path, monkeypatch, db_session):
+    index_path = str(tmp_path / "faiss_index")
+    monkeypatch.setattr(process_pdfs, "FAISS_INDEX_PATH", index_path)
+    monkeypatch.setattr(
+        process_pdfs, "MANIFEST_PATH", str(tmp_path / "faiss_index" / "manifest.json")
+    )
+    monkeypatch.setattr(process_pdfs, "PDFS_DIR", str(tmp_path / "pdfs"))
+    monkeypatch.setattr(
+        process_pdfs, "SessionLocal", sessionmaker(bind=db_session.get_bind())
+    )
+    monkeypatch.setattr(
+        process_pdfs,
+        "get_embeddings_model",
+        lambda *args, **kwargs: DeterministicFakeEmbedding(size=16),
+    )
+    monkeypatch.setattr(
+        process_pdfs,
+        "EmbeddingStore",
+        lambda: EmbeddingStore(str(tmp_path / "embeddings.sqlite")),
+    )
+    fake = FakePdfs()
+    monkeypatch.setattr(process_pdfs, "iter_downloads", fake.iter_downloads)
+    monkeypatch.setattr(process_pdfs, "iter_parsed", fake.iter_parsed)
+
+    for name, (bentuk_singkat, tahun) in REGULATIONS.items():
+        db_session.add(
+            Regulation(
+                regulation_id=REGULATION_IDS[name],
+                nama_peraturan=name,
+                bentuk_singkat=bentuk_singkat,
+                tahun=tahun,
+                file_pdf=f"https://example.com/{name}.pdf",
+            )
+        )
+    db_session.commit()
+    return fake
+
+
+def chunk_texts(db_session):
+    """The texts in the chunk table, by chunk id"""
+    db_session.expire_all()
+    return {row.chunk_id: row.text for row in db_session.query(RegulationChunk)}
+
+
+def indexed_regulations():
+    """The regulations in the ingestion manifest, by name"""
+    names = {str(reg_id): name for name, reg_id in REGULATION_IDS.items()}
+    return {
+        names[reg_id]: entry
+        for reg_id, entry in process_pdfs.load_manifest()["regulations"].items()
+    }
+
+
+def shard_chunks():
+    """The chunk count of each shard, from the shard manifest"""
+    manifest = load_shard_manifest(process_pdfs.FAISS_INDEX_PATH)
+    return {key: shard["chunks"] for key, shard in manifest["shards"].items()}
+
+
+def test_unchanged_pdfs_are_not_parsed_again(pdfs, db_session, capsys):
+    """Test that a re-run without changed PDFs leaves the index as it is"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+    manifest = process_pdfs.load_manifest()
+    chunks = chunk_texts(db_session)
+    pdfs.parsed.clear()
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+
+    assert pdfs.parsed == []
+    assert "0 new, 0 changed, 0 removed." in capsys.readouterr().out
+    assert process_pdfs.load_manifest() == manifest
+    assert chunk_texts(db_session) == chunks
+
+
+def test_changed_pdf_replaces_its_chunks(pdfs, db_session, capsys):
+    """Test that only a changed PDF is parsed again and its old chunks go"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+    pdfs.parsed.clear()
+    pdfs.versions["uu-2011"] = 2
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+
+    assert pdfs.parsed == ["uu-2011"]
+    assert "0 new, 1 changed, 0 removed." in capsys.readouterr().out
+    entries = indexed_regulations()
+    assert entries["uu-2011"]["pdf_sha256"] == "sha-2"
+    assert entries["pp-2005"]["pdf_sha256"] == "sha-1"
+    texts = chunk_texts(db_session)
+    assert sorted(texts) == sorted(
+        chunk_id for entry in entries.values() for chunk_id in entry["chunk_ids"]
+    )
+    uu_texts = [
+        text
+        for chunk_id, text in texts.items()
+        if chunk_id.startswith(str(REGULATION_IDS["uu-2011"]))
+    ]
+    assert uu_texts and all("versi 1" not in text for text in uu_texts)
+    assert any("uu-2011 versi 2" in text for text in uu_texts)
+
+
+def test_removed_pdf_drops_its_chunks(pdfs, db_session, capsys):
+    """Test that a regulation without a PDF leaves the manifest and the index"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+    removed_ids = indexed_regulations()["pp-2005"]["chunk_ids"]
+    db_session.get(Regulation, REGULATION_IDS["pp-2005"]).file_pdf = None
+    db_session.commit()
+    pdfs.parsed.clear()
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+
+    assert pdfs.parsed == []
+    assert "0 new, 0 changed, 1 removed." in capsys.readouterr().out
+    assert sorted(indexed_regulations()) == ["pp-2019", "uu-2011"]
+    texts = chunk_texts(db_session)
+    assert texts and not set(removed_ids) & set(texts)
+    assert sorted(process_pdfs.load_chunk_ids(process_pdfs.FAISS_INDEX_PATH)) == (
+        sorted(texts)
+    )
+
+
+def test_chunks_are_sharded_by_bentuk_singkat(pdfs):
+    """Test that each regulation's chunks land in its bentuk_singkat's shard"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+
+    entries = indexed_regulations()
+    assert {name: entry["shard"] for name, entry in entries.items()} == {
+        "pp-2005": "pp",
+        "uu-2011": "uu",
+        "pp-2019": "pp",
+    }
+    assert shard_chunks() == {
+        "pp": len(entries["pp-2005"]["chunk_ids"] + entries["pp-2019"]["chunk_ids"]),
+        "uu": len(entries["uu-2011"]["chunk_ids"]),
+    }
+
+
+def test_chunks_are_sharded_by_year_range(pdfs, monkeypatch):
+    """Test that each regulation's chunks land in its year range's shard"""
+    monkeypatch.setattr(process_pdfs, "FAISS_SHARD_YEAR_RANGE", 10)
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="year")
+
+    entries = indexed_regulations()
+    assert {name: entry["shard"] for name, entry in entries.items()} == {
+        "pp-2005": "2000-2009",
+        "uu-2011": "2010-2019",
+        "pp-2019": "2010-2019",
+    }
+    assert shard_chunks() == {
+        "2000-2009": len(entries["pp-2005"]["chunk_ids"]),
+        "2010-2019": len(
+            entries["uu-2011"]["chunk_ids"] + entries["pp-2019"]["chunk_ids"]
+        ),
+    }
+
+
+def test_only_the_changed_shard_is_saved_again(pdfs):
+    """Test that a changed PDF rewrites its own shard and no other"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+    shard_files = {
+        key: os.path.join(shard_path(process_pdfs.FAISS_INDEX_PATH, key), INDEX_FILE)
+        for key in ("pp", "uu")
+    }
+    # Backdate the files, so a rewrite shows in their modification time
+    for path in shard_files.values():
+        os.utime(path, ns=(0, 0))
+    pdfs.versions["uu-2011"] = 2
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+
+    assert os.stat(shard_files["pp"]).st_mtime_ns == 0
+    assert os.stat(shard_files["uu"]).st_mtime_ns > 0
+
+
+def test_changing_the_sharding_rebuilds_the_index(pdfs, capsys):
+    """Test that switching from one index to shards re-ingests every PDF"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+    pdfs.parsed.clear()
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+
+    assert sorted(pdfs.parsed) == sorted(REGULATIONS)
+    assert "Building the FAISS index from scratch..." in capsys.readouterr().out
+    assert sorted(shard_chunks()) == ["pp", "uu"]
+    assert not os.path.exists(os.path.join(process_pdfs.FAISS_INDEX_PATH, INDEX_FILE))
+
+
+def test_index_rows_match_the_chunk_table_after_a_re_ingest(pdfs, db_session):
+    """Test that each saved row's chunk id names the chunk table row it embeds"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+    pdfs.versions["uu-2011"] = 2
+    db_session.get(Regulation, REGULATION_IDS["pp-2005"]).file_pdf = None
+    db_session.commit()
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="bentuk_singkat")
+
+    db_session.expire_all()
+    rows = {row.chunk_id: row for row in db_session.query(RegulationChunk)}
+    assert {row.regulation_id for row in rows.values()} == {
+        REGULATION_IDS["uu-2011"],
+        REGULATION_IDS["pp-2019"],
+    }
+    for row in rows.values():
+        assert row.chunk_id.startswith(f"{row.regulation_id}:")
+        assert row.page in (0, 1)
+        assert row.hash == hashlib.sha256(row.text.encode("utf-8")).hexdigest()
+
+    chunk_ids = load_chunk_ids(process_pdfs.FAISS_INDEX_PATH)
+    index = merge_indexes(load_shard_indexes(process_pdfs.FAISS_INDEX_PATH))
+    assert sorted(chunk_ids) == sorted(rows)
+    assert index.ntotal == len(chunk_ids)
+    vectors = DeterministicFakeEmbedding(size=16).embed_documents(
+        [rows[chunk_id].text for chunk_id in chunk_ids]
+    )
+    np.testing.assert_allclose(
+        index.reconstruct_batch(np.arange(index.ntotal, dtype=np.int64)),
+        np.asarray(vectors, dtype=np.float32),
+        rtol=1e-5,
+    )
+
+
+def test_index_without_its_chunk_ids_is_rebuilt(pdfs, capsys):
+    """Test that an index whose rows can't be hydrated is built again"""
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+    os.remove(os.path.join(process_pdfs.FAISS_INDEX_PATH, CHUNK_IDS_FILE))
+    pdfs.parsed.clear()
+
+    process_pdfs.process_all_pdfs(index_type="flat", shard_by="none")
+
+    assert sorted(pdfs.parsed) == sorted(REGULATIONS)
+    assert "Building the FAISS index from scratch..." in capsys.readouterr().out
+    assert len(load_chunk_ids(process_pdfs.FAISS_INDEX_PATH)) == sum(
+        len(entry["chunk_ids"]) for entry in indexed_regulations().values()
+    )
@@ -0,0 +1,115 @@
+from app.ai import chat_service, router
+from app.ai.router import DATABASE_TOOL, DOCUMENT_TOOL, route_question
+import asyncio
+import pytest
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Berapa jumlah peraturan tahun 2020?",
+        "Daftar peraturan presiden yang sudah dicabut",
+        "How many regulations are still in force?",
+        "Apa status PP Nomor 71 Tahun 2019?",
+    ],
+)
+def test_database_questions_are_routed_to_the_database(question):
+    """Test that counting, listing and status questions skip the agent"""
+    assert route_question(question) == DATABASE_TOOL
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Apa isi Pasal 5 UU Perlindungan Data Pribadi?",
+        "Apa yang dimaksud dengan penyelenggara sistem elektronik?",
+        "What does the law say about personal data protection?",
+    ],
+)
+def test_content_questions_are_routed_to_document_search(question):
+    """Test that questions about the text go to the document search"""
+    assert route_question(question) == DOCUMENT_TOOL
+
+
+def test_ambiguous_questions_fall_back_to_the_agent():
+    """Test that questions matching both or neither rule set are not routed"""
+    assert route_question("Berapa peraturan yang mengatur sanksi pidana?") is None
+    assert route_question("Halo, siapa kamu?") is None
+
+
+def test_embedding_classifier_decides_when_rules_cannot(monkeypatch):
+    """Test that a clear embedding match routes a question the rules miss"""
+    monkeypatch.setattr(
+        router,
+        "embedding_scores",
+        lambda question: {DATABASE_TOOL: 0.3, DOCUMENT_TOOL: 0.8},
+    )
+    assert route_question("Siapa yang berwenang menerbitkan izin?") == DOCUMENT_TOOL
+
+    monkeypatch.setattr(
+        router,
+        "embedding_scores",
+        lambda question: {DATABASE_TOOL: 0.7, DOCUMENT_TOOL: 0.72},
+    )
+    assert route_question("Siapa yang berwenang menerbitkan izin?") is None
+
+
+def test_routed_question_skips_the_agent(monkeypatch):
+    """Test that a routed question is answered by its tool alone"""
+
+    class FailingExecutor:
+        async def ainvoke(self, inputs, config):
+            raise AssertionError("the agent should not run")
+
+    class NoAnswerCache:
+        async def get(self, question):
+            return None
+
+        async def set(self, question, answer):
+            pass
+
+    async def fake_database(question):
+        return "Ada 12 peraturan."
+
+    monkeypatch.setattr(chat_service, "agent_executor", FailingExecutor())
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: NoAnswerCache())
+    monkeypatch.setattr(
+        chat_service.tools_by_name[DATABASE_TOOL], "coroutine", fake_database
+    )
+
+    answer = asyncio.run(
+        chat_service.get_intelligent_response("Berapa jumlah peraturan tahun 2020?")
+    )
+    assert answer == "Ada 12 peraturan."
+
+
+def test_failed_routed_tool_falls_back_to_the_agent(monkeypatch):
+    """Test that a routed tool's error is neither returned nor cached"""
+
+    class AgentExecutor:
+        async def ainvoke(self, inputs, config):
+            return {"output": "Ada 12 peraturan."}
+
+    class RecordingCache:
+        stored = {}
+
+        async def get(self, question):
+            return None
+
+        async def set(self, question, answer):
+            self.stored[question] = answer
+
+    async def failing_database(question):
+        return "An error occurred: database is locked"
+
+    cache = RecordingCache()
+    monkeypatch.setattr(chat_service, "agent_executor", AgentExecutor())
+    monkeypatch.setattr(chat_service, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(
+        chat_service.tools_by_name[DATABASE_TOOL], "coroutine", failing_database
+    )
+
+    question = "Berapa jumlah peraturan tahun 2020?"
+    answer = asyncio.run(chat_service.get_intelligent_response(question))
+    assert answer == "Ada 12 peraturan."
+    assert cache.stored == {question: "Ada 12 peraturan."}
@@ -0,0 +1,124 @@
+from app.ai.index_factory import build_vector_store
+from app.ai.sharded_index import (
+    ShardedIndex,
+    get_index_version,
+    load_shard_indexes,
+    load_shard_manifest,
+    merge_indexes,
+    merge_shards,
+    save_shards,
+    shard_key,
+    sharding_scheme,
+)
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+import faiss
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(300, 16)).astype(np.float32)
+
+
+def flat_index(vectors):
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    return index
+
+
+class RefusingIndex:
+    """Stands in for a shard that must not be searched"""
+
+    ntotal = 100
+    d = 16
+
+    def search(self, *args, **kwargs):
+        raise AssertionError("shard should have been skipped")
+
+
+def test_shard_keys():
+    """Test that chunks are keyed by bentuk_singkat or by year range"""
+    metadata = {"bentuk_singkat": "Perpres", "tahun": "2015"}
+
+    assert shard_key(metadata, sharding_scheme("none", 10)) == ""
+    assert shard_key(metadata, sharding_scheme("bentuk_singkat", 10)) == "perpres"
+    assert shard_key(metadata, sharding_scheme("year", 10)) == "2010-2019"
+    assert shard_key({"tahun": None}, sharding_scheme("year", 5)) == "unknown"
+    with pytest.raises(ValueError):
+        sharding_scheme("regulation_id", 10)
+
+
+def test_fan_out_merges_the_same_top_k_as_one_index(vectors):
+    """Test that the heap merge of shard results equals a single search"""
+    sharded = ShardedIndex(
+        [
+            flat_index(vectors[:100]),
+            flat_index(vectors[100:180]),
+            flat_index(vectors[180:]),
+        ]
+    )
+    queries = vectors[:5] + 0.01
+
+    distances, ids = sharded.search(queries, 10)
+    expected_distances, expected_ids = flat_index(vectors).search(queries, 10)
+
+    assert sharded.ntotal == len(vectors)
+    assert (ids == expected_ids).all()
+    np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+
+
+def test_filtered_search_only_visits_shards_with_allowed_rows(vectors):
+    """Test that a filter inside one shard never searches the others"""
+    sharded = ShardedIndex([RefusingIndex(), flat_index(vectors[100:])])
+    allowed = np.array([150, 160, 170], dtype=np.int64)
+
+    _, ids = sharded.search(vectors[150:151], 5, allowed_ids=allowed)
+
+    assert ids[0][0] == 150
+    assert set(ids[0][:3]) == {150, 160, 170}
+    assert ids[0][3:].tolist() == [-1, -1]
+
+
+def test_reconstruct_across_shards(vectors):
+    """Test that global row ids reconstruct the right vectors"""
+    sharded = ShardedIndex([flat_index(vectors[:100]), flat_index(vectors[100:])])
+
+    rows = np.array([250, 3, 100], dtype=np.int64)
+    np.testing.assert_array_equal(sharded.reconstruct_batch(rows), vectors[rows])
+
+
+def test_shards_are_saved_loaded_and_merged(tmp_path, vectors):
+    """Test the shard manifest round trip and the merged row ids"""
+    embeddings = FakeEmbeddings(size=16)
+    scheme = sharding_scheme("bentuk_singkat", 10)
+    shards = {}
+    for key, rows in {"pp": range(0, 200), "uu": range(200, 300)}.items():
+        documents = [Document(page_content=f"chunk {i}") for i in rows]
+        ids = [f"{key}:{i}" for i in rows]
+        shards[key] = build_vector_store(
+            documents, vectors[list(rows)], embeddings, "flat", ids=ids
+        )
+    indexes = {key: shard.index for key, shard in shards.items()}
+    save_shards(str(tmp_path), indexes, scheme, ["pp", "uu"])
+    version = get_index_version(str(tmp_path))
+
+    manifest = load_shard_manifest(str(tmp_path))
+    assert manifest["scheme"] == scheme
+    assert manifest["shards"] == {"pp": {"chunks": 200}, "uu": {"chunks": 100}}
+
+    # The loaded index and the merged ingestion store agree on row ids
+    index = merge_indexes(load_shard_indexes(str(tmp_path)))
+    _, rows = index.search(vectors[250:251], 1)
+    store = merge_shards(shards, embeddings)
+    doc_id = store.index_to_docstore_id[int(rows[0][0])]
+    assert store.docstore.search(doc_id).page_content == "chunk 250"
+
+    # Emptying a shard removes it; the untouched shard stays on disk
+    del indexes["uu"]
+    save_shards(str(tmp_path), indexes, scheme, ["uu"])
+    assert list(load_shard_manifest(str(tmp_path))["shards"]) == ["pp"]
+    assert list(load_shard_indexes(str(tmp_path))) == ["pp"]
+    assert get_index_version(str(tmp_path)) != version
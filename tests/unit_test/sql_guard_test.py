@@ -0,0 +1,68 @@
+from app.ai.tools.sql_guard import GuardedSQLDatabase, QueryRejectedError
+from app.core.database import create_readonly_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+import pytest
+
+
+@pytest.fixture
+def readonly_engine(tmp_path):
+    url = f"sqlite:///{tmp_path / 'agent.db'}"
+    with create_engine(url).begin() as connection:
+        connection.execute(text("CREATE TABLE regulation (nama TEXT, tahun TEXT)"))
+        for i in range(5):
+            connection.execute(
+                text("INSERT INTO regulation VALUES (:nama, '2020')"),
+                {"nama": f"PP {i}"},
+            )
+    return create_readonly_engine(url, pool_size=1, statement_timeout_ms=200)
+
+
+def test_rows_are_capped(readonly_engine):
+    """Test that generated queries return at most max_rows rows"""
+    db = GuardedSQLDatabase(readonly_engine, max_rows=2)
+    result = db.run("SELECT nama FROM regulation ORDER BY nama DESC;")
+    assert result == "[('PP 4',), ('PP 3',)]"
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "DELETE FROM regulation",
+        "SELECT 1; DROP TABLE regulation",
+        "UPDATE regulation SET tahun = '1999'",
+    ],
+)
+def test_non_select_queries_are_rejected(readonly_engine, query):
+    """Test that only single SELECT statements reach the database"""
+    db = GuardedSQLDatabase(readonly_engine)
+    assert db.run_no_throw(query).startswith("Error:")
+    assert db.run("SELECT COUNT(*) FROM regulation") == "[(5,)]"
+
+
+def test_engine_is_read_only(readonly_engine):
+    """Test that the agent's engine refuses writes even without the guard"""
+    with pytest.raises(OperationalError):
+        with readonly_engine.begin() as connection:
+            connection.execute(text("DELETE FROM regulation"))
+
+
+def test_long_statements_are_interrupted(readonly_engine):
+    """Test that a runaway query is cancelled after the statement timeout"""
+    runaway = (
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+        "SELECT MAX(i) FROM n"
+    )
+    with pytest.raises(OperationalError, match="interrupted"):
+        with readonly_engine.connect() as connection:
+            connection.execute(text(runaway))
+
+
+def test_expensive_queries_are_rejected(readonly_engine, monkeypatch):
+    """Test that a plan above max_cost is rejected before it runs"""
+    db = GuardedSQLDatabase(readonly_engine, max_cost=1000)
+    monkeypatch.setattr(GuardedSQLDatabase, "dialect", "postgresql")
+    monkeypatch.setattr(db, "estimated_cost", lambda command: 5000.0)
+
+    with pytest.raises(QueryRejectedError, match="too expensive"):
+        db.run("SELECT * FROM regulation a, regulation b")
@@ -0,0 +1,22 @@
+from app.ai.tools.sql_schema import build_schema_summary
+from app.core.database import engine
+from app.models.regulation import Regulation
+from sqlalchemy.orm import Session
+
+
+def test_schema_summary_lists_columns_and_common_values(db_session: Session):
+    """Test that the summary has the columns and distinct-value counts"""
+    for tahun, status in [("2019", "Berlaku"), ("2020", "Berlaku"), ("2021", None)]:
+        db_session.add(
+            Regulation(nama_peraturan="x", tahun=tahun, status=status, bahasa="id")
+        )
+    db_session.commit()
+
+    summary = build_schema_summary(engine)
+
+    assert "CREATE TABLE regulation (" in summary
+    assert "  bentuk_singkat VARCHAR(50)," in summary
+    assert "3 rows; tahun (stored as text) ranges from 2019 to 2021." in summary
+    assert "status: 'Berlaku' (2)" in summary
+    assert "bahasa: 'id' (3)" in summary
+    assert "bentuk_singkat: (none)" in summary
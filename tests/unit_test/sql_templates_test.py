@@ -0,0 +1,154 @@
+from app.ai.tools import sql_templates
+from app.ai.tools.sql_templates import answer_from_template, match_question
+from app.models.regulation import Regulation
+from sqlalchemy.orm import Session
+import pytest
+import redis
+
+
+@pytest.fixture
+def regulations(db_session: Session, monkeypatch):
+    cache = {}
+    monkeypatch.setattr(
+        sql_templates,
+        "_column_values",
+        {"version": None, "loaded_at": float("-inf"), "values": {}},
+    )
+    monkeypatch.setattr(sql_templates, "get_data_version", lambda: "1")
+    monkeypatch.setattr(sql_templates, "get_cache", cache.get)
+    monkeypatch.setattr(
+        sql_templates, "set_cache", lambda key, value, ttl: cache.update({key: value})
+    )
+    for name, tahun, bentuk, status in [
+        ("PP 1 2020", "2020", "PP", "Berlaku"),
+        ("PP 2 2020", "2020", "PP", "Tidak Berlaku"),
+        ("UU 1 2020", "2020", "UU", "Berlaku"),
+        ("UU 1 2019", "2019", "UU", "Berlaku"),
+    ]:
+        db_session.add(
+            Regulation(
+                nama_peraturan=name, tahun=tahun, bentuk_singkat=bentuk, status=status
+            )
+        )
+    db_session.commit()
+    return cache
+
+
+def test_match_count_by_year():
+    """Test that a count question by year is matched with its filter"""
+    assert match_question("Berapa jumlah peraturan tahun 2020?") == {
+        "intent": "count",
+        "filters": {"tahun": "2020"},
+        "group_by": None,
+    }
+
+
+def test_match_long_type_and_status_names():
+    """Test that full type names and statuses map to column values"""
+    match = match_question("berapa banyak Peraturan Pemerintah yang tidak berlaku?")
+    assert match["filters"] == {"bentuk_singkat": "PP", "status": "tidak berlaku"}
+
+
+def test_match_group_by_column():
+    """Test that 'per tahun' style questions group by the column"""
+    match = match_question("jumlah peraturan per jenis tahun 2020")
+    assert match["intent"] == "group"
+    assert match["group_by"] == "bentuk_singkat"
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "berapa peraturan tahun 2020 tentang pajak",
+        "apa isi PP 34 tahun 2005",
+        "berapa peraturan tahun 2019 dan 2020",
+        "peraturan tahun 2020",
+    ],
+)
+def test_unmatched_questions_fall_through(question):
+    """Test that anything beyond the templates is left to the agent"""
+    assert match_question(question) is None
+
+
+def test_answer_count_with_filters(regulations):
+    """Test that a count template runs the filtered query"""
+    answer = answer_from_template("berapa peraturan pemerintah tahun 2020?")
+    assert answer.endswith(": 2")
+
+    answer = answer_from_template("berapa peraturan yang masih berlaku tahun 2020?")
+    assert answer.endswith(": 2")
+
+
+def test_answer_group_and_list(regulations):
+    """Test the count-per-column and list templates"""
+    grouped = answer_from_template("jumlah peraturan per tahun")
+    assert "- 2019: 1" in grouped
+    assert "- 2020: 3" in grouped
+
+    listed = answer_from_template("daftar UU tahun 2020")
+    assert "UU 1 2020" in listed
+    assert "UU 1 2019" not in listed
+
+
+def test_answers_are_cached(regulations):
+    """Test that a template result is stored and then served from the cache"""
+    first = answer_from_template("berapa jumlah peraturan?")
+    assert len(regulations) == 1
+
+    regulations[next(iter(regulations))] = {"answer": "cached"}
+    assert answer_from_template("Berapa jumlah peraturan") == "cached"
+    assert first.endswith(": 4")
+
+
+def test_types_and_statuses_missing_from_the_data_fall_through(
+    regulations, db_session: Session
+):
+    """Test that filters on values no row has go to the agent, not answer 0"""
+    # As in the real data: ministerial regulations have no bentuk_singkat,
+    # and regional ones are stored in mixed case
+    for name, bentuk in [
+        ("Peraturan Menteri Energi dan Sumber Daya Mineral Nomor 45 Tahun 2018", None),
+        ("Peraturan Bupati Nomor 3 Tahun 2018", "PERBUP"),
+        ("Peraturan Bupati Nomor 7 Tahun 2018", "Perbup"),
+    ]:
+        db_session.add(
+            Regulation(
+                nama_peraturan=name,
+                tahun="2018",
+                bentuk_singkat=bentuk,
+                status="Berlaku",
+            )
+        )
+    db_session.commit()
+
+    assert match_question("berapa jumlah peraturan menteri tahun 2018") is not None
+    assert answer_from_template("berapa jumlah peraturan menteri tahun 2018") is None
+    assert answer_from_template("berapa peraturan yang dicabut?") is None
+    assert answer_from_template("berapa jumlah peraturan bupati 2018").endswith(": 2")
+    assert not any("PERMEN" in key for key in regulations)
+
+
+def test_column_values_are_reused_briefly_while_redis_is_down(regulations, monkeypatch):
+    """Test that a Redis outage doesn't read the filter values on every question"""
+
+    def unavailable():
+        raise redis.ConnectionError("redis is down")
+
+    reads = []
+    distinct_values = sql_templates.distinct_values
+    monkeypatch.setattr(sql_templates, "get_data_version", unavailable)
+    monkeypatch.setattr(
+        sql_templates,
+        "distinct_values",
+        lambda *args: reads.append(args[1]) or distinct_values(*args),
+    )
+
+    for _ in range(3):
+        assert answer_from_template("berapa jumlah PP 2020").endswith(": 2")
+    assert reads == ["bentuk_singkat"]
+
+    sql_templates._column_values["loaded_at"] -= (
+        sql_templates.COLUMN_VALUES_FALLBACK_TTL + 1
+    )
+    assert answer_from_template("berapa jumlah PP 2020").endswith(": 2")
+    assert reads == ["bentuk_singkat", "bentuk_singkat"]
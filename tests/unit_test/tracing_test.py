@@ -0,0 +1,84 @@
+from app.ai.tracing import MetricsRegistry, TracingCallbackHandler
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langchain_core.tools import tool
+import uuid
+
+
+def test_llm_spans_record_model_and_tokens():
+    """Test that an LLM span carries duration, model and token usage"""
+    tracer = TracingCallbackHandler(MetricsRegistry())
+    run_id = uuid.uuid4()
+    tracer.on_chat_model_start(
+        {}, [], run_id=run_id, invocation_params={"model_name": "gpt-test"}
+    )
+    message = AIMessage(
+        content="ok",
+        usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15},
+    )
+    tracer.on_llm_end(
+        LLMResult(generations=[[ChatGeneration(message=message)]]), run_id=run_id
+    )
+
+    [span] = tracer.spans
+    assert span["kind"] == "llm"
+    assert span["model"] == "gpt-test"
+    assert (span["prompt_tokens"], span["completion_tokens"]) == (12, 3)
+    assert span["duration_ms"] >= 0
+
+
+def test_spans_are_collected_from_nested_runs():
+    """Test that the handler passed in the config sees nested tool and LLM runs"""
+    registry = MetricsRegistry()
+    tracer = TracingCallbackHandler(registry)
+    model = FakeListChatModel(responses=["jawaban"])
+
+    @tool
+    def lookup(question: str) -> str:
+        """Answers a question with a nested model call."""
+        return model.invoke(question).content
+
+    assert lookup.invoke("apa?", config={"callbacks": [tracer]}) == "jawaban"
+
+    assert [span["kind"] for span in tracer.spans] == ["llm", "tool"]
+    assert tracer.spans[1]["name"] == "lookup"
+    summary = tracer.summary()
+    assert summary["kinds"]["tool"]["calls"] == 1
+    assert "tool;dur=" in tracer.server_timing()
+    assert "total;dur=" in tracer.server_timing()
+
+
+def test_errors_and_metrics_rendering():
+    """Test that failed spans are counted and metrics render as Prometheus text"""
+    registry = MetricsRegistry()
+    tracer = TracingCallbackHandler(registry)
+    run_id = uuid.uuid4()
+    tracer.on_tool_start({"name": "RegulationDatabase"}, "q", run_id=run_id)
+    tracer.on_tool_error(TimeoutError("slow"), run_id=run_id)
+
+    assert tracer.spans[0]["error"] == "TimeoutError"
+    text = registry.render()
+    labels = 'kind="tool",name="RegulationDatabase",model=""'
+    assert f"agent_span_duration_seconds_count{{{labels}}} 1" in text
+    assert f"agent_span_errors_total{{{labels}}} 1" in text
+    assert f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+
+
+def test_spans_from_parallel_threads_are_all_recorded():
+    """Test that concurrent callbacks (parallel tool calls) lose no spans"""
+    tracer = TracingCallbackHandler(MetricsRegistry())
+
+    def call_tool(n):
+        for _ in range(200):
+            run_id = uuid.uuid4()
+            tracer.on_tool_start({"name": f"tool-{n}"}, "q", run_id=run_id)
+            tracer.on_tool_end("ok", run_id=run_id)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(call_tool, range(8)))
+
+    assert TracingCallbackHandler.run_inline
+    assert len(tracer.spans) == 1600
+    assert tracer.summary()["kinds"]["tool"]["calls"] == 1600
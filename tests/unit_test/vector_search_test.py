@@ -0,0 +1,389 @@
+from app.ai import chat_memory, vector_search_service
+from app.ai.lexical_index import BM25Index
+from app.ai.sharded_index import ShardedIndex, merge_shards
+from app.ai.tracing import MetricsRegistry, TracingCallbackHandler
+from app.ai.vector_index import MetadataIndex
+from app.models.regulation import Regulation
+from app.models.regulation_chunk import RegulationChunk
+from app.repositories import regulation_chunk_repository
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from sqlalchemy.orm import sessionmaker
+import numpy as np
+import pytest
+import uuid
+
+REGULATION_IDS = {
+    name: uuid.uuid5(uuid.NAMESPACE_URL, name)
+    for name in ("reg-a", "reg-b", "reg-c", "reg-d")
+}
+
+
+class LookupEmbeddings(Embeddings):
+    """Deterministic fake: each known text maps to a fixed vector"""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.vectors[text]
+
+    def embed_queries(self, texts):
+        return np.asarray(self.embed_documents(texts), dtype=np.float32)
+
+
+def row_chunk_ids(store):
+    """The chunk id of each row of a store, as saved with an index build"""
+    return [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+
+
+@pytest.fixture
+def fake_store(monkeypatch, db_session):
+    """Builds a tiny in-memory FAISS index and chunk table for the service"""
+    texts = ["pajak penghasilan", "cukai rokok", "bea masuk", "retribusi daerah"]
+    vectors = {text: [float(i), 0.0, 0.0, 0.0] for i, text in enumerate(texts)}
+    vectors["query pajak"] = [0.1, 0.0, 0.0, 0.0]
+    vectors["query retribusi"] = [2.9, 0.0, 0.0, 0.0]
+    embeddings = LookupEmbeddings(vectors)
+
+    regulations = [
+        ("reg-a", "2005", "PP"),
+        ("reg-b", "2005", "UU"),
+        ("reg-c", "2020", "PP"),
+        ("reg-d", "2020", "PERDA"),
+    ]
+    documents = []
+    for i, (name, tahun, bentuk_singkat) in enumerate(regulations):
+        db_session.add(
+            Regulation(
+                regulation_id=REGULATION_IDS[name],
+                nama_peraturan=name,
+                tahun=tahun,
+                bentuk_singkat=bentuk_singkat,
+            )
+        )
+        documents.append(
+            Document(
+                page_content=texts[i],
+                metadata={
+                    "regulation_id": str(REGULATION_IDS[name]),
+                    "tahun": tahun,
+                    "bentuk_singkat": bentuk_singkat,
+                },
+            )
+        )
+    db_session.commit()
+    ids = [f"{name}:0" for name, _, _ in regulations]
+    store = FAISS.from_documents(documents, embeddings, ids=ids)
+    regulation_chunk_repository.add_chunks(
+        db_session,
+        [
+            {
+                "chunk_id": chunk_id,
+                "regulation_id": REGULATION_IDS[name],
+                "page": 0,
+                "offset": 0,
+                "text": document.page_content,
+                "hash": chunk_id,
+            }
+            for chunk_id, (name, _, _), document in zip(ids, regulations, documents)
+        ],
+    )
+    db_session.commit()
+
+    monkeypatch.setattr(
+        vector_search_service,
+        "SessionLocal",
+        sessionmaker(bind=db_session.get_bind()),
+    )
+    monkeypatch.setattr(vector_search_service, "vector_index", store.index)
+    monkeypatch.setattr(vector_search_service, "chunk_ids", row_chunk_ids(store))
+    monkeypatch.setattr(
+        vector_search_service,
+        "metadata_index",
+        MetadataIndex.from_vector_store(store),
+    )
+    monkeypatch.setattr(
+        vector_search_service, "lexical_index", BM25Index.from_vector_store(store)
+    )
+    monkeypatch.setattr(vector_search_service, "embeddings", embeddings)
+    return store
+
+
+def test_semantic_search_returns_ranked_results(fake_store):
+    """Test single query search returns closest chunks first"""
+    results = vector_search_service.semantic_search("query pajak", k=2)
+    assert [r["content"] for r in results] == ["pajak penghasilan", "cukai rokok"]
+    assert results[0]["score"] < results[1]["score"]
+    assert results[0]["metadata"] == {
+        "regulation_id": str(REGULATION_IDS["reg-a"]),
+        "nama_peraturan": "reg-a",
+        "tahun": "2005",
+        "bentuk_singkat": "PP",
+        "page": 0,
+        "offset": 0,
+    }
+
+
+def test_batch_semantic_search_returns_per_query_results(fake_store):
+    """Test batch search returns one ranked list per query"""
+    results = vector_search_service.batch_semantic_search(
+        ["query pajak", "query retribusi"], k=1
+    )
+    assert len(results) == 2
+    assert results[0][0]["content"] == "pajak penghasilan"
+    assert results[1][0]["content"] == "retribusi daerah"
+
+
+def test_batch_semantic_search_skips_padding(fake_store):
+    """Test that asking for more results than vectors drops FAISS padding"""
+    results = vector_search_service.batch_semantic_search(["query pajak"], k=10)
+    assert len(results[0]) == 4
+
+
+def test_search_skips_rows_without_a_chunk(fake_store, db_session):
+    """Test that rows whose chunk was deleted are left out of the results"""
+    db_session.query(RegulationChunk).filter_by(chunk_id="reg-a:0").delete()
+    db_session.commit()
+
+    results = vector_search_service.batch_semantic_search(["query pajak"], k=2)
+    assert [r["content"] for r in results[0]] == ["cukai rokok"]
+
+
+def test_search_after_a_re_ingest_keeps_the_loaded_rows(fake_store, db_session):
+    """Test that an index loaded before a re-ingest still finds its chunks"""
+    # The re-ingest drops reg-a and adds a chunk to reg-b, so the new build
+    # renumbers the rows
+    db_session.query(RegulationChunk).filter_by(chunk_id="reg-a:0").delete()
+    regulation_chunk_repository.add_chunks(
+        db_session,
+        [
+            {
+                "chunk_id": "reg-b:1",
+                "regulation_id": REGULATION_IDS["reg-b"],
+                "page": 0,
+                "offset": 0,
+                "text": "pajak daerah",
+                "hash": "reg-b:1",
+            }
+        ],
+    )
+    db_session.commit()
+
+    results = vector_search_service.batch_semantic_search(
+        ["query pajak", "query retribusi"], k=2
+    )
+    assert [[r["content"] for r in ranked] for ranked in results] == [
+        ["cukai rokok"],
+        ["retribusi daerah", "bea masuk"],
+    ]
+    assert results[1][0]["metadata"]["nama_peraturan"] == "reg-d"
+
+
+def test_search_without_vector_store(monkeypatch):
+    """Test that searching without a loaded index raises an error"""
+    monkeypatch.setattr(vector_search_service, "vector_index", None)
+    with pytest.raises(RuntimeError):
+        vector_search_service.semantic_search("pajak")
+
+
+def test_filtered_search_only_returns_matching_chunks(fake_store):
+    """Test that metadata filters are applied inside the search"""
+    results = vector_search_service.semantic_search(
+        "query pajak", k=5, filters={"tahun": "2020"}
+    )
+    assert [r["content"] for r in results] == ["bea masuk", "retribusi daerah"]
+
+
+def test_filters_are_combined_and_case_insensitive(fake_store):
+    """Test that multiple filters intersect and values are normalized"""
+    results = vector_search_service.semantic_search(
+        "query pajak", k=5, filters={"tahun": "2020", "bentuk_singkat": "pp"}
+    )
+    assert [r["content"] for r in results] == ["bea masuk"]
+
+
+def test_filter_without_matches_returns_empty(fake_store):
+    """Test that an unknown filter value yields no results"""
+    results = vector_search_service.batch_semantic_search(
+        ["query pajak", "query retribusi"], k=5, filters={"tahun": "1999"}
+    )
+    assert results == [[], []]
+
+
+def test_search_over_shards_matches_single_index(fake_store, db_session, monkeypatch):
+    """Test that a store sharded by bentuk_singkat ranks like the single one"""
+    queries = ["query pajak", "query retribusi"]
+    filters = {"bentuk_singkat": "PP"}
+    expected = [
+        vector_search_service.batch_semantic_search(queries, k=4),
+        vector_search_service.batch_semantic_search(queries, k=4, filters=filters),
+    ]
+
+    shards = {}
+    for chunk_id in fake_store.index_to_docstore_id.values():
+        document = fake_store.docstore.search(chunk_id)
+        shard = shards.setdefault(document.metadata["bentuk_singkat"], ([], []))
+        shard[0].append(document)
+        shard[1].append(chunk_id)
+    embeddings = vector_search_service.embeddings
+    store = merge_shards(
+        {
+            key: FAISS.from_documents(docs, embeddings, ids=ids)
+            for key, (docs, ids) in shards.items()
+        },
+        embeddings,
+    )
+    monkeypatch.setattr(vector_search_service, "vector_index", store.index)
+    monkeypatch.setattr(vector_search_service, "chunk_ids", row_chunk_ids(store))
+    monkeypatch.setattr(
+        vector_search_service, "metadata_index", MetadataIndex.from_vector_store(store)
+    )
+
+    assert isinstance(store.index, ShardedIndex)
+    assert vector_search_service.batch_semantic_search(queries, k=4) == expected[0]
+    assert (
+        vector_search_service.batch_semantic_search(queries, k=4, filters=filters)
+        == expected[1]
+    )
+
+
+def test_metadata_index_round_trip(fake_store, tmp_path):
+    """Test that the metadata index can be saved and loaded"""
+    index = MetadataIndex.from_vector_store(fake_store)
+    index.save(str(tmp_path))
+    loaded = MetadataIndex.load(str(tmp_path))
+    assert loaded.select({"regulation_id": str(REGULATION_IDS["reg-b"])}).tolist() == [
+        1
+    ]
+    assert loaded.select({"tahun": None}) is None
+
+
+def test_lexical_search_matches_exact_terms(fake_store):
+    """Test that lexical mode ranks chunks by shared terms"""
+    results = vector_search_service.semantic_search("retribusi", k=5, mode="lexical")
+    assert [r["content"] for r in results] == ["retribusi daerah"]
+
+
+def test_hybrid_search_fuses_both_rankings(fake_store):
+    """Test that hybrid mode promotes the exact lexical match"""
+    # The vector ranking prefers "pajak penghasilan"; BM25 only matches "cukai"
+    vector_search_service.embeddings.vectors["cukai"] = [0.1, 0.0, 0.0, 0.0]
+    results = vector_search_service.semantic_search("cukai", k=2, mode="hybrid")
+    assert {r["content"] for r in results} == {"pajak penghasilan", "cukai rokok"}
+    assert results[0]["content"] == "cukai rokok"
+
+
+def test_unknown_mode_is_rejected(fake_store):
+    """Test that an unsupported retrieval mode raises an error"""
+    with pytest.raises(ValueError):
+        vector_search_service.semantic_search("pajak", mode="fuzzy")
+
+
+def test_retriever_assembles_a_diverse_context(fake_store):
+    """Test that a budgeted retriever picks passages with MMR"""
+    retriever = vector_search_service.SearchServiceRetriever(
+        mode="vector", k=2, fetch_k=4, token_budget=1000, lambda_mult=0.3
+    )
+    documents = retriever.invoke("query retribusi")
+    # "bea masuk" ranks second but points the same way as "retribusi daerah"
+    assert [d.page_content for d in documents] == [
+        "retribusi daerah",
+        "pajak penghasilan",
+    ]
+
+
+def track_session(monkeypatch):
+    """Keeps session pools in a dict and records the queries that search"""
+    pools, searches = {}, []
+    monkeypatch.setattr(
+        vector_search_service,
+        "get_session_pool",
+        lambda session_id, version: pools.get(session_id),
+    )
+    monkeypatch.setattr(
+        vector_search_service,
+        "add_session_chunks",
+        lambda session_id, version, row_ids, query: pools.update(
+            {session_id: {"row_ids": row_ids, "query": query}}
+        ),
+    )
+    rank = vector_search_service._rank
+    monkeypatch.setattr(
+        vector_search_service,
+        "_rank",
+        lambda *args: searches.append(args[0]) or rank(*args),
+    )
+    return pools, searches
+
+
+def ask_in_session(*queries):
+    retriever = vector_search_service.SearchServiceRetriever(
+        mode="vector", k=1, fetch_k=2, token_budget=1000
+    )
+    token = chat_memory.current_session_id.set("s1")
+    try:
+        return [retriever.invoke(query)[0].page_content for query in queries]
+    finally:
+        chat_memory.current_session_id.reset(token)
+
+
+def test_retriever_reuses_session_passages(fake_store, monkeypatch):
+    """Test that a follow-up in the same session skips the index search"""
+    pools, searches = track_session(monkeypatch)
+    vector_search_service.embeddings.vectors["query retribusi parkir"] = [
+        2.9,
+        0.3,
+        0.0,
+        0.0,
+    ]
+
+    answers = ask_in_session("query retribusi", "query retribusi parkir")
+
+    assert searches == [["query retribusi"]]
+    assert pools["s1"]["row_ids"] == [3, 2]
+    assert pools["s1"]["query"]["vector"] == pytest.approx([2.9, 0.0, 0.0, 0.0])
+    assert answers == ["retribusi daerah", "retribusi daerah"]
+
+
+def test_retriever_searches_when_the_follow_up_changes_topic(fake_store, monkeypatch):
+    """Test that a follow-up unlike the previous query searches the index"""
+    pools, searches = track_session(monkeypatch)
+    vectors = vector_search_service.embeddings.vectors
+    vectors["query retribusi"] = [2.9, 0.0, 0.0, 1.0]
+    # Close to the remembered passages (cosine 0.96) but not to the query
+    # that retrieved them (0.81)
+    vectors["query cukai"] = [1.0, 0.0, 0.0, -0.3]
+    vectors["query retribusi PP 5"] = [2.9, 0.0, 0.0, 1.0]
+
+    answers = ask_in_session("query retribusi", "query cukai", "query retribusi PP 5")
+
+    assert searches == [
+        ["query retribusi"],
+        ["query cukai"],
+        ["query retribusi PP 5"],
+    ]
+    assert answers == ["retribusi daerah", "cukai rokok", "retribusi daerah"]
+    assert pools["s1"]["row_ids"] == [3, 2]
+    assert pools["s1"]["query"]["signature"] == "5 pp"
+
+
+def test_retriever_traces_embedding_and_search_steps(fake_store):
+    """Test that a retrieval records its embedding, search and hydration spans"""
+    tracer = TracingCallbackHandler(MetricsRegistry())
+    retriever = vector_search_service.SearchServiceRetriever(mode="hybrid", k=1)
+
+    retriever.invoke("query pajak", config={"callbacks": [tracer]})
+
+    spans = [(span["kind"], span["name"]) for span in tracer.spans]
+    assert spans[:-1] == [
+        ("embedding", "query_embedding"),
+        ("search", "faiss"),
+        ("search", "bm25"),
+        ("search", "chunk_hydration"),
+    ]
+    assert spans[-1][0] == "retriever"